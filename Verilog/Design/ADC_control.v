@@ -3,6 +3,11 @@ module ADC_control (
     input  wire         rst,       // active-low reset
     input  wire         trigger,
     input  wire         mode,        // 0 = free-running, 1 = incremental mode
+    input  wire         seq_en,      // free-running: sample counter in bits [31:1]
+    input  wire         pack_en,     // free-running: 32 samples per word, first in bit 0
+    input  wire         cic_en,      // free-running: CIC-decimated samples, one per CIC_RATIO cycles
+    input  wire [2:0]   CIC_ORDER,       // CIC order (1..5)
+    input  wire [15:0]  CIC_RATIO,       // CIC decimation ratio
     input  wire [31:0]  TWAKE,           // cycles for state 1 (wake up time)
     input  wire [31:0]  TSAMPLE,           // cycles for state 3 (sample time)
     input  wire [31:0]  NSAM,           // number of samples (only used in incremental mode)
@@ -35,7 +40,26 @@ module ADC_control (
     wire [31:0] filter_out;
     wire [31:0] pattern;
     
-    assign adc_data_out = mode ? filter_out : {31'd0,ADC_OUT};
+    // Free-running sample counter, wraps at 2^31. Counts every free-running
+    // word written, across runs, until reset; the host checks continuity.
+    reg [30:0] seq_cnt;
+    
+    // Packed free-running: ADC_OUT of consecutive S3 cycles collected LSB
+    // first; the word (with the current bit) is written every 32nd cycle
+    // and on the last S3 cycle, whose partial word is zero-padded.
+    reg [31:0] pack_reg;
+    reg [4:0]  pack_idx;
+    wire [31:0] pack_word = pack_reg | ({31'd0, ADC_OUT} << pack_idx);
+    wire pack_last = (pack_idx == 5'd31) || (counter >= TSAMPLE-1);
+    
+    // CIC decimated free-running: one 32-bit word per CIC_RATIO S3 cycles;
+    // the decimator restarts with every run, a partial last period is dropped.
+    wire [31:0] cic_out;
+    wire        cic_tick;
+    
+    assign adc_data_out = mode ? filter_out :
+                          cic_en ? cic_out :
+                          pack_en ? pack_word : {(seq_en ? seq_cnt : 31'd0), ADC_OUT};
     //assign adc_data_out = mode ? filter_out : pattern;
 
 wire clk_inv = clk;
@@ -47,6 +71,18 @@ COI2_Filter adcfilter(
     .dout(filter_out)
 );
 
+CIC_Decimator cic(
+    .clk(clk),
+    .rst(rst),
+    .clr(state != S3),
+    .en(state == S3 && mode == 0 && cic_en),
+    .din(ADC_OUT),
+    .order(CIC_ORDER),
+    .ratio(CIC_RATIO),
+    .tick(cic_tick),
+    .dout(cic_out)
+);
+
 //adc_pattern_gen patterngen(
 //    .clk(CLK_S_D_OUT),
 //    .rst(RST_ADC),
@@ -122,6 +158,26 @@ COI2_Filter adcfilter(
         end
     end
 
+    always @(posedge clk or posedge rst) begin
+        if (rst)
+            seq_cnt <= 31'd0;
+        else if (adc_out_wr && mode == 0 && !pack_en && !cic_en)
+            seq_cnt <= seq_cnt + 1'b1;     // word is written on the falling edge before
+    end
+
+    always @(posedge clk or posedge rst) begin
+        if (rst) begin
+            pack_reg <= 32'd0;
+            pack_idx <= 5'd0;
+        end else if (state != S3 || pack_last) begin
+            pack_reg <= 32'd0;
+            pack_idx <= 5'd0;
+        end else begin
+            pack_reg <= pack_word;
+            pack_idx <= pack_idx + 1'b1;
+        end
+    end
+
     // Decoder combinational logic
     always @(*) begin
         SLP         = 1'b0;
@@ -157,7 +213,11 @@ COI2_Filter adcfilter(
                 RST_ADC     = 1'b0;
                 adc_out_wr  = 1'b0;
                 
-                if(mode == 0)begin
+                if(mode == 0 && cic_en)begin
+                    adc_out_wr  = cic_tick;
+                end else if(mode == 0 && pack_en)begin
+                    adc_out_wr  = pack_last;
+                end else if(mode == 0)begin
                     adc_out_wr  = 1'b1;        
                 end else if (mode == 1 && counter == TSAMPLE -1) begin
                     adc_out_wr  = 1'b1;
@@ -0,0 +1,67 @@
+// CIC decimator (differential delay 1) for the free-running ADC bitstream.
+// ORDER integrators run at the logic clock while en is high, ORDER combs at
+// clk/RATIO; stages above ORDER are computed but bypassed. All registers are
+// 32 bits wide and wrap, so the output is exact while RATIO^ORDER < 2^32.
+// dout is combinational and valid in the cycle tick is high (the write
+// cycle); clr restarts integrators, combs and the decimation phase.
+// Bit-exact host model: cic_decim.py.
+module CIC_Decimator #(
+    parameter NMAX = 5
+)(
+    input  wire                 clk,
+    input  wire                 rst,
+    input  wire                 clr,
+    input  wire                 en,
+    input  wire                 din,
+    input  wire   [2:0]         order,      // 1 .. NMAX
+    input  wire   [15:0]        ratio,      // decimation ratio R >= 1
+    output wire                 tick,
+    output wire   [31:0]        dout
+);
+
+    reg   [31:0] integ [0:NMAX-1];
+    reg   [31:0] dly   [0:NMAX-1];
+    reg   [15:0] cnt;
+    wire  [31:0] comb  [0:NMAX];
+
+    // Comb chain on the last active integrator, sampled at every tick
+    assign comb[0] = integ[order-1];
+    genvar g;
+    generate
+        for (g = 0; g < NMAX; g = g + 1) begin : combs
+            assign comb[g+1] = comb[g] - dly[g];
+        end
+    endgenerate
+
+    assign tick = en && (cnt == ratio - 1'b1);
+    assign dout = comb[order];
+
+    integer k;
+    always @(posedge clk or posedge rst) begin
+        if (rst) begin
+            for (k = 0; k < NMAX; k = k + 1) begin
+                integ[k] <= 32'd0;
+                dly[k]   <= 32'd0;
+            end
+            cnt <= 16'd0;
+        end else if (clr) begin
+            for (k = 0; k < NMAX; k = k + 1) begin
+                integ[k] <= 32'd0;
+                dly[k]   <= 32'd0;
+            end
+            cnt <= 16'd0;
+        end else if (en) begin
+            integ[0] <= integ[0] + din;
+            for (k = 1; k < NMAX; k = k + 1)
+                integ[k] <= integ[k] + integ[k-1];
+            if (tick) begin
+                cnt <= 16'd0;
+                for (k = 0; k < NMAX; k = k + 1)
+                    dly[k] <= comb[k];
+            end else begin
+                cnt <= cnt + 1'b1;
+            end
+        end
+    end
+
+endmodule
@@ -6,10 +6,15 @@ module FIFO_PP(
     input   wire            rd_en,
     
     input   wire            force_flip,
+    input   wire            clr_stats,      //clear flip / word counters and overflow flags (task start)
     
     output  wire            full,
     output  wire            empty,    
     
+    output  reg     [31:0]  flip_cnt,       //halves flipped (almost_full + forced)
+    output  reg     [31:0]  word_cnt,       //words written
+    output  reg     [1:0]   overflow,       //sticky: [0] flip onto unread half, [1] write to full half
+    
     input   wire    [31:0]  data_in,
     output  wire    [31:0]  data_out
     );
@@ -44,6 +49,45 @@ always @(posedge wr_clk or posedge rst) begin
     end
 end
 
+//=====================================================================
+// Integrity counters (wr_clk domain). The host reads them through
+// WireOuts after done_task, when they no longer change.
+//=====================================================================
+// empty of the half being read, synchronized into wr_clk
+reg [1:0] rd_empty_sync;
+always @(posedge wr_clk or posedge rst) begin
+    if (rst)
+        rd_empty_sync <= 2'b11;
+    else
+        rd_empty_sync <= {rd_empty_sync[0], empty};
+end
+
+wire wr_half_full = sel? full_pong : full_ping;
+
+always @(posedge wr_clk or posedge rst) begin
+    if (rst) begin
+        flip_cnt <= 32'd0;
+        word_cnt <= 32'd0;
+        overflow <= 2'b00;
+    end else if (clr_stats) begin
+        flip_cnt <= 32'd0;
+        word_cnt <= 32'd0;
+        overflow <= 2'b00;
+    end else begin
+        if (flip) begin
+            flip_cnt <= flip_cnt + 1;
+            if (!rd_empty_sync[1])
+                overflow[0] <= 1'b1;    // host had not drained the half now being written
+        end
+        if (wr_en) begin
+            if (wr_half_full)
+                overflow[1] <= 1'b1;    // word dropped by the FIFO
+            else
+                word_cnt <= word_cnt + 1;
+        end
+    end
+end
+
 fifo_w32_d131072 fifo_ping(
     .wr_clk(wr_clk),
     .rd_clk(rd_clk),
@@ -82,7 +82,7 @@ module OKTOP (
     wire [112:0] okHE;
     wire [64:0]  okEH;
 
-    wire [65*8-1:0] okEHx;
+    wire [65*14-1:0] okEHx;
 
     okHost okHI (
         .okUH (okUH),
@@ -94,7 +94,7 @@ module OKTOP (
         .okEH (okEH)
     );
 
-    okWireOR #(.N(8)) wireOR (
+    okWireOR #(.N(14)) wireOR (
         .okEH (okEH),
         .okEHx(okEHx)
     );
@@ -102,7 +102,7 @@ module OKTOP (
     //=====================================================================
     // WireIns: reset, modes, DAC + ADC settings
     //=====================================================================
-    wire [31:0] wi00, wi01, wi02, wi03, wi04, wi05, wi06, wi07, wi08, wi09, wi0a, wi0b, wi0c, wi0d, wi0e, wi0f, wi10, wi11, wi12, wi13;
+    wire [31:0] wi00, wi01, wi02, wi03, wi04, wi05, wi06, wi07, wi08, wi09, wi0a, wi0b, wi0c, wi0d, wi0e, wi0f, wi10, wi11, wi12, wi13, wi14;
 
     okWireIn w00 (.okHE(okHE), .ep_addr(8'h00), .ep_dataout(wi00));
     okWireIn w01 (.okHE(okHE), .ep_addr(8'h01), .ep_dataout(wi01));
@@ -124,6 +124,7 @@ module OKTOP (
     okWireIn w11 (.okHE(okHE), .ep_addr(8'h11), .ep_dataout(wi11));
     okWireIn w12 (.okHE(okHE), .ep_addr(8'h12), .ep_dataout(wi12));
     okWireIn w13 (.okHE(okHE), .ep_addr(8'h13), .ep_dataout(wi13));
+    okWireIn w14 (.okHE(okHE), .ep_addr(8'h14), .ep_dataout(wi14));
     
     // Decode control & settings
     assign rst_we    = wi00[0];
@@ -134,6 +135,9 @@ module OKTOP (
     wire adc_mode  = wi00[3];
     
     wire force_awake = wi00[5];
+    wire adc_seq_en  = wi00[6];
+    wire adc_pack_en = wi00[7];
+    wire adc_cic_en  = wi00[8];
 
     wire [31:0] dac_T1   = wi01;
     wire [31:0] dac_T2   = wi02;
@@ -145,6 +149,9 @@ module OKTOP (
     wire [31:0] adc_TSAMPLE = wi07;
     wire [31:0] adc_NSAM    = wi08;
     
+    wire [15:0] adc_CIC_RATIO = wi14[15:0];
+    wire [2:0]  adc_CIC_ORDER = wi14[18:16];
+    
     reg [31:0] spi_config_msb_in;
     reg [31:0] spi_config_lsb_in;
     
@@ -181,6 +188,7 @@ module OKTOP (
     wire trigger_config = trig40[0];
     wire trigger_task   = trig40[1];
     wire force_flip     = trig40[2];
+    wire wav_clr        = trig40[3];
     
     //=====================================================================
     // PipeIn 0x80 : waveform
@@ -229,6 +237,59 @@ module OKTOP (
         .ep_datain(status22)
     );
 
+    //=====================================================================
+    // WireOut 0x23 build_id
+    // USR_ACCESS value stored in the bitstream (set at build time with
+    // BITSTREAM.CONFIG.USR_ACCESS TIMESTAMP), so the host can tell which
+    // bitfile is loaded without reconfiguring.
+    //=====================================================================
+    wire [31:0] build_id;
+
+    USR_ACCESSE2 usr_access (
+        .CFGCLK(),
+        .DATA(build_id),
+        .DATAVALID()
+    );
+
+    okWireOut w23 (
+        .okHE(okHE),
+        .okEH(okEHx[8*65 +: 65]),
+        .ep_addr(8'h23),
+        .ep_datain(build_id)
+    );
+
+    //=====================================================================
+    // WireOut 0x24-0x26 ping-pong FIFO integrity
+    // Flip count, words written and sticky overflow flags of FIFO_PP,
+    // cleared by trigger_task. The host compares them with the halves and
+    // words it read once the task is done.
+    //=====================================================================
+    wire [31:0] pp_flip_cnt;
+    wire [31:0] pp_word_cnt;
+    wire [1:0]  pp_overflow;
+    wire [31:0] status26;
+
+    okWireOut w24 (
+        .okHE(okHE),
+        .okEH(okEHx[9*65 +: 65]),
+        .ep_addr(8'h24),
+        .ep_datain(pp_flip_cnt)
+    );
+
+    okWireOut w25 (
+        .okHE(okHE),
+        .okEH(okEHx[10*65 +: 65]),
+        .ep_addr(8'h25),
+        .ep_datain(pp_word_cnt)
+    );
+
+    okWireOut w26 (
+        .okHE(okHE),
+        .okEH(okEHx[11*65 +: 65]),
+        .ep_addr(8'h26),
+        .ep_datain(status26)
+    );
+
     //=====================================================================
     // PipeOut 0xA0: spi_msb
     //=====================================================================
@@ -271,30 +332,75 @@ module OKTOP (
         .ep_read(adc_out_rd)
     );
     
+    //=====================================================================
+    // PipeIn 0x83 -> PipeOut 0xA3: USB loopback test FIFO (okClk domain)
+    // Words written to 0x83 are read back unchanged from 0xA3; used by
+    // usb_loopback.py to measure pipe throughput and check data integrity.
+    //=====================================================================
+    wire [31:0] tst_in;
+    wire        tst_wr;
+    wire [31:0] tst_out;
+    wire        tst_rd;
+
+    okPipeIn p83_tst (
+        .okHE(okHE),
+        .okEH(okEHx[12*65 +: 65]),
+        .ep_addr(8'h83),
+        .ep_dataout(tst_in),
+        .ep_write(tst_wr)
+    );
+
+    okPipeOut pA3_tst (
+        .okHE(okHE),
+        .okEH(okEHx[13*65 +: 65]),
+        .ep_addr(8'hA3),
+        .ep_datain(tst_out),
+        .ep_read(tst_rd)
+    );
+
+    fifo_sync #(
+        .DATA_WIDTH(32),
+        .DEPTH(16384)           // TST_FIFO_DEPTH in oktop_config.py
+    ) tst_fifo (
+        .clk(okClk),
+        .rst(rst_we),
+        .wr_en(tst_wr),
+        .wr_data(tst_in),
+        .rd_en(tst_rd),
+        .rd_data(tst_out),
+        .full(),
+        .empty(),
+        .count()
+    );
+
     //=====================================================================
     // TriggerOut 0x60
     //=====================================================================
-    wire done_spi, done_task, full_ppfifo;
+    wire done_spi, done_task, full_ppfifo, wav_low;
 
-    reg done_task_q, full_ppfifo_q;
+    reg done_task_q, full_ppfifo_q, wav_low_q;
     
     always @(posedge weClk or posedge rst_we) begin
         if (rst_we) begin
             done_task_q <= 1'b0;
             full_ppfifo_q <= 1'b0;
+            wav_low_q <= 1'b1;
         end else begin
             done_task_q <= done_task;
             full_ppfifo_q <= full_ppfifo;
+            wav_low_q <= wav_low;
         end
     end
 
     wire task_done_pulse = done_task & ~done_task_q;
     wire full_ppfifo_pulse = full_ppfifo & ~full_ppfifo_q;
+    wire wav_low_pulse = wav_low & ~wav_low_q;      // wav FIFO drained to the refill threshold
 
     wire [31:0] trig60_bus;
     
     assign trig60_bus[0] = task_done_pulse;
     assign trig60_bus[1] = full_ppfifo_pulse;
+    assign trig60_bus[2] = wav_low_pulse;
 
     okTriggerOut t60 (
         .okHE(okHE),
@@ -347,6 +453,11 @@ module OKTOP (
         .dac_NSAM(dac_NSAM),
 
         .adc_mode(adc_mode),
+        .adc_seq_en(adc_seq_en),
+        .adc_pack_en(adc_pack_en),
+        .adc_cic_en(adc_cic_en),
+        .adc_CIC_ORDER(adc_CIC_ORDER),
+        .adc_CIC_RATIO(adc_CIC_RATIO),
         .adc_TWAKE(adc_TWAKE),
         .adc_TSAMPLE(adc_TSAMPLE),
         .adc_NSAM(adc_NSAM),
@@ -374,7 +485,12 @@ module OKTOP (
         .data_out_adc(data_out_adc),
         
         .force_flip(force_flip),
+        .wav_clr(wav_clr),
         .full_ppfifo(full_ppfifo),
+        .wav_low(wav_low),
+        .pp_flip_cnt(pp_flip_cnt),
+        .pp_word_cnt(pp_word_cnt),
+        .pp_overflow(pp_overflow),
 
         .MISO(MISO),
         .SPI_CLK_OUT(SPI_CLK_OUT),
@@ -413,5 +529,6 @@ module OKTOP (
     assign status20[31:2] = 30'd0;
     assign status21       = spi_done_cnt;
     assign status22       = task_done_cnt;
+    assign status26       = {30'd0, pp_overflow};
 
 endmodule
@@ -18,6 +18,11 @@ module WETOP(
     input   wire   [31:0]   dac_NSAM,         
     //adc settings
     input   wire            adc_mode,
+    input   wire            adc_seq_en,         //free-running: sample counter in upper bits
+    input   wire            adc_pack_en,        //free-running: 32 samples per FIFO word
+    input   wire            adc_cic_en,         //free-running: CIC decimation
+    input   wire   [2:0]    adc_CIC_ORDER,
+    input   wire   [15:0]   adc_CIC_RATIO,
     input   wire   [31:0]   adc_TWAKE,
     input   wire   [31:0]   adc_TSAMPLE,
     input   wire   [31:0]   adc_NSAM,   
@@ -52,7 +57,12 @@ module WETOP(
     
     
     input   wire            force_flip,
+    input   wire            wav_clr,            //empty the waveform fifo (repeat_task)
     output  wire            full_ppfifo,
+    output  wire            wav_low,            //waveform fifo below refill threshold
+    output  wire   [31:0]   pp_flip_cnt,        //ping-pong flips since trigger_task
+    output  wire   [31:0]   pp_word_cnt,        //ADC words written since trigger_task
+    output  wire   [1:0]    pp_overflow,        //sticky ping-pong overflow flags
     //CHIP interface
     
     input   wire MISO,
@@ -117,6 +127,11 @@ ADC_control adc_control(
     .gtClk(gtClk),
     
     .mode(adc_mode),
+    .seq_en(adc_seq_en),
+    .pack_en(adc_pack_en),
+    .cic_en(adc_cic_en),
+    .CIC_ORDER(adc_CIC_ORDER),
+    .CIC_RATIO(adc_CIC_RATIO),
     .TWAKE(adc_TWAKE),
     .TSAMPLE(adc_TSAMPLE),
     .NSAM(adc_NSAM),
@@ -164,8 +179,20 @@ SPI_control spicontrol(
 );
 
 
+// wav_clr is a single clk_512k pulse; the FIFO reset is held for 8 cycles.
+reg [3:0] wav_clr_cnt;
+always @(posedge clk_512k or posedge rst) begin
+    if (rst)
+        wav_clr_cnt <= 4'd0;
+    else if (wav_clr)
+        wav_clr_cnt <= 4'd8;
+    else if (wav_clr_cnt != 4'd0)
+        wav_clr_cnt <= wav_clr_cnt - 1'b1;
+end
+wire wav_rst = rst | (wav_clr_cnt != 4'd0);
+
 fifo_w32_d1024 wav_fifo(
-    .rst(rst),
+    .rst(wav_rst),
     .wr_clk(clk_100m),
     .rd_clk(clk_512k),
     .din(spi_wav_in),
@@ -174,6 +201,7 @@ fifo_w32_d1024 wav_fifo(
     .dout(data_in_wav),
     .full(),
     .empty(),
+    .prog_empty(wav_low),       // programmable empty, threshold = WAV_FIFO_LOW words
     .wr_rst_busy(),
     .rd_rst_busy()
 );
@@ -257,10 +285,15 @@ FIFO_PP adc_out_fifo(
     .wr_en(adc_out_wr),
     .rd_en(adc_out_rd),
     .force_flip(force_flip),
+    .clr_stats(trigger_task),
     
     .full(full_ppfifo),
     .empty(),
     
+    .flip_cnt(pp_flip_cnt),
+    .word_cnt(pp_word_cnt),
+    .overflow(pp_overflow),
+    
     .data_in(adc_data_out),
     .data_out(data_out_adc)
 );
@@ -0,0 +1,82 @@
+// CIC_Decimator against the host model: drives a pseudo-random bitstream,
+// dumps every enabled input bit to cic_din.txt and every decimated output
+// to cic_dout.txt, then
+//   python cic_decim.py --order 3 --ratio 16 cic_din.txt cic_dout.txt
+module CIC_tst(
+
+    );
+
+localparam ORDER  = 3;
+localparam RATIO  = 16;
+localparam NCYCLE = 4096;
+
+reg clk;
+reg rst;
+reg clr;
+reg en;
+reg din;
+
+wire        tick;
+wire [31:0] dout;
+
+reg [30:0]  lfsr;
+integer     fd_in, fd_out, i;
+
+CIC_Decimator dut(
+    .clk(clk),
+    .rst(rst),
+    .clr(clr),
+    .en(en),
+    .din(din),
+    .order(ORDER[2:0]),
+    .ratio(RATIO[15:0]),
+    .tick(tick),
+    .dout(dout)
+);
+
+always #5 clk=~clk;
+
+// Outputs are valid in the tick cycle, sampled before the edge like the FIFO write
+always @(negedge clk) begin
+    if (en) begin
+        $fdisplay(fd_in, "%0d", din);
+        if (tick)
+            $fdisplay(fd_out, "%0d", dout);
+    end
+end
+
+initial begin
+
+fd_in  = $fopen("cic_din.txt", "w");
+fd_out = $fopen("cic_dout.txt", "w");
+
+clk  = 0;
+rst  = 1;
+clr  = 1;
+en   = 0;
+din  = 0;
+lfsr = 31'h7FFFFFFF;
+
+#20
+rst = 0;
+#10
+@(posedge clk);
+clr <= 0;
+en  <= 1;
+
+// PRBS-31 bitstream, biased towards ones every 4th bit so the output moves
+for (i = 0; i < NCYCLE; i = i + 1) begin
+    din  <= lfsr[30] | (i[1:0] == 2'b00);
+    lfsr <= {lfsr[29:0], lfsr[30] ^ lfsr[27]};
+    @(posedge clk);
+end
+
+en <= 0;
+@(posedge clk);
+$fclose(fd_in);
+$fclose(fd_out);
+$finish;
+
+end
+
+endmodule
@@ -0,0 +1,134 @@
+# acq_monitor.py
+#
+# Live throughput / FIFO headroom monitor for OKTop.task_watcher.
+#
+#   mon = AcquisitionMonitor()                  # progress line on stdout
+#   data = fpga.task_watcher(monitor=mon)
+#   print(mon.stats())
+#
+# While the host reads one FIFO_PP half the FPGA fills the other, which
+# takes fill_interval = FIFO_HALF_WORDS / word rate (about 0.26 s for a
+# free-running capture at 512 kHz). The deadline for a half is therefore
+# fill_interval after its flip; the monitor measures, for every half, the
+# time from the flip being seen to the end of the read and reports the
+# remaining headroom. A warning is logged once headroom drops below
+# warn_fraction of the fill interval, before any data is actually lost.
+import sys
+import time
+
+import oktop_config as cfg
+import oktop_trace
+
+log = oktop_trace.get_logger("monitor")
+
+
+class AcquisitionMonitor:
+    def __init__(self, callback=None, progress: bool = True, print_every_s: float = 0.5,
+                 warn_fraction: float = 0.2, stream=None):
+        """
+        callback: called with stats() after every FIFO half.
+        progress: redraw a one-line status on stream (default stdout).
+        warn_fraction: warn when headroom < warn_fraction * fill interval.
+        """
+        self.callback = callback
+        self.progress = progress
+        self.print_every_s = print_every_s
+        self.warn_fraction = warn_fraction
+        self.stream = stream or sys.stdout
+        self.start(0, 0.0)
+
+    # ---------------------------------------------------------------------
+    # Hooks called by task_watcher
+    # ---------------------------------------------------------------------
+    def start(self, total_words: int, word_rate: float,
+              half_words: int = cfg.FIFO_HALF_WORDS):
+        self.total_words = total_words
+        self.word_rate = word_rate
+        self.half_words = half_words
+        self.fill_interval_s = half_words / word_rate if word_rate > 0 else float("inf")
+        self.t_start = time.perf_counter()
+        self.words = 0
+        self.flips = 0
+        self.last_read_s = 0.0
+        self.max_read_s = 0.0
+        self.last_headroom_s = self.fill_interval_s
+        self.min_headroom_s = self.fill_interval_s
+        self.cum_headroom_s = 0.0
+        self.warnings = 0
+        self._t_print = 0.0
+        self._line_open = False
+
+    def half_read(self, n_words: int, t_seen: float, t_done: float):
+        """One FIFO half: flip seen at t_seen, read finished at t_done (perf_counter)."""
+        read_s = t_done - t_seen
+        self.flips += 1
+        self.words += n_words
+        self.last_read_s = read_s
+        self.max_read_s = max(self.max_read_s, read_s)
+        headroom = self.fill_interval_s - read_s
+        self.last_headroom_s = headroom
+        self.min_headroom_s = min(self.min_headroom_s, headroom)
+        self.cum_headroom_s += headroom
+        oktop_trace.counter("fifo_headroom_ms", headroom=headroom * 1e3)
+        if headroom < self.warn_fraction * self.fill_interval_s:
+            self.warnings += 1
+            self._end_line()
+            log.warning(f"FIFO headroom {headroom * 1e3:.1f} ms of {self.fill_interval_s * 1e3:.1f} ms "
+                        f"(read {read_s * 1e3:.1f} ms) at flip {self.flips}; "
+                        + ("data was lost." if headroom <= 0 else "capture at risk."))
+        if self.callback is not None:
+            self.callback(self.stats())
+        if self.progress and t_done - self._t_print >= self.print_every_s:
+            self._t_print = t_done
+            self._draw()
+
+    def finish(self, n_words_total: int):
+        self.words = n_words_total
+        if self.progress:
+            self._draw()
+            self._end_line()
+        s = self.stats()
+        log.info(f"Captured {s['words']} words in {s['elapsed_s']:.2f} s "
+                 f"({s['words_per_s'] / 1e3:.1f} kS/s), {s['flips']} flips, "
+                 f"max read {s['max_read_s'] * 1e3:.1f} ms, "
+                 f"min headroom {s['min_headroom_s'] * 1e3:.1f} ms.")
+        return s
+
+    # ---------------------------------------------------------------------
+    # Reporting
+    # ---------------------------------------------------------------------
+    def stats(self) -> dict:
+        elapsed = time.perf_counter() - self.t_start
+        return {
+            "words": self.words,
+            "total_words": self.total_words,
+            "elapsed_s": elapsed,
+            "words_per_s": self.words / elapsed if elapsed > 0 else 0.0,
+            "flips": self.flips,
+            "fill_interval_s": self.fill_interval_s,
+            "last_read_s": self.last_read_s,
+            "max_read_s": self.max_read_s,
+            "last_headroom_s": self.last_headroom_s,
+            "min_headroom_s": self.min_headroom_s,
+            "cum_headroom_s": self.cum_headroom_s,
+            "warnings": self.warnings,
+        }
+
+    def _end_line(self):
+        if self._line_open:
+            self.stream.write("\n")
+            self.stream.flush()
+            self._line_open = False
+
+    def _draw(self):
+        s = self.stats()
+        pct = 100.0 * s["words"] / s["total_words"] if s["total_words"] else 0.0
+        if s["fill_interval_s"] == float("inf"):
+            room = "fill n/a"
+        else:
+            room = (f"read {s['last_read_s'] * 1e3:6.1f}/{s['fill_interval_s'] * 1e3:.0f} ms  "
+                    f"headroom min {100.0 * s['min_headroom_s'] / s['fill_interval_s']:5.1f}%")
+        self.stream.write(f"\r{pct:5.1f}%  {s['words']:>10d} words  "
+                          f"{s['words_per_s'] / 1e3:8.1f} kS/s  flips {s['flips']:4d}  {room}")
+        self.stream.flush()
+        self._line_open = True
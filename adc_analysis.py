@@ -0,0 +1,138 @@
+# adc_analysis.py
+#
+# Spectral metrics (SNDR / SNR / THD / ENOB) for coherent-sine ADC captures
+# taken with adc_test.py. Free-running captures are the 1-bit modulator
+# stream (mapped to +/-1); incremental captures are COI2_Filter codes at
+# one output per (1 + tsample) logic cycles. Packed free-running captures
+# (meta["packed"]) are unpacked first; CIC-decimated ones (meta["cic"]) are
+# scaled from 0 .. ratio**order to +/-1 at fs / ratio.
+import math
+from dataclasses import dataclass, asdict
+
+import numpy as np
+
+import capture_plan
+import cic_decim
+import oktop_config as cfg
+
+# Bump when the metric definitions change so cached results are recomputed
+ANALYSIS_VERSION = 2
+
+WINDOWS = ("rect", "hann", "blackmanharris")
+
+
+@dataclass
+class AnalysisParams:
+    band_edge_hz: float = 0     # 0: use the capture's bw (free-running) or output Nyquist
+    window: str = "rect"        # rect (coherent sampling), hann, blackmanharris
+    n_harmonics: int = 5        # harmonics 2..n_harmonics+1 counted as distortion
+    signal_bins: int = 0        # extra bins either side of tone / harmonics (0 for rect)
+    dc_bins: int = 1            # bins from DC excluded from noise
+    skip: int = 0               # leading samples dropped (start-up transient)
+
+    def as_dict(self) -> dict:
+        return {"version": ANALYSIS_VERSION, **asdict(self)}
+
+
+def _window(name: str, n: int):
+    if name == "rect":
+        return np.ones(n)
+    if name == "hann":
+        return np.hanning(n)
+    if name == "blackmanharris":
+        k = 2 * np.pi * np.arange(n) / n
+        return (0.35875 - 0.48829 * np.cos(k) + 0.14128 * np.cos(2 * k)
+                - 0.01168 * np.cos(3 * k))
+    raise ValueError(f"window must be one of {WINDOWS}.")
+
+
+def output_rate(fs: float, adc_mode: int, tsample: int) -> float:
+    """ADC word rate: fs in free-running mode, fs / (1 + tsample) in incremental."""
+    return fs / (1 + tsample) if adc_mode else fs
+
+
+def spectrum_metrics(x, fs: float, band_edge_hz: float, params: AnalysisParams = AnalysisParams()):
+    """
+    Metrics of a single-tone record x sampled at fs, evaluated over
+    (DC, band_edge_hz]. Returns a dict of floats.
+    """
+    x = np.asarray(x, dtype=np.float64)[params.skip:]
+    n = len(x)
+    if n < 8:
+        raise ValueError("Record too short for spectral analysis.")
+    w = _window(params.window, n)
+    spec = np.abs(np.fft.rfft((x - x.mean()) * w)) ** 2
+    df = fs / n
+    k_band = min(int(band_edge_hz / df), len(spec) - 1)
+    lo = params.dc_bins + 1
+    if k_band < lo + 1:
+        raise ValueError("Band edge leaves no bins above DC.")
+    # window main lobe spreads the tone over a few bins
+    half = params.signal_bins + {"rect": 0, "hann": 1, "blackmanharris": 3}[params.window]
+
+    k_sig = lo + int(np.argmax(spec[lo:k_band + 1]))
+    in_band = np.zeros(len(spec), dtype=bool)
+    in_band[lo:k_band + 1] = True
+
+    def bins_around(k):
+        return slice(max(k - half, 0), k + half + 1)
+
+    p_sig = spec[bins_around(k_sig)].sum()
+    taken = np.zeros(len(spec), dtype=bool)
+    taken[bins_around(k_sig)] = True
+
+    # Harmonics, folded about Nyquist
+    h = np.arange(2, params.n_harmonics + 2) * k_sig % n
+    h = np.minimum(h, n - h)
+    p_harm = 0.0
+    for k in np.unique(h[(h >= lo) & (h <= k_band)]):
+        sl = bins_around(int(k))
+        p_harm += spec[sl][~taken[sl]].sum()
+        taken[sl] = True
+
+    p_noise = spec[in_band & ~taken].sum()
+    sndr = 10 * math.log10(p_sig / max(p_noise + p_harm, 1e-300))
+    snr = 10 * math.log10(p_sig / max(p_noise, 1e-300))
+    thd = 10 * math.log10(max(p_harm, 1e-300) / p_sig)
+    return {
+        "n_used": n,
+        "fin_hz": k_sig * df,
+        "sndr_db": sndr,
+        "snr_db": snr,
+        "thd_db": thd,
+        "enob": (sndr - 1.76) / 6.02,
+    }
+
+
+def capture_metrics(data, meta: dict, params: AnalysisParams = AnalysisParams()):
+    """
+    Metrics of a stored capture. meta carries the ADCSamplingConfig fields
+    (fs, bw, adc_mode_set, tsample_set), as in save_to_csv / capture_store,
+    and "packed" / "cic" for packed or CIC-decimated free-running words
+    (as task_watcher records them on a stream it opens).
+    """
+    data = np.asarray(data)
+    if data.dtype.names:
+        data = data["code"]
+    adc_mode = int(meta["adc_mode_set"])
+    fs = output_rate(float(meta["fs"]), adc_mode, int(meta["tsample_set"]))
+    packed, cic = meta.get("packed"), meta.get("cic")
+    if adc_mode and (packed or cic):
+        raise ValueError("Packed / CIC captures are free-running only; metadata is inconsistent.")
+    if packed and cic:
+        raise ValueError("A capture cannot be both packed and CIC-decimated.")
+    if adc_mode:
+        x = data.astype(np.float64)
+    elif cic:
+        order, ratio = int(cic["order"]), int(cic["ratio"])
+        cic_decim.check_cic(order, ratio)
+        x = 2.0 * data.astype(np.float64) / cic_decim.cic_gain(order, ratio) - 1.0
+        fs /= ratio
+    else:
+        if packed:
+            if int(packed.get("pack_bits", cfg.PACK_BITS)) != cfg.PACK_BITS:
+                raise ValueError(f"Unsupported pack width {packed['pack_bits']} bits.")
+            data = capture_plan.unpack_free_running(data, int(packed["tsample"]))
+        x = 2.0 * (data & 1) - 1.0
+    edge = params.band_edge_hz or (float(meta["bw"]) if not adc_mode and meta.get("bw") else fs / 2)
+    return spectrum_metrics(x, fs, min(edge, fs / 2), params)
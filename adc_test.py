@@ -2,10 +2,14 @@ import oktop_driver as oktop
 import oktop_config as cfg
 import ds360_driver as ds360
 import cs580_driver as cs580
-import time
 
 import math
 
+import oktop_trace
+
+from capture_store import save_capture
+from chunked_capture import capture_meta
+
 from adc_test_func import (
     TestingSetup,
     ADCSamplingConfig,
@@ -40,6 +44,7 @@ adc_sampling.adc_mode_set = 0           # Set to 0 for free running mode, 1 for
 adc_sampling.twake_set = 10000
 adc_sampling.nsam_set = 1               # Only valid in incremental mode, set to desire sampling points in incremental mode
 adc_sampling.tsample_set = 2**22        # Set to desire total sampling points in free running mode, set to osr in free running mode
+adc_sampling.settle_s = cfg.ANALOG_SETTLE_S  # Analog settling wait (s) after SPI configuration
 
 # ADC trim bits config
 
@@ -49,9 +54,15 @@ adc_trim.adc_ota2_set = 1
 adc_trim.adc_startup_sel_set = 2
 adc_trim.adc_c2_set = 0
 
+# Tracing: set to a file name to record phase timings as Chrome trace JSON
+TRACE_FILE = None                       # e.g. "adc_test_trace.json"
+
 
 if __name__ == "__main__":
 
+    if TRACE_FILE:
+        oktop_trace.enable()
+
     # ---------------------------------------------------------------
     # Find coherent sampling frequency
     # ---------------------------------------------------------------
@@ -77,20 +88,23 @@ if __name__ == "__main__":
     adc_sampling.ds360_output_voltage_rms = ds360_output_voltage_rms
 
     vsrc = ds360.DS360()
-    vsrc.set_sine_waveform()
-    vsrc.set_offset(0)
-    vsrc.set_frequency(fin)      
-    vsrc.set_amplitude(ds360_output_voltage_rms)
-    vsrc.output_on()
+    with vsrc.batch():     # one GPIB write, unchanged settings skipped
+        vsrc.set_sine_waveform()
+        vsrc.set_offset(0)
+        vsrc.set_frequency(fin)
+        vsrc.set_amplitude(ds360_output_voltage_rms)
+        vsrc.output_on()
 
     isrc = cs580.CS580('COM3')
-    isrc.enable_output(0)
-    isrc.set_gain(adc_sampling.cs580_gain)
-    isrc.set_speed('FAST')
-    isrc.set_shield('GUARD')
-    isrc.set_isolation('GROUND')
-    isrc.set_compliance_voltage(3)
-    isrc.enable_analog_input(1)
+    isrc.sync()            # one query; unchanged settings are skipped below
+    isrc.enable_output(0)  # output off while gain / isolation change
+    with isrc.batch():     # remaining changes go out as one command line
+        isrc.set_gain(adc_sampling.cs580_gain)
+        isrc.set_speed('FAST')
+        isrc.set_shield('GUARD')
+        isrc.set_isolation('GROUND')
+        isrc.set_compliance_voltage(3)
+        isrc.enable_analog_input(1)
     isrc.enable_output(1)
 
     # ---------------------------------------------------------------
@@ -147,15 +161,15 @@ if __name__ == "__main__":
     # config through SPI, should be called before triggering task
     # ---------------------------------------------------------------
     fpga.config_through_spi()
-    time.sleep(10)
+    fpga.settle(adc_sampling.settle_s)
     # fpga.set_adc_startup_sel(1)
     # fpga.config_through_spi()
-    # time.sleep(10)
+    # fpga.settle(adc_sampling.settle_s)
     # ---------------------------------------------------------------
     # trigger task FSM and wait for completion   
     # ---------------------------------------------------------------
     fpga.trigger_task()
-    data = fpga.task_watcher()
+    data = fpga.task_watcher(meta=capture_meta(testing_setup, adc_sampling, adc_trim))
 
     # ---------------------------------------------------------------
     # optional: read SPI output
@@ -177,4 +191,11 @@ if __name__ == "__main__":
     # data processing
     # ---------------------------------------------------------------
 
-    save_to_csv(testing_setup, adc_sampling, adc_trim, data)
+    with oktop_trace.span("save_csv", cat="io"):
+        csv_path = save_to_csv(testing_setup, adc_sampling, adc_trim, data)
+    save_capture(testing_setup, adc_sampling, adc_trim, data,   # indexed .npy copy
+                 conversion=fpga.conversion_params(cs580_gain=adc_sampling.cs580_gain),
+                 integrity=fpga.last_integrity, source=str(csv_path))
+
+    if TRACE_FILE:
+        oktop_trace.export_chrome(TRACE_FILE)
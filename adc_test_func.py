@@ -96,6 +96,7 @@ class ADCSamplingConfig:
     twake_set: int = 0
     nsam_set: int = 0          # only valid in incremental mode
     tsample_set: int = 0       # total sampling points
+    settle_s: float = 0        # analog settling wait after SPI config (s)
     input_current_pk: float = 0
     ds360_output_voltage_rms: float = 0
     cs580_gain:int = 0
@@ -118,7 +119,7 @@ def save_to_csv(testing_setup: TestingSetup,
                 adc_trim: ADCTrimBitsConfig,
                 data_list):
     """
-    Save config blocks and data_list to a CSV.
+    Save config blocks and data_list to a CSV; returns its path.
 
     CSV name: ADC_Testing_<timestamp>.csv
     Location: Chip_<chip_id>/Test_Data
@@ -151,6 +152,7 @@ def save_to_csv(testing_setup: TestingSetup,
         writer.writerow(["twake_set", adc_sampling.twake_set])
         writer.writerow(["nsam_set", adc_sampling.nsam_set])
         writer.writerow(["tsample_set", adc_sampling.tsample_set])
+        writer.writerow(["settle_s", adc_sampling.settle_s])
         writer.writerow(["input_current_pk", adc_sampling.input_current_pk])
         writer.writerow(["ds360_output_voltage_rms", adc_sampling.ds360_output_voltage_rms])
         writer.writerow(["cs580_gain", adc_sampling.cs580_gain])
@@ -176,3 +178,4 @@ def save_to_csv(testing_setup: TestingSetup,
                 writer.writerow([row])
 
     print(f"Saved CSV to: {csv_path}")
+    return csv_path
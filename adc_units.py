@@ -0,0 +1,113 @@
+# adc_units.py
+#
+# Calibrated conversion of raw ADC words to input current.
+#
+# Incremental mode: COI2_Filter sees tsample-1 modulator bits per
+# conversion, each weighted by its remaining updates, so the all-ones code
+# is (tsample-1)(tsample-2)/2. Free-running mode: each word is one bit.
+# The code is normalized to a bipolar full scale x in [-1, 1] and mapped to
+# amperes as  I = gain_a * x + offset_a,  where the nominal gain is
+# cfg.ADC_FS_CURRENT_A * cc_sel / cc_gain * vref_mv / cfg.VREF_MV.
+# Calibrated gain / offset replace the nominal ones when given.
+#
+#   p = fpga.conversion_params(cs580_gain=100e-9)
+#   amps = to_amps(data, p)
+import json
+from dataclasses import dataclass, asdict, replace
+from functools import lru_cache
+
+import numpy as np
+
+import oktop_config as cfg
+
+CC_GAINS = (0.1, 1, 10)
+CC_SELS = tuple(range(1, 12))
+
+
+@dataclass(frozen=True)
+class ConversionParams:
+    adc_mode: int               # 0 free-running, 1 incremental
+    tsample: int                # OSR / S3 cycles per conversion
+    cc_gain: float              # 0.1, 1 or 10 (set_cc_gain)
+    cc_sel: int                 # 1 ... 11 (set_cc_sel)
+    vref_mv: float = cfg.VREF_MV
+    cs580_gain: float = 0.0     # CS580 A/V used for the test stimulus (record only)
+    gain_a: float = None        # calibrated full-scale current (A); None = nominal
+    offset_a: float = 0.0       # calibrated offset current (A)
+
+    def __post_init__(self):
+        if self.cc_gain not in CC_GAINS:
+            raise ValueError("cc_gain must be 0.1, 1 or 10.")
+        if self.cc_sel not in CC_SELS:
+            raise ValueError("cc_sel must be between 1 and 11.")
+        if self.adc_mode and self.tsample < 3:
+            raise ValueError("Incremental conversion needs tsample >= 3.")
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+    def to_json(self) -> str:
+        return json.dumps(self.as_dict())
+
+    @classmethod
+    def from_dict(cls, d: dict):
+        return cls(**{k: d[k] for k in cls.__dataclass_fields__ if k in d})
+
+    @classmethod
+    def from_json(cls, s: str):
+        return cls.from_dict(json.loads(s))
+
+    def calibrated(self, gain_a: float, offset_a: float):
+        return replace(self, gain_a=gain_a, offset_a=offset_a)
+
+
+def full_scale_code(adc_mode: int, tsample: int) -> int:
+    """Raw code for an all-ones modulator output."""
+    if not adc_mode:
+        return 1
+    n = tsample - 1
+    return n * (n - 1) // 2
+
+
+def nominal_full_scale_amps(cc_gain: float, cc_sel: int, vref_mv: float = cfg.VREF_MV) -> float:
+    return cfg.ADC_FS_CURRENT_A * cc_sel / cc_gain * (vref_mv / cfg.VREF_MV)
+
+
+@lru_cache(maxsize=256)
+def conversion_lut(p: ConversionParams):
+    """
+    (scale, offset) such that amps = code * scale + offset, and the same
+    pair for normalized full scale. Cached per configuration.
+    """
+    fs_code = full_scale_code(p.adc_mode, p.tsample)
+    gain = nominal_full_scale_amps(p.cc_gain, p.cc_sel, p.vref_mv) if p.gain_a is None else p.gain_a
+    # x = 2 * code / fs_code - 1
+    fs_scale, fs_offset = 2.0 / fs_code, -1.0
+    return {
+        "amps": (gain * fs_scale, gain * fs_offset + p.offset_a),
+        "fs":   (fs_scale, fs_offset),
+    }
+
+
+def _apply(codes, scale: float, offset: float, out=None):
+    codes = np.asarray(codes)
+    if codes.dtype.names:
+        codes = codes["code"]
+    out = np.multiply(codes, scale, out=out, dtype=np.float64)
+    out += offset
+    return out
+
+
+def to_amps(codes, p: ConversionParams, out=None):
+    """Input current (A) for every code, in one vectorized pass."""
+    return _apply(codes, *conversion_lut(p)["amps"], out=out)
+
+
+def to_full_scale(codes, p: ConversionParams, out=None):
+    """Bipolar normalized full scale in [-1, 1]."""
+    return _apply(codes, *conversion_lut(p)["fs"], out=out)
+
+
+def stimulus_amps(volts, cs580_gain: float):
+    """Current the CS580 sources for a control voltage (analog input mode)."""
+    return np.asarray(volts, dtype=np.float64) * cs580_gain
@@ -0,0 +1,206 @@
+# batch_analyze.py
+#
+# Re-run adc_analysis over every stored capture in parallel.
+#
+#   python batch_analyze.py                          # Test_Data, default params
+#   python batch_analyze.py --window hann --harmonics 9 --jobs 8
+#   python batch_analyze.py --band-edge 1000 --chip 3
+#
+# Inputs: save_to_csv files (Test_Data/Chip_<id>/ADC_Measurement_*.csv),
+# capture_store .npy files (metadata from captures.sqlite), chunked_capture
+# .wecap files (metadata embedded in the file) and the driver's streamed
+# captures (Test_Data/Streams/ADC_Stream_*.wecap, analysed when their
+# metadata carries the run config, i.e. task_watcher(meta=...)).
+# Each result is cached in <root>/.analysis_cache, keyed by the SHA-256 of
+# the capture file (+ its index metadata) and the analysis parameters, so
+# only new captures or changed parameters are computed. Packed and CIC
+# free-running captures are unpacked / scaled according to their "packed" /
+# "cic" metadata (see adc_analysis.capture_metrics). Output: one table
+# per chip, <root>/Chip_<id>/analysis_results.csv.
+import argparse
+import csv
+import dataclasses
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+import adc_analysis
+import capture_store
+import chunked_capture
+import resource_plan
+
+CACHE_NAME = ".analysis_cache"
+RESULTS_NAME = "analysis_results.csv"
+CONFIG_FIELDS = [f.name for cls in capture_store.CONFIG_CLASSES for f in dataclasses.fields(cls)]
+FORMAT_FIELDS = ("packed", "cic")       # word format of free-running captures
+METRIC_FIELDS = ("n_used", "fin_hz", "sndr_db", "snr_db", "thd_db", "enob")
+
+
+# -------------------------------------------------------------------------
+# Capture discovery
+# -------------------------------------------------------------------------
+def find_captures(root, chips=None):
+    """
+    (path, meta or None) for every capture under root. CSV files carry
+    their own metadata; .npy files take theirs from the capture index and
+    .wecap files (incl. streams in root/Streams) from their embedded metadata.
+    """
+    root = Path(root)
+    indexed = {}
+    if (root / capture_store.INDEX_NAME).exists():
+        with capture_store.CaptureStore(root) as store:
+            for cap in store.query():
+                indexed[cap.path.resolve()] = cap.meta
+    jobs = []
+    for chip_dir in sorted(root.glob("Chip_*")):
+        for path in sorted(chip_dir.glob("ADC_Measurement_*")):
+            if path.suffix == ".csv":
+                jobs.append((path, None))
+            elif path.suffix == ".npy" and not path.name.endswith(".tmp.npy"):
+                meta = indexed.get(path.resolve())
+                if meta is None:
+                    print(f"Skipping unindexed capture {path}")
+                    continue
+                if meta.get("source"):
+                    continue            # imported CSV, analysed from the CSV itself
+                jobs.append((path, meta))
+            elif path.suffix == chunked_capture.SUFFIX:
+                jobs += _wecap_job(path)
+    stream_dir = root / resource_plan.STREAM_DIR.name
+    for path in sorted(stream_dir.glob(f"ADC_Stream_*{chunked_capture.SUFFIX}")):
+        jobs += _wecap_job(path)
+    if chips is not None:
+        jobs = [j for j in jobs if _chip_of(*j) in chips]
+    return jobs
+
+
+def _wecap_job(path):
+    with chunked_capture.ChunkReader(path) as r:
+        meta = r.meta
+    if not all(k in meta for k in CONFIG_FIELDS):
+        print(f"Skipping {path}: no capture configuration in its metadata")
+        return []
+    return [(path, meta)]
+
+
+def _chip_of(path, meta):
+    if meta is not None:
+        return int(meta["chip_id"])
+    return int(Path(path).parent.name.split("_", 1)[1])
+
+
+# -------------------------------------------------------------------------
+# Worker
+# -------------------------------------------------------------------------
+def cache_key(path, meta, params: dict) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    if meta is not None:
+        cfg_meta = {k: meta[k] for k in CONFIG_FIELDS}
+        cfg_meta.update({k: meta[k] for k in FORMAT_FIELDS if meta.get(k)})
+        h.update(json.dumps(cfg_meta, sort_keys=True).encode())
+    h.update(json.dumps(params, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def analyze_one(job):
+    """Worker: (path, meta, params dict, cache dir) -> (path, row dict, cached)."""
+    path, meta, params, cache_dir = job
+    key = cache_key(path, meta, params)
+    cache_file = Path(cache_dir) / key[:2] / f"{key}.json"
+    if cache_file.exists():
+        return str(path), json.loads(cache_file.read_text()), True
+
+    if meta is None:
+        setup, sampling, trim, data = capture_store.load_csv(path)
+        meta = {}
+        for obj in (setup, sampling, trim):
+            meta.update(vars(obj))
+    elif str(path).endswith(chunked_capture.SUFFIX):
+        data, _ = chunked_capture.read_capture(path)
+    else:
+        data = np.load(path, mmap_mode="r")
+    row = {k: meta[k] for k in CONFIG_FIELDS}
+    try:
+        p = {k: v for k, v in params.items() if k != "version"}
+        row.update(adc_analysis.capture_metrics(data, meta, adc_analysis.AnalysisParams(**p)))
+        row["error"] = ""
+    except ValueError as exc:
+        row.update({k: None for k in METRIC_FIELDS})
+        row["error"] = str(exc)
+
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cache_file.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(row))
+    os.replace(tmp, cache_file)
+    return str(path), row, False
+
+
+# -------------------------------------------------------------------------
+# Driver
+# -------------------------------------------------------------------------
+def write_results(root, rows_by_chip):
+    columns = ["file"] + CONFIG_FIELDS + list(METRIC_FIELDS) + ["error"]
+    for chip_id, rows in sorted(rows_by_chip.items()):
+        out = Path(root) / f"Chip_{chip_id}" / RESULTS_NAME
+        out.parent.mkdir(parents=True, exist_ok=True)
+        with out.open("w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+            writer.writeheader()
+            for path, row in sorted(rows):
+                writer.writerow({"file": Path(path).name, **row})
+        print(f"Chip {chip_id}: {len(rows)} captures -> {out}")
+
+
+def run(root=capture_store.STORE_DIR, params: adc_analysis.AnalysisParams = None,
+        jobs: int = None, chips=None, cache_dir=None):
+    """Analyse every capture under root; returns {chip_id: [(path, row), ...]}."""
+    root = Path(root)
+    params = (params or adc_analysis.AnalysisParams()).as_dict()
+    cache_dir = Path(cache_dir or root / CACHE_NAME)
+    captures = find_captures(root, chips)
+    if not captures:
+        print(f"No captures found under {root}")
+        return {}
+
+    t0 = time.perf_counter()
+    work = [(str(p), m, params, str(cache_dir)) for p, m in captures]
+    rows_by_chip = {}
+    n_cached = 0
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for (path, meta), (_, row, cached) in zip(captures, pool.map(analyze_one, work, chunksize=4)):
+            rows_by_chip.setdefault(_chip_of(path, meta), []).append((path, row))
+            n_cached += cached
+    print(f"Analysed {len(work)} captures ({n_cached} cached) in {time.perf_counter() - t0:.2f} s")
+    write_results(root, rows_by_chip)
+    return rows_by_chip
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Parallel ADC capture re-analysis")
+    ap.add_argument("root", nargs="?", default=str(capture_store.STORE_DIR))
+    ap.add_argument("--band-edge", type=float, default=0, help="Hz; 0 = capture bw / Nyquist")
+    ap.add_argument("--window", choices=adc_analysis.WINDOWS, default="rect")
+    ap.add_argument("--harmonics", type=int, default=5)
+    ap.add_argument("--signal-bins", type=int, default=0)
+    ap.add_argument("--skip", type=int, default=0, help="leading samples dropped")
+    ap.add_argument("--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    ap.add_argument("--chip", type=int, action="append", help="only these chip ids")
+    ap.add_argument("--cache-dir", default=None)
+    args = ap.parse_args(argv)
+
+    params = adc_analysis.AnalysisParams(band_edge_hz=args.band_edge, window=args.window,
+                                         n_harmonics=args.harmonics,
+                                         signal_bins=args.signal_bins, skip=args.skip)
+    run(args.root, params, args.jobs, args.chip, args.cache_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+# calibration.py
+#
+# Per-chip offset / gain calibration of the current input with the CS580.
+#
+#   cal = calibrate(fpga, isrc, chip_id=3)             # sweep + fit + save
+#   p = apply_calibration(3, fpga.conversion_params())   # later, from cache
+#   amps = adc_units.to_amps(data, p)
+#
+# For every (cc_gain, cc_sel) combination the CS580 steps through DC
+# currents spanning +/- `fraction` of the nominal full scale, a short
+# incremental run is captured at each point, and I = gain_a * x + offset_a
+# (x = normalized full-scale ADC output) is fitted by least squares for all
+# combinations at once. Coefficients are kept per chip in
+# Test_Data/Chip_<id>/calibration.json.
+#
+# Schedule: combinations are visited in order and the currents in
+# alternating (serpentine) direction, so consecutive points differ by one
+# step; the CS580 write for a point and the SPI reconfiguration for a new
+# combination are issued back to back and share one settling wait; runs
+# are only collected during the sweep and reduced in one vectorized pass.
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+import adc_units
+import oktop_trace
+from capture_store import STORE_DIR
+
+log = oktop_trace.get_logger("calibration")
+
+CAL_NAME = "calibration.json"
+CS580_MAX_V = 2.0    # CS580 DC current range is +/- 2 V * gain
+
+
+def cs580_gain_for(current_a: float, gains) -> float:
+    """Smallest CS580 gain (A/V, from gains) whose range covers current_a."""
+    for g in sorted(gains):
+        if abs(current_a) <= CS580_MAX_V * g:
+            return g
+    raise ValueError(f"{current_a} A is outside the CS580 range.")
+
+
+def sweep_currents(cc_gain: float, cc_sel: int, n_points: int = 9, fraction: float = 0.8):
+    """DC currents (A) for one combination, ascending."""
+    fs = adc_units.nominal_full_scale_amps(cc_gain, cc_sel)
+    return np.linspace(-fraction, fraction, n_points) * fs
+
+
+# -------------------------------------------------------------------------
+# Fit
+# -------------------------------------------------------------------------
+def fit_offset_gain(x, current):
+    """
+    Least-squares fit of current = gain * x + offset for each row of
+    x / current (shape (n_combinations, n_points)), vectorized over rows.
+    Returns (gain, offset, rms residual) arrays.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(current, dtype=np.float64)
+    xm = x.mean(axis=1, keepdims=True)
+    ym = y.mean(axis=1, keepdims=True)
+    sxx = ((x - xm) ** 2).sum(axis=1)
+    sxy = ((x - xm) * (y - ym)).sum(axis=1)
+    gain = np.divide(sxy, sxx, out=np.full(len(sxx), np.nan), where=sxx > 0)
+    offset = ym[:, 0] - gain * xm[:, 0]
+    rms = np.sqrt((((gain[:, None] * x + offset[:, None]) - y) ** 2).mean(axis=1))
+    return gain, offset, rms
+
+
+# -------------------------------------------------------------------------
+# Coefficient store
+# -------------------------------------------------------------------------
+def _key(cc_gain, cc_sel) -> str:
+    return f"{cc_gain:g}/{cc_sel}"
+
+
+class CalibrationStore:
+    """Coefficients of one chip, keyed by (cc_gain, cc_sel)."""
+
+    def __init__(self, chip_id: int, root=STORE_DIR):
+        self.chip_id = chip_id
+        self.path = Path(root) / f"Chip_{chip_id}" / CAL_NAME
+        self.entries = json.loads(self.path.read_text()) if self.path.exists() else {}
+
+    def get(self, cc_gain: float, cc_sel: int):
+        """Entry dict (gain_a, offset_a, rms_a, ...) or None."""
+        return self.entries.get(_key(cc_gain, cc_sel))
+
+    def update(self, cc_gain: float, cc_sel: int, **entry):
+        self.entries[_key(cc_gain, cc_sel)] = {"cc_gain": cc_gain, "cc_sel": cc_sel, **entry}
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.entries, indent=1, sort_keys=True))
+        tmp.replace(self.path)
+        _cache.pop(self.path, None)
+        log.info(f"Saved calibration for chip {self.chip_id}: {self.path}")
+
+
+# path -> (mtime_ns, CalibrationStore)
+_cache = {}
+
+
+def load_calibration(chip_id: int, root=STORE_DIR) -> CalibrationStore:
+    """CalibrationStore for chip_id, re-read only when the file changes."""
+    path = Path(root) / f"Chip_{chip_id}" / CAL_NAME
+    mtime = path.stat().st_mtime_ns if path.exists() else None
+    hit = _cache.get(path)
+    if hit is None or hit[0] != mtime:
+        hit = (mtime, CalibrationStore(chip_id, root))
+        _cache[path] = hit
+    return hit[1]
+
+
+def apply_calibration(chip_id: int, params: adc_units.ConversionParams, root=STORE_DIR):
+    """params with the chip's calibrated gain / offset (nominal if uncalibrated)."""
+    entry = load_calibration(chip_id, root).get(params.cc_gain, params.cc_sel)
+    if entry is None:
+        log.warning(f"Chip {chip_id} has no calibration for cc_gain={params.cc_gain}, "
+              f"cc_sel={params.cc_sel}; using nominal scale.")
+        return params
+    return params.calibrated(entry["gain_a"], entry["offset_a"])
+
+
+# -------------------------------------------------------------------------
+# Sweep
+# -------------------------------------------------------------------------
+@oktop_trace.traced("calibrate")
+def calibrate(fpga, isrc, chip_id: int, combos=None, n_points: int = 9,
+              fraction: float = 0.8, twake: int = 100, tsample: int = 256,
+              nsam: int = 64, settle_s: float = 0.05, root=STORE_DIR):
+    """
+    Sweep the CS580 over every (cc_gain, cc_sel) in combos (default: all
+    33), fit offset / gain per combination and store them for chip_id.
+    fpga must be configured (LDOs, SPI system settings) apart from the CC
+    settings; isrc is a cs580_driver.CS580. Returns the CalibrationStore.
+    """
+    if combos is None:
+        combos = [(g, s) for g in adc_units.CC_GAINS for s in adc_units.CC_SELS]
+    combos = list(combos)
+    currents = np.stack([sweep_currents(g, s, n_points, fraction) for g, s in combos])
+    x = np.empty_like(currents)
+
+    fpga.set_modes(task_mode=0, dac_mode=0, adc_mode=1)
+    fpga.config_adc(twake=twake, tsample=tsample, nsam=nsam)
+    with isrc.batch():
+        isrc.enable_analog_input(0)
+        isrc.enable_output(1)
+
+    t0 = time.perf_counter()
+    runs = np.empty((len(combos), n_points), dtype=object)
+    for ci, (cc_gain, cc_sel) in enumerate(combos):
+        order = range(n_points) if ci % 2 == 0 else range(n_points - 1, -1, -1)
+        src_gain = cs580_gain_for(np.abs(currents[ci]).max(), isrc.GAIN_TOKENS)
+        for k, pi in enumerate(order):
+            with isrc.batch():
+                isrc.set_gain(src_gain)
+                isrc.set_dc_current(float(currents[ci, pi]))
+            if k == 0:
+                fpga.set_cc_gain(cc_gain)
+                fpga.set_cc_sel(cc_sel)
+                fpga.config_through_spi()
+            fpga.settle(settle_s)
+            fpga.trigger_task()
+            runs[ci, pi] = fpga.task_watcher()
+    isrc.enable_output(0)
+
+    # One pass over all runs: normalized mean per point
+    lengths = np.fromiter((len(r) for r in runs.ravel()), dtype=np.int64)
+    if (lengths == 0).any():
+        raise RuntimeError("A calibration run returned no ADC data.")
+    codes = np.concatenate(runs.ravel())
+    nominal = adc_units.ConversionParams(adc_mode=1, tsample=tsample, cc_gain=1, cc_sel=1)
+    fsv = adc_units.to_full_scale(codes, nominal)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    x[...] = (np.add.reduceat(fsv, starts) / lengths).reshape(x.shape)
+
+    gain, offset, rms = fit_offset_gain(x, currents)
+    store = load_calibration(chip_id, root)
+    stamp = datetime.now().isoformat(timespec="seconds")
+    for ci, (cc_gain, cc_sel) in enumerate(combos):
+        store.update(cc_gain, cc_sel, gain_a=float(gain[ci]), offset_a=float(offset[ci]),
+                     rms_a=float(rms[ci]), n_points=n_points, tsample=tsample, nsam=nsam,
+                     date=stamp)
+    store.save()
+    log.info(f"Calibrated {len(combos)} combinations in {time.perf_counter() - t0:.1f} s.")
+    return store
@@ -0,0 +1,197 @@
+# capture_plan.py
+#
+# Exact ADC capture length and per-sample time / DAC-step alignment from
+# the task / ADC / DAC settings, following the FSMs in ADC_control.v,
+# DAC_control.v and task_trigger.v.
+# All times are in 512 kHz logic-clock cycles.
+import numpy as np
+
+import oktop_config as cfg
+
+
+def adc_run_words(adc_mode: int, tsample: int, nsam: int, packed: bool = False,
+                  decim: int = 0) -> int:
+    """
+    Words one ADC_control run writes to the ping-pong FIFO.
+    free-running (0): one word per S3 cycle  -> TSAMPLE
+        packed (CTRL_PACK_BIT): PACK_BITS cycles per word, last one partial
+        decim (CTRL_CIC_BIT, ratio R): one word per R cycles, partial dropped
+    incremental  (1): one word per conversion -> NSAM
+    """
+    if tsample < 1 or (adc_mode and nsam < 1):
+        raise ValueError("tsample (and nsam in incremental mode) must be >= 1.")
+    if adc_mode:
+        return nsam
+    if decim:
+        return tsample // decim
+    return -(-tsample // cfg.PACK_BITS) if packed else tsample
+
+
+def pack_free_running(bits, tsample: int):
+    """
+    Packed words of free-running runs of tsample bits each, as the HDL
+    writes them: LSB first, each run's last word zero-padded.
+    """
+    bits = np.asarray(bits, dtype=np.uint8).reshape(-1, tsample)
+    wpr = -(-tsample // cfg.PACK_BITS)
+    padded = np.zeros((len(bits), wpr * cfg.PACK_BITS), dtype=np.uint8)
+    padded[:, :tsample] = bits
+    return np.packbits(padded, axis=1, bitorder="little").view("<u4").ravel().astype(np.uint32)
+
+
+def unpack_free_running(words, tsample: int):
+    """
+    One uint32 sample (0/1) per cycle from packed free-running words,
+    dropping the padding at the end of every tsample-bit run. A trailing
+    partial run is unpacked as far as it goes.
+    """
+    words = np.ascontiguousarray(words, dtype="<u4")
+    wpr = -(-tsample // cfg.PACK_BITS)
+    n_full = len(words) // wpr
+    bits = np.unpackbits(words[:n_full * wpr].view(np.uint8), bitorder="little")
+    out = bits.reshape(n_full, wpr * cfg.PACK_BITS)[:, :tsample].ravel()
+    tail = words[n_full * wpr:]
+    if len(tail):
+        out = np.concatenate((out, np.unpackbits(tail.view(np.uint8), bitorder="little")))
+    return out.astype(np.uint32)
+
+
+def adc_run_cycles(adc_mode: int, twake: int, tsample: int, nsam: int) -> int:
+    """
+    Cycles from the accepted trigger until ADC_control is back in S0:
+    one cycle into S1, TWAKE cycles of S1, then S2 + TSAMPLE cycles of S3
+    (repeated NSAM times in incremental mode).
+    """
+    conversions = nsam if adc_mode else 1
+    return 1 + max(twake, 1) + conversions * (1 + tsample)
+
+
+def adc_write_offsets(adc_mode: int, twake: int, tsample: int, nsam: int, decim: int = 0):
+    """
+    Cycle offset, relative to the accepted trigger, at which each word of
+    one ADC run is written (int64 array of adc_run_words() entries).
+    free-running: every S3 cycle (every decim-th with the CIC);
+    incremental: last S3 cycle of each conversion.
+    """
+    s3_start = 1 + max(twake, 1) + 1
+    if not adc_mode and decim:
+        return s3_start + (decim - 1) + decim * np.arange(tsample // decim, dtype=np.int64)
+    if not adc_mode:
+        return s3_start + np.arange(tsample, dtype=np.int64)
+    return s3_start + (tsample - 1) + np.arange(nsam, dtype=np.int64) * (1 + tsample)
+
+
+def dac_adc_schedule(t1: int, t2: int, ts1: int, ts2: int, dac_nsam: int,
+                     adc_busy_cycles: int):
+    """
+    (DAC step, start cycle) of every ADC run a task_mode=1 / dac_mode=1
+    task actually performs, relative to the start of the first DAC step.
+
+    DAC step k lasts T1 (even k) or T2 (odd k) and fires adc_trigger when
+    its counter equals TS1 / TS2. ADC_control only accepts a trigger in
+    S0, so a trigger arriving while the previous run is busy is dropped.
+    """
+    runs = []
+    t_step = 0
+    busy_until = 0
+    for k in range(dac_nsam):
+        t_len, t_s = (t1, ts1) if k % 2 == 0 else (t2, ts2)
+        if t_s < t_len:
+            t_trig = t_step + t_s
+            if t_trig >= busy_until:
+                runs.append((k, t_trig))
+                busy_until = t_trig + adc_busy_cycles
+        t_step += t_len
+    return runs
+
+
+def capture_words(task_mode: int, dac_mode: int, adc_mode: int,
+                  twake: int, tsample: int, nsam: int,
+                  dac=None, packed: bool = False, decim: int = 0) -> int:
+    """
+    Total ADC words a task writes.
+
+    dac: dict with t1, t2, ts1, ts2, nsam (as given to config_dac);
+         required for task_mode=1.
+    packed: free-running words carry PACK_BITS samples (CTRL_PACK_BIT).
+    decim: CIC decimation ratio of free-running words (CTRL_CIC_BIT), 0 = off.
+    """
+    per_run = adc_run_words(adc_mode, tsample, nsam, packed, decim)
+    if not task_mode:
+        return per_run
+    if not dac_mode:
+        return 0
+    if dac is None:
+        raise ValueError("DAC timing is required to plan a task_mode=1 capture.")
+    busy = adc_run_cycles(adc_mode, twake, tsample, nsam)
+    runs = dac_adc_schedule(dac["t1"], dac["t2"], dac["ts1"], dac["ts2"], dac["nsam"], busy)
+    return per_run * len(runs)
+
+
+def capture_cycles(task_mode: int, adc_mode: int, twake: int, tsample: int, nsam: int,
+                   dac=None) -> int:
+    """Logic-clock cycles a task runs (ADC run, or all DAC steps)."""
+    if not task_mode:
+        return adc_run_cycles(adc_mode, twake, tsample, nsam)
+    if dac is None:
+        raise ValueError("DAC timing is required to plan a task_mode=1 capture.")
+    n = dac["nsam"]
+    return (n + 1) // 2 * dac["t1"] + n // 2 * dac["t2"]
+
+
+def capture_word_rate(task_mode: int, dac_mode: int, adc_mode: int,
+                      twake: int, tsample: int, nsam: int, dac=None,
+                      clk_hz: float = cfg.LOGIC_CLK_HZ, packed: bool = False,
+                      decim: int = 0) -> float:
+    """Average ADC words per second written into FIFO_PP during a task."""
+    words = capture_words(task_mode, dac_mode, adc_mode, twake, tsample, nsam, dac, packed, decim)
+    return words * clk_hz / capture_cycles(task_mode, adc_mode, twake, tsample, nsam, dac)
+
+
+# -------------------------------------------------------------------------
+# Time / potential indexed capture
+# -------------------------------------------------------------------------
+CAPTURE_DTYPE = np.dtype([
+    ("index",        "<i8"),   # sample index in the capture
+    ("t",            "<f8"),   # write time (s) from the 512 kHz clock
+    ("step",         "<i4"),   # DAC step index (-1 for ADC-only tasks)
+    ("potential_mv", "<f8"),   # applied DAC potential (NaN for ADC-only tasks)
+    ("code",         "<u4"),   # ADC output word
+])
+
+
+def index_capture(data, task_mode: int, dac_mode: int, adc_mode: int,
+                  twake: int, tsample: int, nsam: int,
+                  dac=None, wav=None, vref_mv: float = cfg.VREF_MV,
+                  clk_hz: float = cfg.LOGIC_CLK_HZ, decim: int = 0):
+    """
+    Build a CAPTURE_DTYPE record array for a capture, aligning every ADC
+    word with its write time, DAC step and applied potential. wav is the
+    uploaded waveform (DAC codes); times are relative to the task start.
+    decim: CIC decimation ratio of a free-running capture (0 = off).
+    """
+    data = np.asarray(data, dtype=np.uint32)
+    offsets = adc_write_offsets(adc_mode, twake, tsample, nsam, decim)
+    if task_mode:
+        if not dac_mode:
+            raise ValueError("A task_mode=1 run without dac_mode writes no ADC data.")
+        busy = adc_run_cycles(adc_mode, twake, tsample, nsam)
+        runs = dac_adc_schedule(dac["t1"], dac["t2"], dac["ts1"], dac["ts2"], dac["nsam"], busy)
+        steps = np.fromiter((k for k, _ in runs), dtype=np.int32, count=len(runs))
+        starts = np.fromiter((t for _, t in runs), dtype=np.int64, count=len(runs))
+    else:
+        steps = np.array([-1], dtype=np.int32)
+        starts = np.zeros(1, dtype=np.int64)
+
+    n = min(len(data), len(steps) * len(offsets))
+    rec = np.empty(n, dtype=CAPTURE_DTYPE)
+    rec["index"] = np.arange(n)
+    rec["t"] = (starts[:, None] + offsets[None, :]).ravel()[:n] / clk_hz
+    rec["step"] = np.repeat(steps, len(offsets))[:n]
+    if task_mode and wav is not None:
+        wav_mv = np.asarray(wav, dtype=np.float64) * (vref_mv / 1024)
+        rec["potential_mv"] = wav_mv[rec["step"]]
+    else:
+        rec["potential_mv"] = np.nan
+    rec["code"] = data[:n]
+    return rec
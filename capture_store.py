@@ -0,0 +1,305 @@
+# capture_store.py
+#
+# Indexed capture archive. Every capture is one .npy file under
+# Test_Data/Chip_<chip_id>/ (opened memory-mapped on demand), and a SQLite
+# index, Test_Data/captures.sqlite, holds every TestingSetup /
+# ADCSamplingConfig / ADCTrimBitsConfig field plus summary metrics.
+#
+#   store = CaptureStore()
+#   store.add(testing_setup, adc_sampling, adc_trim, data)
+#   for cap in store.query(chip_id=3, adc_ota1_set=1, osr=256):
+#       x = cap.data            # np.memmap, read only when touched
+#
+# Existing save_to_csv files can be brought in with store.import_csv().
+# The OKTop.check_integrity verdict of a capture is kept in "integrity"
+# (JSON) and "integrity_ok" (1 / 0, NULL when unverified):
+#
+#   store.add(..., integrity=fpga.last_integrity)
+#   bad = store.query("integrity_ok = 0")
+import csv
+import dataclasses
+import json
+import os
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+import adc_units
+import oktop_trace
+from adc_test_func import TestingSetup, ADCSamplingConfig, ADCTrimBitsConfig
+
+log = oktop_trace.get_logger("capture_store")
+
+STORE_DIR = Path("Test_Data")
+INDEX_NAME = "captures.sqlite"
+
+CONFIG_CLASSES = (TestingSetup, ADCSamplingConfig, ADCTrimBitsConfig)
+
+# Summary metrics computed once per capture (over the 'code' field for
+# record arrays from task_watcher(indexed=True))
+METRIC_COLUMNS = {
+    "n_samples": "INTEGER",
+    "mean":      "REAL",
+    "std":       "REAL",
+    "min":       "REAL",
+    "max":       "REAL",
+}
+
+_SQL_TYPES = {int: "INTEGER", float: "REAL", str: "TEXT"}
+
+
+def _config_columns():
+    """(column, SQL type) for every config dataclass field, in order."""
+    cols = {}
+    for cls in CONFIG_CLASSES:
+        for f in dataclasses.fields(cls):
+            cols[f.name] = _SQL_TYPES.get(f.type, "REAL")
+    return cols
+
+
+def summary_metrics(data) -> dict:
+    """Summary metrics stored in the index for one capture."""
+    x = data["code"] if data.dtype.names else data
+    if len(x) == 0:
+        return {"n_samples": 0, "mean": None, "std": None, "min": None, "max": None}
+    x = x.astype(np.float64)
+    return {"n_samples": len(x), "mean": float(x.mean()), "std": float(x.std()),
+            "min": float(x.min()), "max": float(x.max())}
+
+
+class Capture:
+    """One indexed capture; .data is memory-mapped on first access."""
+
+    def __init__(self, store, meta: dict):
+        self._store = store
+        self.meta = meta
+        self.id = meta["id"]
+        self.path = store.root / meta["path"]
+        self._data = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = np.load(self.path, mmap_mode="r")
+        return self._data
+
+    @property
+    def conversion(self):
+        """adc_units.ConversionParams stored with the capture, or None."""
+        raw = self.meta.get("conversion")
+        return None if raw is None else adc_units.ConversionParams.from_json(raw)
+
+    @property
+    def integrity(self):
+        """Integrity verdict stored with the capture, or None."""
+        raw = self.meta.get("integrity")
+        return None if raw is None else json.loads(raw)
+
+    def amps(self):
+        """Capture data converted to amperes with its stored parameters."""
+        p = self.conversion
+        if p is None:
+            raise ValueError(f"Capture {self.id} has no conversion parameters.")
+        return adc_units.to_amps(self.data, p)
+
+    def __getitem__(self, key):
+        return self.meta[key]
+
+    def __repr__(self):
+        return f"Capture(id={self.id}, chip_id={self.meta['chip_id']}, path='{self.meta['path']}')"
+
+
+class CaptureStore:
+    def __init__(self, root=STORE_DIR):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.root / INDEX_NAME)
+        self.db.row_factory = sqlite3.Row
+        self.config_columns = _config_columns()
+        self._init_schema()
+
+    # ---------------------------------------------------------------------
+    # Schema
+    # ---------------------------------------------------------------------
+    def _init_schema(self):
+        cols = ["id INTEGER PRIMARY KEY", "created TEXT", "path TEXT UNIQUE",
+                "dtype TEXT", "source TEXT", "conversion TEXT", "integrity TEXT",
+                "integrity_ok INTEGER"]
+        cols += [f'"{c}" {t}' for c, t in self.config_columns.items()]
+        cols += [f'"{c}" {t}' for c, t in METRIC_COLUMNS.items()]
+        with self.db:
+            self.db.execute(f"CREATE TABLE IF NOT EXISTS captures ({', '.join(cols)})")
+            # Fields added to the dataclasses after the index was created
+            have = {r["name"] for r in self.db.execute("PRAGMA table_info(captures)")}
+            extra = {"conversion": "TEXT", "integrity": "TEXT", "integrity_ok": "INTEGER"}
+            for c, t in {**extra, **self.config_columns, **METRIC_COLUMNS}.items():
+                if c not in have:
+                    self.db.execute(f'ALTER TABLE captures ADD COLUMN "{c}" {t}')
+            self.db.execute("CREATE INDEX IF NOT EXISTS idx_chip ON captures (chip_id)")
+
+    # ---------------------------------------------------------------------
+    # Writing
+    # ---------------------------------------------------------------------
+    @oktop_trace.traced("save_capture", cat="io")
+    def add(self, testing_setup: TestingSetup, adc_sampling: ADCSamplingConfig,
+            adc_trim: ADCTrimBitsConfig, data, source: str = None,
+            conversion: adc_units.ConversionParams = None, integrity: dict = None) -> int:
+        """
+        Store a capture (list, uint32 array or record array) and index it.
+        conversion: optional unit-conversion parameters kept with the
+        capture (Capture.amps()). integrity: optional OKTop.check_integrity
+        verdict. Returns the capture id.
+        """
+        data = np.asarray(data)
+        if data.dtype.names is None:
+            data = data.astype(np.uint32, copy=False)
+        created = datetime.now()
+        folder = Path(f"Chip_{testing_setup.chip_id}")
+        (self.root / folder).mkdir(parents=True, exist_ok=True)
+        stem = f"ADC_Measurement_{created.strftime('%Y%m%d_%H%M%S_%f')}"
+        rel = folder / f"{stem}.npy"
+        tmp = self.root / folder / f"{stem}.tmp.npy"
+        np.save(tmp, data)
+        os.replace(tmp, self.root / rel)
+
+        row = {"created": created.isoformat(timespec="microseconds"),
+               "path": rel.as_posix(), "dtype": data.dtype.str if data.dtype.names is None
+               else str(data.dtype.descr), "source": source,
+               "conversion": None if conversion is None else conversion.to_json(),
+               "integrity": None if integrity is None else json.dumps(integrity),
+               "integrity_ok": None if integrity is None or integrity["ok"] is None
+               else int(integrity["ok"])}
+        for cfg_obj in (testing_setup, adc_sampling, adc_trim):
+            row.update(dataclasses.asdict(cfg_obj))
+        row.update(summary_metrics(data))
+        names = ", ".join(f'"{k}"' for k in row)
+        marks = ", ".join("?" for _ in row)
+        with self.db:
+            cur = self.db.execute(f"INSERT INTO captures ({names}) VALUES ({marks})",
+                                  list(row.values()))
+        log.info(f"Stored capture {cur.lastrowid}: {self.root / rel}")
+        return cur.lastrowid
+
+    def import_csv(self, csv_path) -> int:
+        """Index a save_to_csv file (data copied into a .npy file)."""
+        csv_path = Path(csv_path)
+        with self.db:
+            hit = self.db.execute("SELECT id FROM captures WHERE source = ?",
+                                  (str(csv_path),)).fetchone()
+        if hit is not None:
+            return hit["id"]
+        testing_setup, adc_sampling, adc_trim, data = load_csv(csv_path)
+        return self.add(testing_setup, adc_sampling, adc_trim, data, source=str(csv_path))
+
+    def delete(self, capture_id: int):
+        row = self.db.execute("SELECT path FROM captures WHERE id = ?", (capture_id,)).fetchone()
+        if row is None:
+            raise KeyError(capture_id)
+        with self.db:
+            self.db.execute("DELETE FROM captures WHERE id = ?", (capture_id,))
+        (self.root / row["path"]).unlink(missing_ok=True)
+
+    # ---------------------------------------------------------------------
+    # Queries
+    # ---------------------------------------------------------------------
+    def query(self, where: str = None, params=(), order_by: str = "id", **filters):
+        """
+        Matching captures (oldest first by default) as lazy Capture views.
+
+        filters: column=value for equality, column=[v1, v2, ...] for IN,
+                 column=(lo, hi) for an inclusive range (None = open end).
+        where:   extra SQL condition with '?' placeholders bound to params.
+        order_by: a column name, optionally followed by " DESC".
+        """
+        known = {r["name"] for r in self.db.execute("PRAGMA table_info(captures)")}
+        order_col, _, order_dir = order_by.partition(" ")
+        if order_col not in known or order_dir.upper() not in ("", "DESC"):
+            raise ValueError(f"Cannot order captures by '{order_by}'.")
+        clauses, args = [], []
+        for col, val in filters.items():
+            if col not in known:
+                raise ValueError(f"Unknown capture field '{col}'.")
+            if isinstance(val, tuple):
+                lo, hi = val
+                if lo is not None:
+                    clauses.append(f'"{col}" >= ?')
+                    args.append(lo)
+                if hi is not None:
+                    clauses.append(f'"{col}" <= ?')
+                    args.append(hi)
+            elif isinstance(val, (list, set)):
+                val = list(val)
+                clauses.append(f'"{col}" IN ({", ".join("?" for _ in val)})')
+                args += val
+            else:
+                clauses.append(f'"{col}" = ?')
+                args.append(val)
+        if where:
+            clauses.append(f"({where})")
+            args += list(params)
+        sql = "SELECT * FROM captures"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f' ORDER BY "{order_col}"' + (" DESC" if order_dir else "")
+        return [Capture(self, dict(r)) for r in self.db.execute(sql, args)]
+
+    def get(self, capture_id: int) -> Capture:
+        found = self.query(id=capture_id)
+        if not found:
+            raise KeyError(capture_id)
+        return found[0]
+
+    def chips(self):
+        return [r[0] for r in self.db.execute("SELECT DISTINCT chip_id FROM captures ORDER BY chip_id")]
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM captures").fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# -------------------------------------------------------------------------
+# save_to_csv reader
+# -------------------------------------------------------------------------
+def load_csv(csv_path):
+    """
+    Read a save_to_csv file back into
+    (TestingSetup, ADCSamplingConfig, ADCTrimBitsConfig, uint32 data).
+    """
+    objs = [cls() for cls in CONFIG_CLASSES]
+    owner = {f.name: (obj, f.type) for obj in objs for f in dataclasses.fields(obj)}
+    with Path(csv_path).open(newline="") as f:
+        reader = csv.reader(f)
+        for row in reader:
+            if row and row[0] == "ADC Output Data":
+                break
+            if len(row) == 2 and row[0] in owner:
+                obj, typ = owner[row[0]]
+                value = float(row[1])
+                setattr(obj, row[0], int(value) if typ is int and value.is_integer() else value)
+        # Data section: one value per line
+        rest = f.read()
+    data = np.array(rest.split(), dtype=np.int64).astype(np.uint32) if rest.strip() else \
+        np.zeros(0, dtype=np.uint32)
+    return (*objs, data)
+
+
+def save_capture(testing_setup: TestingSetup, adc_sampling: ADCSamplingConfig,
+                 adc_trim: ADCTrimBitsConfig, data, root=STORE_DIR, conversion=None,
+                 integrity=None, source=None) -> int:
+    """
+    Counterpart of save_to_csv: store and index one capture. source: the
+    save_to_csv file of the same run, so analyses use only one copy.
+    """
+    with CaptureStore(root) as store:
+        return store.add(testing_setup, adc_sampling, adc_trim, data, source=source,
+                         conversion=conversion, integrity=integrity)
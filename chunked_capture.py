@@ -0,0 +1,288 @@
+# chunked_capture.py
+#
+# Chunked, compressed capture container (.wecap). Each chunk - normally one
+# FIFO_PP half (cfg.FIFO_HALF_WORDS words) - is filtered and compressed on
+# its own, and a chunk index at the end of the file gives random access to
+# any sample range without decompressing the rest.
+#
+#   meta = capture_meta(testing_setup, adc_sampling, adc_trim)
+#   with ChunkWriter(path, meta=meta) as w:         # background compression
+#       data = fpga.task_watcher(sink=w)
+#       w.meta["integrity"] = fpga.last_integrity    # written on close
+#   r = ChunkReader(path)
+#   x = r[1_000_000:1_200_000]                       # touches 1-2 chunks
+#
+# File layout (little-endian):
+#   header  : MAGIC, <H version>
+#   chunks  : compressed payloads, back to back
+#   meta    : JSON (utf-8)
+#   index   : n_chunks x INDEX_ENTRY
+#   footer  : <Q meta offset> <I meta length> <Q index offset> <I n_chunks> MAGIC
+import dataclasses
+import json
+import lzma
+import queue
+import struct
+import threading
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+import oktop_config as cfg
+import oktop_trace
+
+log = oktop_trace.get_logger("chunked_capture")
+
+MAGIC = b"WECAPCHK"
+VERSION = 1
+SUFFIX = ".wecap"
+
+# Filters applied before the codec
+FILTER_RAW     = 0   # uint32 words as-is
+FILTER_DELTA   = 1   # wrapping first difference, byte-shuffled
+FILTER_BITPACK = 2   # 0/1 words packed 8 per byte (free-running bitstream)
+
+CODEC_ZLIB = 0
+CODEC_LZMA = 1
+CODECS = {"zlib": CODEC_ZLIB, "lzma": CODEC_LZMA}
+
+_HEADER = struct.Struct("<8sH")
+# offset, compressed bytes, samples, first sample, filter, codec
+INDEX_ENTRY = np.dtype([("offset", "<u8"), ("nbytes", "<u4"), ("n", "<u4"),
+                        ("first", "<u8"), ("filter", "u1"), ("codec", "u1")])
+_FOOTER = struct.Struct("<QIQI8s")
+
+
+# -------------------------------------------------------------------------
+# Filters / codecs
+# -------------------------------------------------------------------------
+def choose_filter(words) -> int:
+    """Bit-pack 0/1 streams, delta-code everything else."""
+    if len(words) and int(words.max()) <= 1:
+        return FILTER_BITPACK
+    return FILTER_DELTA
+
+
+def encode_chunk(words, filt: int, codec: int, level: int = None) -> bytes:
+    words = np.asarray(words, dtype="<u4")
+    if filt == FILTER_BITPACK:
+        raw = np.packbits(words.astype(np.uint8), bitorder="little").tobytes()
+    elif filt == FILTER_DELTA:
+        d = np.diff(words, prepend=np.uint32(0))          # wraps mod 2**32
+        raw = d.view(np.uint8).reshape(-1, 4).T.tobytes()  # byte-shuffle
+    else:
+        raw = words.tobytes()
+    if codec == CODEC_LZMA:
+        return lzma.compress(raw, preset=6 if level is None else level)
+    return zlib.compress(raw, 6 if level is None else level)
+
+
+def decode_chunk(payload: bytes, n: int, filt: int, codec: int):
+    raw = lzma.decompress(payload) if codec == CODEC_LZMA else zlib.decompress(payload)
+    buf = np.frombuffer(raw, dtype=np.uint8)
+    if filt == FILTER_BITPACK:
+        return np.unpackbits(buf, count=n, bitorder="little").astype(np.uint32)
+    if filt == FILTER_DELTA:
+        d = np.ascontiguousarray(buf.reshape(4, n).T).view("<u4").ravel()
+        return np.cumsum(d, dtype=np.uint32)
+    return buf.view("<u4").astype(np.uint32)
+
+
+# -------------------------------------------------------------------------
+# Writer
+# -------------------------------------------------------------------------
+class ChunkWriter:
+    """
+    Appends chunks from the readout path; compression and disk writes run
+    on a background thread so write() only copies and queues the block.
+    Blocks are re-cut to chunk_words so every chunk but the last is full.
+    """
+
+    def __init__(self, path, codec: str = "zlib", level: int = None,
+                 chunk_words: int = cfg.FIFO_HALF_WORDS, meta: dict = None):
+        if codec not in CODECS:
+            raise ValueError(f"codec must be one of {list(CODECS)}.")
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.codec = CODECS[codec]
+        self.level = level
+        self.chunk_words = chunk_words
+        self.meta = dict(meta or {})
+        self._f = self.path.open("wb")
+        self._f.write(_HEADER.pack(MAGIC, VERSION))
+        self._index = []
+        self._pending = []
+        self._pending_n = 0
+        self._n_samples = 0
+        self._queue = queue.Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="ChunkWriter", daemon=True)
+        self._thread.start()
+
+    def write(self, words):
+        """Queue a block of uint32 words (copied)."""
+        if self._error is not None:
+            raise RuntimeError(f"Chunk writer failed: {self._error}")
+        words = np.array(words, dtype=np.uint32)
+        self._pending.append(words)
+        self._pending_n += len(words)
+        while self._pending_n >= self.chunk_words:
+            self._emit(self.chunk_words)
+
+    def _emit(self, n: int):
+        block = np.concatenate(self._pending) if len(self._pending) > 1 else self._pending[0]
+        self._queue.put((self._n_samples, block[:n]))
+        rest = block[n:]
+        self._pending = [rest] if len(rest) else []
+        self._pending_n = len(rest)
+        self._n_samples += n
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            first, words = item
+            try:
+                filt = choose_filter(words)
+                with oktop_trace.span("compress_chunk", cat="io", words=len(words)):
+                    payload = encode_chunk(words, filt, self.codec, self.level)
+                self._index.append((self._f.tell(), len(payload), len(words), first, filt, self.codec))
+                self._f.write(payload)
+            except Exception as exc:          # reported on the next write()/close()
+                self._error = exc
+                return
+
+    @oktop_trace.traced("chunk_writer_close", cat="io")
+    def close(self):
+        """Flush the partial chunk, wait for the writer, write index and footer."""
+        if self._f.closed:
+            return
+        if self._pending_n:
+            self._emit(self._pending_n)
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            self._f.close()
+            raise RuntimeError(f"Chunk writer failed: {self._error}")
+        meta = json.dumps({**self.meta, "n_samples": self._n_samples}).encode()
+        meta_off = self._f.tell()
+        self._f.write(meta)
+        index = np.array(self._index, dtype=INDEX_ENTRY)
+        index_off = self._f.tell()
+        self._f.write(index.tobytes())
+        self._f.write(_FOOTER.pack(meta_off, len(meta), index_off, len(index), MAGIC))
+        self._f.close()
+        log.info(f"Wrote {self._n_samples} samples in {len(index)} chunks to {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# -------------------------------------------------------------------------
+# Reader
+# -------------------------------------------------------------------------
+class ChunkReader:
+    """Random access to a .wecap file; only the chunks a read spans are decoded."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._f = self.path.open("rb")
+        magic, version = _HEADER.unpack(self._f.read(_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a chunked capture file.")
+        if version > VERSION:
+            raise ValueError(f"Unsupported chunked capture version {version}.")
+        self._f.seek(-_FOOTER.size, 2)
+        meta_off, meta_len, index_off, n_chunks, magic = _FOOTER.unpack(self._f.read(_FOOTER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} has no chunk index (writer not closed?).")
+        self._f.seek(meta_off)
+        self.meta = json.loads(self._f.read(meta_len))
+        self._f.seek(index_off)
+        self.index = np.frombuffer(self._f.read(n_chunks * INDEX_ENTRY.itemsize), dtype=INDEX_ENTRY)
+        self._starts = self.index["first"].astype(np.int64)
+
+    def __len__(self):
+        return int(self.meta["n_samples"])
+
+    @property
+    def n_chunks(self) -> int:
+        return len(self.index)
+
+    def chunk(self, i: int):
+        e = self.index[i]
+        self._f.seek(int(e["offset"]))
+        return decode_chunk(self._f.read(int(e["nbytes"])), int(e["n"]), int(e["filter"]), int(e["codec"]))
+
+    def read(self, start: int = 0, stop: int = None):
+        """Samples [start, stop) as a uint32 array."""
+        n = len(self)
+        stop = n if stop is None else min(stop, n)
+        start = max(start, 0)
+        if start >= stop:
+            return np.zeros(0, dtype=np.uint32)
+        first = int(np.searchsorted(self._starts, start, side="right")) - 1
+        last = int(np.searchsorted(self._starts, stop, side="left"))
+        out = np.empty(stop - start, dtype=np.uint32)
+        for i in range(first, last):
+            c0 = int(self._starts[i])
+            words = self.chunk(i)
+            lo, hi = max(start, c0), min(stop, c0 + len(words))
+            out[lo - start:hi - start] = words[lo - c0:hi - c0]
+        return out
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            return self.read(start, stop)[::step] if step > 0 else self.read(stop + 1, start + 1)[::step]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError(key)
+        return self.read(key, key + 1)[0]
+
+    def iter_chunks(self):
+        for i in range(self.n_chunks):
+            yield self.chunk(i)
+
+    def compression_ratio(self) -> float:
+        return 4 * len(self) / max(int(self.index["nbytes"].sum()), 1)
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def capture_meta(testing_setup, adc_sampling, adc_trim, conversion=None, **extra) -> dict:
+    """
+    Metadata dict from the adc_test_func config dataclasses, plus the
+    adc_units.ConversionParams under "conversion" when given.
+    """
+    meta = {}
+    for obj in (testing_setup, adc_sampling, adc_trim):
+        meta.update(dataclasses.asdict(obj))
+    if conversion is not None:
+        meta["conversion"] = conversion.as_dict()
+    meta.update(extra)
+    return meta
+
+
+def write_capture(path, data, meta: dict = None, codec: str = "zlib"):
+    """Write a whole in-memory capture as a chunked file."""
+    with ChunkWriter(path, codec=codec, meta=meta) as w:
+        w.write(np.asarray(data, dtype=np.uint32))
+
+
+def read_capture(path):
+    with ChunkReader(path) as r:
+        return r.read(), r.meta
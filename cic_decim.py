@@ -0,0 +1,154 @@
+# cic_decim.py
+#
+# Bit-exact NumPy model of CIC_Decimator.v, the free-running CIC decimation
+# mode (CTRL_CIC_BIT, order / ratio in WireIn EP_WI_ADC_CIC).
+#
+#   fpga.set_cic(1, order=3, ratio=64)
+#   fpga.trigger_task(); words = fpga.task_watcher()       # tsample // 64 per run
+#   ref = decimate(bits, order=3, ratio=64, tsample=tsample)  # from a full-rate capture
+#   compare(words, ref)                                    # {"ok": ..., "mismatches": ...}
+#
+#   python cic_decim.py --order 3 --ratio 16 cic_din.txt cic_dout.txt
+#                                    # check a CIC_tst.v simulation dump
+#
+# Model (per ADC run, i.e. per S3 period; everything restarts with a run):
+#   I_1(t+1) = I_1(t) + b(t),  I_k(t+1) = I_k(t) + I_(k-1)(t)   (registers)
+#   at t = R-1, 2R-1, ...: x = I_N(t), then N combs y_k = y_(k-1) - y_(k-1)[previous tick]
+# in wrapping 32-bit arithmetic, so the output equals the true CIC output
+# (0 .. R^N) as long as R^N < 2^32. A partial last period is dropped, so a
+# run of TSAMPLE cycles gives TSAMPLE // R samples at fs / R, and
+# y / R^N is the mean modulator duty cycle over the last N*R cycles.
+import argparse
+
+import numpy as np
+
+import oktop_config as cfg
+
+_MASK = 0xFFFFFFFF
+
+
+def check_cic(order: int, ratio: int):
+    """Raise ValueError for settings the HDL cannot decimate exactly."""
+    if not 1 <= order <= cfg.CIC_MAX_ORDER:
+        raise ValueError(f"CIC order must be 1 .. {cfg.CIC_MAX_ORDER}.")
+    if not 1 <= ratio <= cfg.CIC_RATIO_MASK:
+        raise ValueError(f"CIC ratio must be 1 .. {cfg.CIC_RATIO_MASK}.")
+    if ratio ** order > _MASK:
+        raise ValueError(f"ratio^order = {ratio ** order} overflows the 32-bit CIC output.")
+
+
+def cic_word(order: int, ratio: int) -> int:
+    """WireIn EP_WI_ADC_CIC value."""
+    check_cic(order, ratio)
+    return (order << cfg.CIC_ORDER_SHIFT) | ratio
+
+
+def cic_gain(order: int, ratio: int) -> int:
+    """Output code of an all-ones bitstream (full scale)."""
+    return ratio ** order
+
+
+class CicDecimator:
+    """Streaming model of one CIC_Decimator run; feed bits in any blocks."""
+
+    def __init__(self, order: int, ratio: int):
+        check_cic(order, ratio)
+        self.order = order
+        self.ratio = ratio
+        self.reset()
+
+    def reset(self):
+        """clr: integrators, comb delays and the decimation phase to zero."""
+        self.integ = [0] * self.order
+        self.dly = [0] * self.order
+        self.cnt = 0
+
+    def process(self, bits):
+        """Decimated uint32 outputs for the next block of ADC bits."""
+        x = np.asarray(bits, dtype=np.uint32)
+        n = len(x)
+        if n == 0:
+            return np.empty(0, dtype=np.uint32)
+        # Integrators: register value before every edge of the block
+        for k in range(self.order):
+            s = self.integ[k]
+            c = np.cumsum(x, dtype=np.uint32)
+            v = np.empty(n, dtype=np.uint32)
+            v[0] = s
+            v[1:] = c[:-1] + np.uint32(s)
+            self.integ[k] = (s + int(c[-1])) & _MASK
+            x = v
+        first = (self.ratio - 1 - self.cnt) % self.ratio
+        self.cnt = (self.cnt + n) % self.ratio
+        y = x[first::self.ratio]
+        if len(y) == 0:
+            return y.copy()
+        # Combs at the ticks
+        for k in range(self.order):
+            prev = np.empty_like(y)
+            prev[0] = self.dly[k]
+            prev[1:] = y[:-1]
+            self.dly[k] = int(y[-1])
+            y = y - prev
+        return y
+
+
+def decimate_chunks(chunks, order: int, ratio: int, tsample: int = None):
+    """
+    Yield decimated blocks for a capture given as blocks of ADC bits
+    (e.g. ChunkReader.iter_chunks()), restarting the decimator every
+    tsample bits (one free-running run; None = a single run).
+    """
+    dec = CicDecimator(order, ratio)
+    left = tsample
+    for bits in chunks:
+        bits = np.asarray(bits)
+        while len(bits):
+            n = len(bits) if tsample is None else min(len(bits), left)
+            out = dec.process(bits[:n])
+            if len(out):
+                yield out
+            bits = bits[n:]
+            if tsample is not None:
+                left -= n
+                if left == 0:
+                    dec.reset()
+                    left = tsample
+
+
+def decimate(bits, order: int, ratio: int, tsample: int = None):
+    """Decimated uint32 samples of a full-rate free-running capture (see decimate_chunks)."""
+    out = list(decimate_chunks([bits], order, ratio, tsample))
+    return np.concatenate(out) if out else np.empty(0, dtype=np.uint32)
+
+
+def compare(words, expected) -> dict:
+    """Match hardware (or emulated) CIC words against the model output."""
+    words = np.asarray(words, dtype=np.uint32)
+    expected = np.asarray(expected, dtype=np.uint32)
+    n = min(len(words), len(expected))
+    bad = np.flatnonzero(words[:n] != expected[:n])
+    return {"ok": len(bad) == 0 and len(words) == len(expected),
+            "n_words": int(len(words)), "n_expected": int(len(expected)),
+            "mismatches": int(len(bad)), "first_mismatch": int(bad[0]) if len(bad) else None}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Check a CIC_Decimator simulation dump against the model")
+    ap.add_argument("din", help="text file, one ADC bit per enabled cycle")
+    ap.add_argument("dout", help="text file, one decimated output (decimal) per tick")
+    ap.add_argument("--order", type=int, required=True)
+    ap.add_argument("--ratio", type=int, required=True)
+    args = ap.parse_args(argv)
+
+    bits = np.loadtxt(args.din, dtype=np.uint8, ndmin=1)
+    words = np.loadtxt(args.dout, dtype=np.uint64, ndmin=1).astype(np.uint32)
+    r = compare(words, decimate(bits, args.order, args.ratio))
+    print(f"{r['n_words']} HDL words, {r['n_expected']} expected, {r['mismatches']} mismatches"
+          + (f" (first at {r['first_mismatch']})" if r["mismatches"] else ""))
+    print("CIC output bit-exact." if r["ok"] else "CIC output MISMATCH.")
+    return 0 if r["ok"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
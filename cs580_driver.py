@@ -1,5 +1,6 @@
 import serial
 import time
+from contextlib import contextmanager
 
 class CS580:
     """
@@ -7,6 +8,10 @@ class CS580:
     Voltage Controlled Current Source.
 
     Remote interface: 9600 baud, 8N1, no flow control.
+
+    Setters go through a cached model of the instrument state, so
+    redundant writes are skipped; use batch() to send several changes
+    as one command line and verify() to check them with one query.
     """
 
     # Mapping of human-friendly gain names to CS580 tokens
@@ -23,6 +28,9 @@ class CS580:
         50e-3: "G50MA",
     }
 
+    # Settings tracked by the state cache, in the order they are queried.
+    STATE_FIELDS = ("GAIN", "RESP", "SHLD", "ISOL", "VOLT", "INPT", "SOUT", "CURR")
+
     def __init__(self, port: str, timeout: float = 1.0):
         """
         port: e.g. 'COM3' on Windows or '/dev/ttyUSB0' on Linux.
@@ -38,6 +46,13 @@ class CS580:
         # Small delay after opening port
         time.sleep(0.1)
 
+        # Cached instrument state (header -> value); a missing entry means
+        # unknown, so the next setter always sends it.
+        self._state = {}
+        # Commands queued inside a batch() block
+        self._pending = []
+        self._batch_depth = 0
+
         # Optional: set token responses to text instead of numeric
         # so queries like GAIN? return 'G10UA' instead of '4'
         self.write("TOKN ON")
@@ -64,6 +79,85 @@ class CS580:
         resp = self.ser.readline().decode("ascii", errors="ignore").strip()
         return resp
 
+    # --- state cache / command coalescing ---
+
+    def _set(self, header: str, value, arg: str):
+        """
+        Send '<header> <arg>' unless the cache says the instrument already
+        holds value. Inside batch() the command is queued instead.
+        """
+        if header in self._state and self._state[header] == value:
+            return
+        self._state[header] = value
+        cmd = f"{header} {arg}"
+        if self._batch_depth:
+            self._pending.append(cmd)
+        else:
+            self.write(cmd)
+
+    def flush(self):
+        """Send all queued commands as one semicolon-joined line."""
+        if self._pending:
+            self.write(";".join(self._pending))
+            self._pending = []
+
+    @contextmanager
+    def batch(self):
+        """
+        Coalesce every setter called in the block into a single command
+        line, sent on exit (in call order).
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.flush()
+
+    def invalidate(self):
+        """Forget the cached state (e.g. after front-panel changes)."""
+        self._state = {}
+
+    @staticmethod
+    def _parse_state(header: str, resp: str):
+        resp = resp.strip().upper()
+        if header in ("VOLT", "CURR"):
+            return float(resp)
+        if header in ("INPT", "SOUT"):
+            return resp in ("1", "ON")
+        return resp
+
+    def read_state(self) -> dict:
+        """Read every cached setting back with one combined query."""
+        resp = self.query(";".join(f"{h}?" for h in self.STATE_FIELDS))
+        fields = resp.split(";")
+        if len(fields) != len(self.STATE_FIELDS):
+            raise RuntimeError(f"Unexpected CS580 state response: {resp!r}")
+        return {h: self._parse_state(h, r) for h, r in zip(self.STATE_FIELDS, fields)}
+
+    def sync(self) -> dict:
+        """Seed the cache from the instrument so unchanged settings are skipped."""
+        self._state = self.read_state()
+        return dict(self._state)
+
+    def verify(self, rel_tol: float = 1e-3) -> dict:
+        """
+        Compare the cache with the instrument (one combined query).
+        Returns {header: (cached, actual)} for every mismatch.
+        """
+        actual = self.read_state()
+        mismatches = {}
+        for h, cached in self._state.items():
+            got = actual[h]
+            if isinstance(cached, float):
+                ok = abs(got - cached) <= rel_tol * max(abs(cached), 1e-12)
+            else:
+                ok = got == cached
+            if not ok:
+                mismatches[h] = (cached, got)
+        return mismatches
+
     # --- high-level commands ---
 
     def identify(self) -> str:
@@ -82,7 +176,7 @@ class CS580:
         """
         
         gain_token = self.GAIN_TOKENS[human_gain]
-        self.write(f"GAIN {gain_token}")
+        self._set("GAIN", gain_token, gain_token)
 
     def get_gain(self) -> str:
         """Return the current gain token (e.g. 'G10UA')."""
@@ -96,7 +190,7 @@ class CS580:
         Equivalent to OUTPUT [Enable] button.
         """
         z = 1 if on else 0  # ON=1, OFF=0
-        self.write(f"SOUT {z}")
+        self._set("SOUT", bool(on), z)
 
     def is_output_on(self) -> bool:
         """Return True if output is enabled."""
@@ -109,7 +203,7 @@ class CS580:
         Enable/disable using the analog input BNC as a control voltage.
         """
         z = "ON" if on else "OFF"  # ON=1, OFF=0
-        self.write(f"INPT {z}")
+        self._set("INPT", bool(on), z)
 
     # DC current and compliance voltage --------------------------------
 
@@ -119,11 +213,11 @@ class CS580:
         Range is ±2 V * gain (e.g. GAIN=10 µA/V → ±20 µA). :contentReference[oaicite:1]{index=1}
         """
         if (current_amps < -1e-6) or (current_amps > 1e-6):
-            amp_ua = current_amps * 1e6  # Convert to microamps
-            self.write(f"CURR {amp_ua:.2f}E-6")
+            amp_ua = round(current_amps * 1e6, 2)  # Convert to microamps
+            self._set("CURR", amp_ua * 1e-6, f"{amp_ua:.2f}E-6")
         else:
-            amp_na = current_amps * 1e9  # Convert to nanoamps
-            self.write(f"CURR {amp_na:.2f}E-9")
+            amp_na = round(current_amps * 1e9, 2)  # Convert to nanoamps
+            self._set("CURR", amp_na * 1e-9, f"{amp_na:.2f}E-9")
 
     def get_dc_current(self) -> float:
         """Query the DC current (in A)."""
@@ -136,7 +230,8 @@ class CS580:
         """
         if not (0.0 <= volts <= 50.0):
             raise ValueError("Compliance voltage must be between 0 and 50 V")
-        self.write(f"VOLT {volts:.3f}")
+        volts = round(volts, 3)
+        self._set("VOLT", volts, f"{volts:.3f}")
 
     def get_compliance_voltage(self) -> float:
         """Query the compliance voltage (in V)."""
@@ -152,7 +247,7 @@ class CS580:
         mode = mode.upper()
         if mode not in ("GUARD", "RETURN"):
             raise ValueError("mode must be 'GUARD' or 'RETURN'")
-        self.write(f"SHLD {mode}")
+        self._set("SHLD", mode, mode)
 
     def set_isolation(self, mode: str):
         """
@@ -162,14 +257,17 @@ class CS580:
         mode = mode.upper()
         if mode not in ("GROUND", "FLOAT"):
             raise ValueError("mode must be 'GROUND' or 'FLOAT'")
-        self.write(f"ISOL {mode}")
+        self._set("ISOL", mode, mode)
 
     def set_speed(self, mode: str):
         """
         mode: 'FAST' or 'SLOW'
         (max bandwidth or extra 470 pF filter)
         """
-        self.write(f"RESP {mode}")
+        mode = mode.upper()
+        if mode not in ("FAST", "SLOW"):
+            raise ValueError("mode must be 'FAST' or 'SLOW'")
+        self._set("RESP", mode, mode)
 
     # Status / error helpers -------------------------------------------
 
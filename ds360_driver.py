@@ -1,40 +1,145 @@
+import time
+from contextlib import contextmanager
+
 import pyvisa as visa
 
+# Opt-in sharing (DS360(..., shared=True)): one ResourceManager per process
+# and one open session (plus its cached generator state) per GPIB address,
+# reused by every shared instance so back-to-back experiments skip the VISA
+# open. Shared sessions stay open until release_all().
+_rm = None
+_sessions = {}
+
+
+def _open_resource(rm, gpib_address):
+    res = rm.open_resource(gpib_address)
+    res.write_termination = '\n'
+    res.read_termination = '\r'
+    return res
+
+
+def _open_session(gpib_address):
+    global _rm
+    if gpib_address not in _sessions:
+        if _rm is None:
+            _rm = visa.ResourceManager()
+        _sessions[gpib_address] = (_open_resource(_rm, gpib_address), {})
+    return _sessions[gpib_address]
+
+
+def release_all():
+    """Close every shared DS360 session and the ResourceManager."""
+    global _rm
+    for res, _ in _sessions.values():
+        res.close()
+    _sessions.clear()
+    if _rm is not None:
+        _rm.close()
+        _rm = None
+
+
 class DS360:
-    def __init__(self, gpib_address='GPIB0::8::INSTR'):
-        self.rm = visa.ResourceManager()
-        self.ds360 = self.rm.open_resource(gpib_address)
-        self.ds360.write_termination = '\n'
-        self.ds360.read_termination = '\r'
+    def __init__(self, gpib_address='GPIB0::8::INSTR', shared=False):
+        self.gpib_address = gpib_address
+        self.shared = shared
+        if shared:
+            # Cached generator state (header -> value) lives with the session
+            self.rm = None
+            self.ds360, self._state = _open_session(gpib_address)
+        else:
+            self.rm = visa.ResourceManager()
+            self.ds360 = _open_resource(self.rm, gpib_address)
+            self._state = {}
+        # Commands queued inside a batch() block
+        self._pending = []
+        self._batch_depth = 0
+
+    # --- state cache / command batching ---
+
+    def _set(self, header, value, command):
+        """Send command unless the generator already holds value for header."""
+        if self._state.get(header) == value:
+            return
+        self._state[header] = value
+        if self._batch_depth:
+            self._pending.append(command)
+        else:
+            self.ds360.write(command)
+
+    def flush(self):
+        """Send all queued commands in one GPIB write."""
+        if self._pending:
+            self.ds360.write(';'.join(self._pending))
+            self._pending = []
+
+    @contextmanager
+    def batch(self):
+        """Coalesce the setters called in the block into one GPIB write."""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.flush()
+
+    def invalidate(self):
+        """Forget the cached state (e.g. after front-panel changes)."""
+        self._state.clear()
+
+    # --- settings ---
 
     def set_sine_waveform(self):
         """Configure the DS360 to output a sine waveform."""
-        self.ds360.write('FUNC 0')
+        self._set('FUNC', 0, 'FUNC 0')
 
     def set_frequency(self, frequency_hz):
         """Set the frequency of the DS360 signal generator."""
         command = f'FREQ {frequency_hz}'
-        self.ds360.write(command)
+        self._set('FREQ', frequency_hz, command)
 
     def set_amplitude(self, amplitude_vr):
         """Set the amplitude of the DS360 signal generator."""
         command = f'AMPL{amplitude_vr}VR'
-        self.ds360.write(command)
-    
+        self._set('AMPL', amplitude_vr, command)
+
     def set_offset(self, offset):
         """Set the offset voltage of the DS360 signal generator."""
         command = f'OFFS{offset}'
-        self.ds360.write(command)
+        self._set('OFFS', offset, command)
 
     def output_on(self):
         """Turn on the output of the DS360 signal generator."""
-        self.ds360.write('OUTE1')
+        self._set('OUTE', 1, 'OUTE1')
 
     def output_off(self):
         """Turn off the output of the DS360 signal generator."""
-        self.ds360.write('OUTE0')
+        self._set('OUTE', 0, 'OUTE0')
+
+    # --- sweeps ---
+
+    def sweep(self, points, settle_s=0.0):
+        """
+        Step through precomputed (fin, amplitude_vrms) points.
+
+        Each step sends only the changed FREQ/AMPL in one GPIB write,
+        waits settle_s and then yields (index, fin, amplitude) so the
+        caller can run its capture before the next point is applied.
+        """
+        for i, (fin, amplitude) in enumerate(points):
+            with self.batch():
+                self.set_frequency(fin)
+                self.set_amplitude(amplitude)
+            if settle_s > 0:
+                time.sleep(settle_s)
+            yield i, fin, amplitude
 
     def close(self):
-        """Close the connection to the DS360 signal generator."""
-        self.ds360.close()
-        self.rm.close()
\ No newline at end of file
+        """
+        Close the connection to the DS360 signal generator. A shared
+        instance only detaches; its session stays open until release_all().
+        """
+        self.flush()
+        if not self.shared:
+            self.ds360.close()
+            self.rm.close()
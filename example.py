@@ -2,7 +2,6 @@ import oktop_driver as oktop
 import oktop_config as cfg
 import ds360_driver as ds360
 import cs580_driver as cs580
-import time
 
 if __name__ == "__main__":
 
@@ -10,22 +9,25 @@ if __name__ == "__main__":
     # DS360 initialization
     # ---------------------------------------------------------------
     vsrc = ds360.DS360()
-    vsrc.set_sine_waveform()
-    vsrc.set_offset(0)
-    vsrc.set_frequency(499.633)      
-    vsrc.set_amplitude(0.7071)
-    vsrc.output_on()
+    with vsrc.batch():     # one GPIB write, unchanged settings skipped
+        vsrc.set_sine_waveform()
+        vsrc.set_offset(0)
+        vsrc.set_frequency(499.633)
+        vsrc.set_amplitude(0.7071)
+        vsrc.output_on()
     # ---------------------------------------------------------------
     # CS580 initialization
     # ---------------------------------------------------------------
     isrc = cs580.CS580('COM3')
-    isrc.enable_output(0)
-    isrc.set_gain(100e-9)
-    isrc.set_speed('FAST')
-    isrc.set_shield('GUARD')
-    isrc.set_isolation('GROUND')
-    isrc.set_compliance_voltage(3)
-    isrc.enable_analog_input(1)
+    isrc.sync()            # one query; unchanged settings are skipped below
+    isrc.enable_output(0)  # output off while gain / isolation change
+    with isrc.batch():     # remaining changes go out as one command line
+        isrc.set_gain(100e-9)
+        isrc.set_speed('FAST')
+        isrc.set_shield('GUARD')
+        isrc.set_isolation('GROUND')
+        isrc.set_compliance_voltage(3)
+        isrc.enable_analog_input(1)
     isrc.enable_output(1)
 
     # ---------------------------------------------------------------
@@ -99,8 +101,8 @@ if __name__ == "__main__":
     # ---------------------------------------------------------------
     # config through SPI, should be called before triggering task
     # ---------------------------------------------------------------
-    fpga.config_through_spi()
-    time.sleep(1)  # wait for configuration to settle
+    fpga.config_through_spi()   # returns once the SPI done counter has advanced
+    fpga.settle(1)              # analog settling time (s)
     # ---------------------------------------------------------------
     # trigger task FSM and wait for completion   
     # ---------------------------------------------------------------
@@ -0,0 +1,236 @@
+# latency_bench.py
+#
+# Control-path latency benchmark for the FrontPanel primitives OKTop uses.
+#
+#   python latency_bench.py                      # real board, cfg.BITFILE
+#   python latency_bench.py --emulate -n 2000    # ok_emulator backend
+#   python latency_bench.py --compare old.json new.json
+#
+# Primitives (each timed on its own, n times after a warm-up):
+#   wire_in        SetWireInValue(EP_WI_CTRL, unchanged value) + UpdateWireIns
+#   wire_out       UpdateWireOuts + GetWireOutValue(EP_WO_STATUS)
+#   trigger_in     ActivateTriggerIn(EP_TI_MAIN, TRIG_FLIP_BIT) on an idle FIFO_PP
+#   trigger_poll   UpdateTriggerOuts + IsTriggered(EP_TO_MAIN), nothing pending
+#   task_round_trip ActivateTriggerIn(EP_TI_MAIN, TRIG_TASK_BIT) -> busy poll of
+#                  UpdateTriggerOuts / IsTriggered until TRIG_TASK_DONE_BIT; the
+#                  task is a single 3-cycle incremental conversion (~12 us of
+#                  FSM time at 512 kHz), so the rest is host + USB latency.
+#
+# The device is left reset (system_reset) afterwards, since the round trips
+# write words into FIFO_PP and flip it. Reports are JSON files in
+# Test_Data/Benchmarks/ holding the host, OS, Python / numpy versions, git
+# revision, backend and bitfile build ID next to p50 / p90 / p99 / max (us),
+# so runs on different hosts and driver versions can be compared.
+import argparse
+import json
+import platform
+import subprocess
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+import oktop_config as cfg
+
+REPORT_DIR = Path("Test_Data") / "Benchmarks"
+PERCENTILES = (50, 90, 99)
+ROUND_TRIP_TIMEOUT_S = 1.0
+
+
+# -------------------------------------------------------------------------
+# Timing
+# -------------------------------------------------------------------------
+def time_calls(fn, n: int, warmup: int = 20):
+    """Latency of n calls of fn() in microseconds (float64 array)."""
+    for _ in range(warmup):
+        fn()
+    t = np.empty(n, dtype=np.int64)
+    clock = time.perf_counter_ns
+    for i in range(n):
+        t0 = clock()
+        fn()
+        t[i] = clock() - t0
+    return t / 1e3
+
+
+def latency_stats(us) -> dict:
+    us = np.asarray(us, dtype=np.float64)
+    p = np.percentile(us, PERCENTILES) if len(us) else [np.nan] * len(PERCENTILES)
+    return {"n": int(len(us)), "mean_us": float(us.mean()) if len(us) else np.nan,
+            "min_us": float(us.min()) if len(us) else np.nan,
+            **{f"p{q}_us": float(v) for q, v in zip(PERCENTILES, p)},
+            "max_us": float(us.max()) if len(us) else np.nan}
+
+
+# -------------------------------------------------------------------------
+# Primitives
+# -------------------------------------------------------------------------
+def bench_wire_in(fpga, n: int):
+    dev = fpga.dev
+    value = dev.GetWireInValue(cfg.EP_WI_CTRL)
+
+    def call():
+        dev.SetWireInValue(cfg.EP_WI_CTRL, value)
+        dev.UpdateWireIns()
+    return time_calls(call, n)
+
+
+def bench_wire_out(fpga, n: int):
+    dev = fpga.dev
+
+    def call():
+        dev.UpdateWireOuts()
+        dev.GetWireOutValue(cfg.EP_WO_STATUS)
+    return time_calls(call, n)
+
+
+def bench_trigger_in(fpga, n: int):
+    dev = fpga.dev
+    return time_calls(lambda: dev.ActivateTriggerIn(cfg.EP_TI_MAIN, cfg.TRIG_FLIP_BIT), n)
+
+
+def bench_trigger_poll(fpga, n: int):
+    dev = fpga.dev
+
+    def call():
+        dev.UpdateTriggerOuts()
+        dev.IsTriggered(cfg.EP_TO_MAIN, cfg.TRIG_TASK_DONE_BIT)
+    return time_calls(call, n)
+
+
+def bench_task_round_trip(fpga, n: int, warmup: int = 5):
+    """(latency us, TriggerOut polls per round trip, timeouts)."""
+    dev = fpga.dev
+    fpga.set_modes(task_mode=0, dac_mode=0, adc_mode=1)
+    fpga.config_adc(twake=1, tsample=3, nsam=1)
+    clock = time.perf_counter_ns
+    timeout_ns = int(ROUND_TRIP_TIMEOUT_S * 1e9)
+    lat = np.empty(n, dtype=np.int64)
+    polls = np.zeros(n, dtype=np.int64)
+    timeouts = 0
+    for i in range(-warmup, n):
+        t0 = clock()
+        dev.ActivateTriggerIn(cfg.EP_TI_MAIN, cfg.TRIG_TASK_BIT)
+        k = 0
+        while True:
+            dev.UpdateTriggerOuts()
+            k += 1
+            if dev.IsTriggered(cfg.EP_TO_MAIN, cfg.TRIG_TASK_DONE_BIT):
+                break
+            if clock() - t0 > timeout_ns:
+                timeouts += i >= 0
+                break
+        if i >= 0:
+            lat[i] = clock() - t0
+            polls[i] = k
+    return lat / 1e3, polls, timeouts
+
+
+# -------------------------------------------------------------------------
+# Report
+# -------------------------------------------------------------------------
+def git_revision():
+    try:
+        out = subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True,
+                             text=True, timeout=5, cwd=Path(__file__).parent)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(fpga, n: int = 1000, backend: str = "hardware") -> dict:
+    """Benchmark every primitive on an open, configured OKTop; returns the report."""
+    t0 = time.perf_counter()
+    results = {
+        "wire_in": latency_stats(bench_wire_in(fpga, n)),
+        "wire_out": latency_stats(bench_wire_out(fpga, n)),
+        "trigger_in": latency_stats(bench_trigger_in(fpga, n)),
+        "trigger_poll": latency_stats(bench_trigger_poll(fpga, n)),
+    }
+    lat, polls, timeouts = bench_task_round_trip(fpga, n)
+    results["task_round_trip"] = {**latency_stats(lat), "mean_polls": float(polls.mean()),
+                                  "timeouts": timeouts}
+    fpga.system_reset()
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "revision": git_revision(),
+        "backend": backend,
+        "build_id": fpga.read_build_id(),
+        "n": n,
+        "elapsed_s": time.perf_counter() - t0,
+        "results": results,
+    }
+
+
+def save_report(report: dict, out_dir=REPORT_DIR) -> Path:
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.fromisoformat(report["created"]).strftime("%Y%m%d_%H%M%S")
+    path = out_dir / f"latency_{report['host']}_{report['backend']}_{stamp}.json"
+    path.write_text(json.dumps(report, indent=1))
+    return path
+
+
+def format_report(report: dict) -> str:
+    lines = [f"{report['host']} ({report['backend']}, rev {report['revision']}, "
+             f"build 0x{report['build_id']:08X}), n={report['n']}",
+             f"{'primitive':<16}" + "".join(f"{c:>10}" for c in ("p50 us", "p90 us", "p99 us", "max us"))]
+    for name, r in report["results"].items():
+        lines.append(f"{name:<16}" + "".join(f"{r[k]:>10.1f}" for k in ("p50_us", "p90_us", "p99_us", "max_us")))
+    rt = report["results"].get("task_round_trip")
+    if rt:
+        lines.append(f"round trip: {rt['mean_polls']:.1f} polls on average, {rt['timeouts']} timeouts")
+    return "\n".join(lines)
+
+
+def compare_reports(a: dict, b: dict) -> str:
+    """p50 / p99 of b against a, per primitive."""
+    lines = [f"A: {a['host']} {a['backend']} rev {a['revision']} ({a['created']})",
+             f"B: {b['host']} {b['backend']} rev {b['revision']} ({b['created']})",
+             f"{'primitive':<16}{'p50 A':>10}{'p50 B':>10}{'B/A':>7}{'p99 A':>10}{'p99 B':>10}{'B/A':>7}"]
+    for name in a["results"]:
+        if name not in b["results"]:
+            continue
+        ra, rb = a["results"][name], b["results"][name]
+        row = f"{name:<16}"
+        for k in ("p50_us", "p99_us"):
+            ratio = rb[k] / ra[k] if ra[k] else float("nan")
+            row += f"{ra[k]:>10.1f}{rb[k]:>10.1f}{ratio:>7.2f}"
+        lines.append(row)
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="FrontPanel control-path latency benchmark")
+    ap.add_argument("-n", type=int, default=1000, help="calls per primitive")
+    ap.add_argument("--bitfile", default=cfg.BITFILE)
+    ap.add_argument("--serial", default="")
+    ap.add_argument("--emulate", action="store_true", help="use the ok_emulator backend")
+    ap.add_argument("--out-dir", default=str(REPORT_DIR))
+    ap.add_argument("--compare", nargs=2, metavar=("A", "B"), help="compare two saved reports")
+    args = ap.parse_args(argv)
+
+    if args.compare:
+        a, b = (json.loads(Path(p).read_text()) for p in args.compare)
+        print(compare_reports(a, b))
+        return
+
+    import oktop_driver as oktop
+    dev = None
+    if args.emulate:
+        import ok_emulator
+        dev = ok_emulator.EmulatedFrontPanel()
+    fpga = oktop.OKTop(args.bitfile, args.serial, dev=dev)
+    fpga.open_and_configure()
+    report = run(fpga, args.n, "emulator" if args.emulate else "hardware")
+    print(format_report(report))
+    print(f"Saved report to {save_report(report, args.out_dir)}")
+
+
+if __name__ == "__main__":
+    main()
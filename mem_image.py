@@ -0,0 +1,95 @@
+# mem_image.py
+#
+# Vectorized conversion between NumPy uint32 arrays and the Verilog
+# $readmemb images read by Verilog/Simulation/TOP_tst.v
+# (Memory/mem_wav.mem, mem_config_msb.mem, mem_config_lsb.mem):
+# one 32-bit binary word per line.
+import re
+from pathlib import Path
+
+import numpy as np
+
+MEM_DIR = Path(__file__).resolve().parent / "Memory"
+
+_ASCII_0 = ord("0")
+# byte value -> its 8 ASCII binary digits
+_BYTE_DIGITS = (np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1) + _ASCII_0)
+
+
+def words_to_mem_bytes(words) -> bytes:
+    """Render uint32 words as newline-separated 32-bit binary strings."""
+    w = np.ascontiguousarray(np.asarray(words, dtype=np.uint32).astype(">u4"))
+    lines = np.empty((len(w), 33), dtype=np.uint8)
+    lines[:, :32] = _BYTE_DIGITS[w.view(np.uint8)].reshape(-1, 32)
+    lines[:, 32] = ord("\n")
+    return lines.tobytes()
+
+
+def write_mem(path, words):
+    """Write words (uint32) as a $readmemb image."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(words_to_mem_bytes(words))
+
+
+def mem_bytes_to_words(raw: bytes):
+    """
+    Parse a $readmemb image into a uint32 array. Comments and '_'
+    separators are accepted; '@address' directives are not.
+    """
+    # Fast path: the fixed 32-digits-per-line layout written by write_mem
+    for width in (33, 34):                          # LF or CRLF endings
+        if raw and len(raw) % width == 0:
+            lines = np.frombuffer(raw, dtype=np.uint8).reshape(-1, width)
+            digits = lines[:, :32] - _ASCII_0
+            if (lines[:, -1] == ord("\n")).all() and digits.max() <= 1:
+                return np.packbits(digits, axis=1).view(">u4").ravel().astype(np.uint32)
+    if b"/" in raw or b"_" in raw:
+        raw = re.sub(rb"//[^\n]*|/\*.*?\*/", b" ", raw, flags=re.S).replace(b"_", b"")
+    if b"@" in raw:
+        raise ValueError("Address directives (@) are not supported.")
+    tokens = raw.split()
+    if not tokens:
+        return np.zeros(0, dtype=np.uint32)
+    joined = b"".join(tokens)
+    if len(joined) == 32 * len(tokens):
+        bits = np.frombuffer(joined, dtype=np.uint8) - _ASCII_0
+        if bits.max() > 1:
+            raise ValueError("Memory image contains non-binary digits.")
+        return np.packbits(bits.reshape(-1, 32), axis=1).view(">u4").ravel().astype(np.uint32)
+    # Mixed word widths: fall back to per-token parsing
+    return np.array([int(t, 2) for t in tokens], dtype=np.uint32)
+
+
+def read_mem(path):
+    """Read a $readmemb image into a uint32 array."""
+    return mem_bytes_to_words(Path(path).read_bytes())
+
+
+# -------------------------------------------------------------------------
+# Testbench stimulus export
+# -------------------------------------------------------------------------
+def export_waveform(wav, path=MEM_DIR / "mem_wav.mem"):
+    """Write a waveform (e.g. from OKTop.gen_ramp / gen_cv / gen_dpv)."""
+    write_mem(path, wav)
+
+
+def export_spi_config(fpga, n_words: int = 2,
+                      msb_path=MEM_DIR / "mem_config_msb.mem",
+                      lsb_path=MEM_DIR / "mem_config_lsb.mem"):
+    """
+    Write the configuration words for the driver's current settings
+    (OKTop.spi_config_words), repeated n_words times as TOP_tst.v
+    shifts the configuration twice.
+    """
+    msb, lsb = fpga.spi_config_words()
+    write_mem(msb_path, np.full(n_words, msb, dtype=np.uint32))
+    write_mem(lsb_path, np.full(n_words, lsb, dtype=np.uint32))
+
+
+def export_stimulus(fpga, wav, mem_dir=MEM_DIR):
+    """Regenerate all three testbench memory images."""
+    mem_dir = Path(mem_dir)
+    export_waveform(wav, mem_dir / "mem_wav.mem")
+    export_spi_config(fpga, msb_path=mem_dir / "mem_config_msb.mem",
+                      lsb_path=mem_dir / "mem_config_lsb.mem")
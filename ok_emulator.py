@@ -0,0 +1,384 @@
+# ok_emulator.py
+#
+# Software stand-in for ok.okCFrontPanel running the OKTOP / WETOP design.
+# Implements the FrontPanel calls used by OKTop so the driver, scripts and
+# tools can be exercised without a board. Timing is ideal: the task FSMs
+# produce their ADC words as fast as the host polls, one ping-pong FIFO
+# half per UpdateTriggerOuts() call.
+from collections import deque
+
+import numpy as np
+
+import oktop_config as cfg
+import capture_plan
+import cic_decim
+
+
+DATA_ALIGNMENT_ERROR = -18   # okCFrontPanel.DataAlignmentError
+
+
+def dummy_adc_bits(t0: int, n: int):
+    """Alternating 0/1 bitstream, like dummyADC.v (t0 = 512 kHz cycle index)."""
+    return ((np.arange(t0, t0 + n, dtype=np.int64)) & 1).astype(np.uint8)
+
+
+def coi2_outputs(bits):
+    """
+    COI2_Filter value written at the end of each incremental conversion.
+    bits: (n_conv, n_updates) array of the ADC bits clocked into the
+    filter after its reset is released. Returns uint32 codes.
+    """
+    n_updates = bits.shape[1]
+    # dout = sum_j sum_{i<j} b_i  ->  each bit weighted by (n_updates-1-i)
+    weights = np.arange(n_updates - 1, -1, -1, dtype=np.uint64)
+    codes = bits.astype(np.uint64) @ weights
+    return (codes & 0xFFFFFFFF).astype(np.uint32)
+
+
+class EmulatedFrontPanel:
+    """
+    Emulated okCFrontPanel for the OKTOP design.
+
+    adc_source: callable (t0, n) -> uint8 array of ADC_OUT bits for the
+                512 kHz cycles t0 .. t0+n-1 of the running task.
+    """
+
+    SPI_FIFO_DEPTH = cfg.SPI_OUT_FIFO_DEPTH
+    # DAC steps applied per UpdateTriggerOuts() when no FIFO flip intervenes
+    DAC_STEPS_PER_UPDATE = 128
+
+    def __init__(self, adc_source=dummy_adc_bits, fifo_depth: int = cfg.FIFO_DEPTH,
+                 build_id: int = 0):
+        self.adc_source = adc_source
+        self.fifo_depth = fifo_depth
+        self.build_id = build_id
+        self.is_open = False
+        self.configured = False
+        self._wi_host = [0] * 0x20
+        self._wi = [0] * 0x20
+        self._wo = {}
+        self._trig_latched = 0
+        self._trig_pending = 0
+        # Drop injection: flip numbers (1-based, per task) whose flip
+        # TriggerOut is suppressed, so the host never reads that half
+        self.drop_flips = set()
+        # Bit error rate applied to words read back from the loopback FIFO
+        self.tst_ber = 0.0
+        self._rng = np.random.default_rng()
+        self._reset_logic()
+
+    # ---------------------------------------------------------------------
+    # Internal model
+    # ---------------------------------------------------------------------
+    def _reset_logic(self):
+        """Equivalent of rst_we: clears counters, FIFOs and FSM state."""
+        self.spi_cnt = 0
+        self.task_cnt = 0
+        self.status = 0
+        self._spi_shift = [0, 0]      # dummySPI shift registers (config, DAC)
+        self._spi_out = []            # (msb, lsb) words in the SPI out FIFOs
+        self._spi_rd = [0, 0]         # read positions of the MSB / LSB FIFOs
+        self._wav_fifo = deque()
+        self._wav_last = 0
+        self.wav_underruns = 0        # DAC steps that found the wav FIFO empty
+        self.wav_overflows = 0        # PipeIn words dropped on a full wav FIFO
+        self._pp = [[], []]           # ping / pong halves (lists of chunks)
+        self._pp_len = [0, 0]
+        self._sel = 0                 # half currently written by the ADC
+        self._seq = 0                 # ADC_control free-running sample counter
+        self._clear_pp_stats()
+        self._stream = None
+        self._stream_buf = None
+        self._stream_done = False
+        self._tst_fifo = np.zeros(0, dtype=np.uint32)   # PipeIn 0x83 -> PipeOut 0xA3 loopback
+        self.tst_overflows = 0        # PipeIn words dropped on a full loopback FIFO
+
+    def _clear_pp_stats(self):
+        """FIFO_PP flip / word counters and overflow flags (clr_stats)."""
+        self.pp_flips = 0
+        self.pp_words = 0
+        self.pp_overflow = 0
+
+    def inject_drop(self, *flips: int):
+        """Suppress the flip TriggerOut of the given flips (1-based) of the next tasks."""
+        self.drop_flips.update(flips)
+
+    def _spi_transfer(self, sel: int, word40: int):
+        prev = self._spi_shift[sel]
+        self._spi_shift[sel] = word40 & 0xFF_FFFF_FFFF
+        if len(self._spi_out) < self.SPI_FIFO_DEPTH:
+            self._spi_out.append(((prev >> 32) & 0xFF, prev & 0xFFFFFFFF))
+        self.spi_cnt = (self.spi_cnt + 1) & 0xFFFFFFFF
+
+    def _config_words(self):
+        wi = self._wi
+        msb = ((wi[0x09] & 0xF) << 4) | ((wi[0x0A] & 0x3) << 2) | (wi[0x0B] & 0x3)
+        lsb = ((wi[0x0C] & 0x3) << 30) | ((wi[0x0D] & 0xF) << 26) \
+            | ((wi[0x0E] & 0x3) << 24) | ((wi[0x0F] & 0x7F) << 17) \
+            | ((wi[0x10] & 0xF) << 13) | ((wi[0x11] & 0x3) << 11) | (wi[0x12] & 0x7FF)
+        return msb, lsb
+
+    def _adc_block(self, t0: int):
+        """Yield the ADC words of one ADC_control run triggered at cycle t0."""
+        wi = self._wi
+        adc_mode = bool(wi[cfg.EP_WI_CTRL] & cfg.CTRL_ADC_MODE_BIT)
+        twake = max(wi[cfg.EP_WI_ADC_TWAKE], 1)
+        tsample = max(wi[cfg.EP_WI_ADC_TSAMPLE], 1)
+        nsam = max(wi[cfg.EP_WI_ADC_NSAM], 1)
+        t = t0 + twake + 1            # S1 wake-up, then one S2 cycle
+        if not adc_mode and wi[cfg.EP_WI_CTRL] & cfg.CTRL_CIC_BIT:
+            # CIC_Decimator: the bit-exact host model, restarted every run
+            cic = wi[cfg.EP_WI_ADC_CIC]
+            dec = cic_decim.CicDecimator(cic >> cfg.CIC_ORDER_SHIFT, cic & cfg.CIC_RATIO_MASK)
+            step = self.fifo_depth * dec.ratio
+            for k in range(0, tsample, step):
+                words = dec.process(self.adc_source(t + k, min(step, tsample - k)))
+                if len(words):
+                    yield words
+            return
+        if not adc_mode and wi[cfg.EP_WI_CTRL] & cfg.CTRL_PACK_BIT:
+            # Packed: PACK_BITS cycles per word, first in bit 0, last word zero-padded
+            step = self.fifo_depth * cfg.PACK_BITS
+            for k in range(0, tsample, step):
+                n = min(step, tsample - k)
+                bits = np.zeros(-(-n // cfg.PACK_BITS) * cfg.PACK_BITS, dtype=np.uint8)
+                bits[:n] = self.adc_source(t + k, n)
+                yield np.packbits(bits, bitorder="little").view("<u4").astype(np.uint32)
+            return
+        if not adc_mode:
+            seq_en = bool(wi[cfg.EP_WI_CTRL] & cfg.CTRL_SEQ_CNT_BIT)
+            step = self.fifo_depth
+            for k in range(0, tsample, step):
+                n = min(step, tsample - k)
+                words = self.adc_source(t + k, n).astype(np.uint32)
+                if seq_en:
+                    seq = (np.arange(self._seq, self._seq + n, dtype=np.uint64) & 0x7FFFFFFF)
+                    words |= (seq << 1).astype(np.uint32)
+                self._seq = (self._seq + n) & 0x7FFFFFFF
+                yield words
+            return
+        # Incremental: each conversion is one S2 cycle + TSAMPLE S3 cycles,
+        # the filter sees TSAMPLE-1 updates before its output is written.
+        per_chunk = max(1, min(nsam, (1 << 20) // tsample))
+        for c0 in range(0, nsam, per_chunk):
+            nc = min(per_chunk, nsam - c0)
+            period = tsample + 1
+            bits = self.adc_source(t + c0 * period, nc * period - 1)
+            bits = np.concatenate([bits, np.zeros(1, np.uint8)])
+            bits = bits.reshape(nc, period)[:, :tsample - 1]
+            yield coi2_outputs(bits)
+
+    def _task_stream(self):
+        """Yield uint32 chunks of every ADC word the triggered task writes."""
+        wi = self._wi
+        task_mode = bool(wi[cfg.EP_WI_CTRL] & cfg.CTRL_TASK_MODE_BIT)
+        if not task_mode:
+            yield from self._adc_block(0)
+            return
+        dac_mode = bool(wi[cfg.EP_WI_CTRL] & cfg.CTRL_DAC_MODE_BIT)
+        adc_mode = bool(wi[cfg.EP_WI_CTRL] & cfg.CTRL_ADC_MODE_BIT)
+        runs = {}
+        if dac_mode:
+            busy = capture_plan.adc_run_cycles(
+                adc_mode, wi[cfg.EP_WI_ADC_TWAKE], max(wi[cfg.EP_WI_ADC_TSAMPLE], 1),
+                max(wi[cfg.EP_WI_ADC_NSAM], 1))
+            runs = dict(capture_plan.dac_adc_schedule(
+                wi[cfg.EP_WI_DAC_T1], wi[cfg.EP_WI_DAC_T2], wi[cfg.EP_WI_DAC_TS1],
+                wi[cfg.EP_WI_DAC_TS2], wi[cfg.EP_WI_DAC_NSAM], busy))
+        for k in range(wi[cfg.EP_WI_DAC_NSAM]):
+            self._spi_transfer(1, self._pop_wav())
+            yield np.zeros(0, dtype=np.uint32)     # marks one applied DAC step
+            if k in runs:
+                yield from self._adc_block(runs[k])
+
+    def _pop_wav(self):
+        """Read one DAC word; raises wav_low when the FIFO drains to the threshold."""
+        if self._wav_fifo:
+            self._wav_last = self._wav_fifo.popleft()
+            if len(self._wav_fifo) == cfg.WAV_FIFO_LOW:
+                self._trig_pending |= 1 << 2       # wav_low_pulse
+        else:
+            self.wav_underruns += 1
+        return self._wav_last
+
+    def _write_half(self, words):
+        self._pp[self._sel].append(words)
+        self._pp_len[self._sel] += len(words)
+        self.pp_words = (self.pp_words + len(words)) & 0xFFFFFFFF
+
+    def _flip(self):
+        self._sel ^= 1
+        self.pp_flips = (self.pp_flips + 1) & 0xFFFFFFFF
+        # Unread words left in the new write half are overwritten
+        if self._pp_len[self._sel]:
+            self.pp_overflow |= cfg.PP_OVF_UNREAD_BIT
+        self._pp[self._sel] = []
+        self._pp_len[self._sel] = 0
+
+    def _advance(self):
+        """Run the task until the next FIFO flip or the end of the task."""
+        if self._stream is None:
+            return
+        if self._stream_done:
+            self._stream = None
+            self.task_cnt = (self.task_cnt + 1) & 0xFFFFFFFF
+            self._trig_pending |= 1 << 0      # task_done_pulse
+            return
+        room = (self.fifo_depth - 1) - self._pp_len[self._sel]
+        steps = 0
+        while room > 0:
+            if self._stream_buf is None or len(self._stream_buf) == 0:
+                self._stream_buf = next(self._stream, None)
+                if self._stream_buf is None:
+                    self._stream_done = True
+                    return
+                if len(self._stream_buf) == 0:
+                    # DAC step: pause so the host can service a wav refill
+                    steps += 1
+                    if steps >= self.DAC_STEPS_PER_UPDATE or self._trig_pending & (1 << 2):
+                        return
+                    continue
+            take = self._stream_buf[:room]
+            self._stream_buf = self._stream_buf[room:]
+            self._write_half(take)
+            room -= len(take)
+        # almost_full on the write half flips the ping-pong FIFO
+        self._flip()
+        if self.pp_flips not in self.drop_flips:
+            self._trig_pending |= 1 << 1      # full_ppfifo_pulse
+
+    def _read_half(self, n_words: int):
+        half = self._sel ^ 1
+        chunks = self._pp[half]
+        data = np.concatenate(chunks) if chunks else np.zeros(0, np.uint32)
+        out = data[:n_words]
+        rest = data[n_words:]
+        self._pp[half] = [rest] if len(rest) else []
+        self._pp_len[half] = len(rest)
+        return out
+
+    # ---------------------------------------------------------------------
+    # okCFrontPanel API subset
+    # ---------------------------------------------------------------------
+    def OpenBySerial(self, serial: str = ""):
+        self.is_open = True
+        return 0
+
+    def IsOpen(self):
+        return self.is_open
+
+    def Close(self):
+        self.is_open = False
+
+    def ResetFPGA(self):
+        self.configured = False
+        return 0
+
+    def ConfigureFPGA(self, strFilename: str):
+        self.configured = True
+        self._wi_host = [0] * 0x20
+        self._wi = [0] * 0x20
+        self._reset_logic()
+        return 0
+
+    def IsFrontPanelEnabled(self):
+        return self.configured
+
+    def SetWireInValue(self, epAddr: int, val: int, mask: int = 0xFFFFFFFF):
+        self._wi_host[epAddr] = (self._wi_host[epAddr] & ~mask) | (val & mask)
+        return 0
+
+    def GetWireInValue(self, epAddr: int):
+        return self._wi_host[epAddr]
+
+    def UpdateWireIns(self):
+        self._wi = list(self._wi_host)
+        if self._wi[cfg.EP_WI_CTRL] & cfg.CTRL_RST_BIT:
+            self._reset_logic()
+        return 0
+
+    def UpdateWireOuts(self):
+        self._wo = {
+            cfg.EP_WO_STATUS: self.status,
+            cfg.EP_WO_SPI_CNT: self.spi_cnt,
+            cfg.EP_WO_TSK_CNT: self.task_cnt,
+            cfg.EP_WO_BUILD_ID: self.build_id,
+            cfg.EP_WO_PP_FLIP_CNT: self.pp_flips,
+            cfg.EP_WO_PP_WORD_CNT: self.pp_words,
+            cfg.EP_WO_PP_STATUS: self.pp_overflow,
+        }
+        return 0
+
+    def GetWireOutValue(self, epAddr: int):
+        return self._wo.get(epAddr, 0)
+
+    def ActivateTriggerIn(self, epAddr: int, bit: int):
+        if epAddr != cfg.EP_TI_MAIN or self._wi[cfg.EP_WI_CTRL] & cfg.CTRL_RST_BIT:
+            return 0
+        if bit == cfg.TRIG_CONFIG_BIT:
+            msb, lsb = self._config_words()
+            self._spi_transfer(0, (msb << 32) | lsb)
+        elif bit == cfg.TRIG_TASK_BIT and self._stream is None:
+            self._stream = self._task_stream()
+            self._stream_buf = None
+            self._stream_done = False
+            self._clear_pp_stats()
+        elif bit == cfg.TRIG_FLIP_BIT:
+            self._flip()
+        elif bit == cfg.TRIG_WAV_CLR_BIT:
+            self._wav_fifo.clear()
+        return 0
+
+    def UpdateTriggerOuts(self):
+        self._advance()
+        self._trig_latched = self._trig_pending
+        self._trig_pending = 0
+        return 0
+
+    def IsTriggered(self, epAddr: int, mask: int):
+        return epAddr == cfg.EP_TO_MAIN and bool(self._trig_latched & mask)
+
+    def GetTriggerOutVector(self, epAddr: int):
+        return self._trig_latched if epAddr == cfg.EP_TO_MAIN else 0
+
+    def WriteToPipeIn(self, epAddr: int, data):
+        if len(data) % cfg.PIPE_ALIGN_BYTES:
+            return DATA_ALIGNMENT_ERROR
+        words = np.frombuffer(bytes(data), dtype="<u4")
+        if epAddr == cfg.EP_PI_WAVEFORM:
+            room = cfg.WAV_FIFO_DEPTH - len(self._wav_fifo)
+            self._wav_fifo.extend(words[:room].tolist())
+            self.wav_overflows += max(0, len(words) - room)
+        elif epAddr == cfg.EP_PI_TST_IN:
+            room = cfg.TST_FIFO_DEPTH - len(self._tst_fifo)
+            self._tst_fifo = np.concatenate((self._tst_fifo, words[:room]))
+            self.tst_overflows += max(0, len(words) - room)
+        return len(data)
+
+    def ReadFromPipeOut(self, epAddr: int, data):
+        if len(data) % cfg.PIPE_ALIGN_BYTES:
+            return DATA_ALIGNMENT_ERROR
+        n_words = len(data) // 4
+        out = np.zeros(n_words, dtype="<u4")
+        if epAddr == cfg.EP_PO_ADC_OUT:
+            got = self._read_half(n_words)
+            out[:len(got)] = got
+        elif epAddr == cfg.EP_PO_TST_OUT:
+            got = self._tst_fifo[:n_words]
+            self._tst_fifo = self._tst_fifo[n_words:]
+            out[:len(got)] = got
+            if self.tst_ber > 0:
+                bits = self._rng.integers(0, 32 * len(got), self._rng.binomial(32 * len(got), self.tst_ber))
+                np.bitwise_xor.at(out, bits // 32, (np.uint32(1) << (bits % 32)).astype(np.uint32))
+        elif epAddr in (cfg.EP_PO_SPI_OUT_MSB, cfg.EP_PO_SPI_OUT_LSB):
+            idx = 0 if epAddr == cfg.EP_PO_SPI_OUT_MSB else 1
+            # MSB and LSB are separate FIFOs; track read positions per side
+            pos = self._spi_rd
+            words = [w[idx] for w in self._spi_out[pos[idx]:pos[idx] + n_words]]
+            pos[idx] += len(words)
+            out[:len(words)] = words
+            drop = min(pos)
+            self._spi_out = self._spi_out[drop:]
+            self._spi_rd = [pos[0] - drop, pos[1] - drop]
+        memoryview(data)[:n_words * 4] = out.tobytes()
+        return n_words * 4
@@ -9,7 +9,33 @@ BITFILE = "weok.bit"
 # ------------------------------
 VREF_MV = 2560.0  # DAC reference (mV)
 
+# Nominal ADC input current at normalized full scale for cc_gain = 1,
+# cc_sel = 1 and VREF_MV; scales with cc_sel / cc_gain. Per-chip
+# calibration coefficients (adc_units.ConversionParams) override it.
+ADC_FS_CURRENT_A = 100e-9
+
+LOGIC_CLK_HZ = 512e3  # WETOP logic clock (weClk), sets all task timings
+
 FIFO_DEPTH = 131072  # depth of the ADC ping-pong FIFOs (must match HDL)
+FIFO_HALF_WORDS = FIFO_DEPTH - 1  # words in a half when almost_full flips it
+PIPE_ALIGN_BYTES = 16  # USB 3.0 pipe transfers must be a multiple of 16 bytes
+
+WAV_FIFO_DEPTH = 1024  # depth of the waveform FIFO (fifo_w32_d1024)
+SPI_OUT_FIFO_DEPTH = 1024  # depth of each SPI readback FIFO (spi_out_msb/lsb_fifo)
+WAV_FIFO_LOW   = 256   # prog_empty threshold that raises TRIG_WAV_LOW_BIT (must match HDL)
+
+TST_FIFO_DEPTH = 16384  # loopback FIFO between EP_PI_TST_IN and EP_PO_TST_OUT (must match HDL)
+
+# Host throughput assumed by resource_plan (sustained rates, bytes/s)
+PIPE_READ_BPS    = 100e6  # PipeOut reads over USB 3.0
+STREAM_WRITE_BPS = 20e6   # chunked_capture compression + disk writes
+
+SPI_DONE_TIMEOUT_S = 1.0  # max wait for the SPI done counter after a config trigger
+ANALOG_SETTLE_S    = 10.0 # analog settling wait after SPI config (s). The SPI done counter
+                           # replaces the wait for the transfer itself; this is the bias /
+                           # reference settling of the chip, not yet measured, so the
+                           # bring-up keeps its 10 s. Scripts with a known settling time
+                           # pass it to settle() (calibration.py: 0.05 s, example.py: 1 s).
 
 # ------------------------------
 # OKTOP ENDPOINT MAP
@@ -23,6 +49,11 @@ CTRL_DAC_MODE_BIT  = 1 << 2  # dac_mode
 CTRL_ADC_MODE_BIT  = 1 << 3  # adc_mode
 CTRL_ION_SW_BIT    = 1 << 4  # ion_switch
 CTRL_FORCE_AWAKE_BIT = 1 << 5  # force_awake
+CTRL_SEQ_CNT_BIT   = 1 << 6  # free-running: sample counter in ADC word bits 31:1 (sample_seq)
+CTRL_PACK_BIT      = 1 << 7  # free-running: PACK_BITS samples per ADC word, first in bit 0
+CTRL_CIC_BIT       = 1 << 8  # free-running: CIC-decimated 32-bit samples (cic_decim, EP_WI_ADC_CIC)
+
+PACK_BITS = 32  # free-running samples per packed ADC word (must match HDL)
 
 # WireIn 0x01–0x05 : DAC Settings
 EP_WI_DAC_T1   = 0x01
@@ -87,6 +118,12 @@ LDO_BIT_ION1V8 = 1<<5
 LDO_BIT_DVDD1V8 = 1<<6
 LDO_BIT_AVDD1V8 = 1<<7
 
+# WireIn 0x14 : CIC decimator (free-running, CTRL_CIC_BIT)
+EP_WI_ADC_CIC = 0x14
+CIC_RATIO_MASK  = 0xFFFF   # bits 15:0  decimation ratio R
+CIC_ORDER_SHIFT = 16       # bits 18:16 order N
+CIC_MAX_ORDER   = 5        # NMAX of CIC_Decimator.v
+
 # WireOut 0x20 : status
 EP_WO_STATUS = 0x20
 STATUS_DONE_SPI_BIT  = 1 << 0
@@ -96,22 +133,36 @@ STATUS_DONE_TASK_BIT = 1 << 1
 EP_WO_SPI_CNT = 0x21
 EP_WO_TSK_CNT = 0x22
 
+# WireOut 0x23 : build ID (bitstream USR_ACCESS value)
+EP_WO_BUILD_ID = 0x23
+
+# WireOut 0x24–0x26 : FIFO_PP integrity counters, cleared by trigger_task
+EP_WO_PP_FLIP_CNT = 0x24   # ping-pong flips (almost_full + forced)
+EP_WO_PP_WORD_CNT = 0x25   # ADC words written into FIFO_PP
+EP_WO_PP_STATUS   = 0x26   # sticky overflow flags
+PP_OVF_UNREAD_BIT = 1 << 0  # flipped onto a half the host had not drained
+PP_OVF_FULL_BIT   = 1 << 1  # word written while the write half was full (dropped)
+
 # TriggerIn 0x40
 EP_TI_MAIN       = 0x40
 TRIG_CONFIG_BIT  = 0   # maps to trigger_config
 TRIG_TASK_BIT    = 1   # maps to trigger_task
+TRIG_FLIP_BIT    = 2   # maps to force_flip
+TRIG_WAV_CLR_BIT = 3   # maps to wav_clr (empties the waveform FIFO)
+WAV_CLR_S        = 0.001  # wait after wav_clr until the FIFO accepts writes again
 
 # TriggerOut 0x60
 EP_TO_MAIN          = 0x60
 TRIG_TASK_DONE_BIT  = 1      # task_done_pulse
 TRIG_FIFO_FLIP_BIT  = 2     # fifo_flip_pulse
+TRIG_WAV_LOW_BIT    = 4     # wav_low_pulse (waveform FIFO almost empty)
 
 # PipeIn
 EP_PI_WAVEFORM     = 0x80   # waveform FIFO
-EP_PI_TST_IN       = 0x83   # test input FIFO (for debug)
+EP_PI_TST_IN       = 0x83   # test loopback FIFO input (usb_loopback.py)
 
 # PipeOut
 EP_PO_SPI_OUT_MSB = 0xA0    # SPI output MSB FIFO
 EP_PO_SPI_OUT_LSB = 0xA1    # SPI output MSB FIFO
 EP_PO_ADC_OUT     = 0xA2    # ADC output FIFO
-EP_PO_TST_OUT     = 0xA3    # test output FIFO (for debug)
+EP_PO_TST_OUT     = 0xA3    # test loopback FIFO output (usb_loopback.py)
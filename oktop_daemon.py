@@ -0,0 +1,361 @@
+# oktop_daemon.py
+#
+# Long-lived device session: a local daemon owns the open OKTop device
+# (and optionally the CS580 / DS360) so back-to-back scripts skip the
+# device open / FPGA configuration entirely.
+#
+#   python oktop_daemon.py                      # real board, cfg.BITFILE
+#   python oktop_daemon.py --emulate            # ok_emulator backend
+#   python oktop_daemon.py --cs580 COM3 --ds360 GPIB0::8::INSTR
+#
+# Scripts then use:
+#   import oktop_daemon
+#   sess = oktop_daemon.connect()
+#   fpga = sess.fpga                 # same methods as oktop_driver.OKTop
+#   data = fpga.task_watcher()
+#
+# Protocol (Unix domain socket, one request in flight per connection):
+#   request  : <I length> <B target> <B name_len> <name> <marshal (args, kwargs)>
+#   response : <I length> <B status> <payload>
+#       status 0: payload = marshal(result)
+#       status 1: payload = marshal((exception type name, message))
+#       status 2: payload = marshal((shm name, dtype descr, shape)); the array
+#                 is in a shared-memory block the client copies and unlinks.
+# numpy arrays travel as ("__ndarray__", dtype descr, shape, bytes) inside
+# args, kwargs and results (large results through shm), so both sides get
+# arrays with their dtype back. Capture plans, running statistics and other
+# dataclasses come back as dicts, and a streamed capture (ChunkReader) as a
+# dict with its .wecap path, to be opened with chunked_capture.ChunkReader.
+import argparse
+import builtins
+import dataclasses
+import marshal
+import os
+import socket
+import socketserver
+import struct
+from multiprocessing import shared_memory, resource_tracker
+from pathlib import PurePath
+
+import numpy as np
+
+import oktop_config as cfg
+import chunked_capture
+
+SOCKET_PATH = os.path.join(os.environ.get("XDG_RUNTIME_DIR", "/tmp"), "weechem_oktop.sock")
+
+# Target ids
+TARGET_DAEMON = 0
+TARGET_FPGA   = 1
+TARGET_CS580  = 2
+TARGET_DS360  = 3
+TARGET_NAMES  = {"fpga": TARGET_FPGA, "cs580": TARGET_CS580, "ds360": TARGET_DS360}
+
+STATUS_OK    = 0
+STATUS_ERROR = 1
+STATUS_SHM   = 2
+
+# Results with at least this many elements are returned through shared memory
+SHM_MIN_ITEMS = 4096
+# Tag of an inline-encoded numpy array (see _encode)
+_ARRAY_TAG = "__ndarray__"
+
+_HDR = struct.Struct("<I")
+
+
+# -------------------------------------------------------------------------
+# Framing helpers
+# -------------------------------------------------------------------------
+def _recv_exact(sock, n: int) -> bytes:
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        k = sock.recv_into(view[got:], n - got)
+        if k == 0:
+            raise ConnectionError("Connection closed.")
+        got += k
+    return bytes(buf)
+
+
+def _send_frame(sock, payload: bytes):
+    sock.sendall(_HDR.pack(len(payload)) + payload)
+
+
+def _recv_frame(sock) -> bytes:
+    (n,) = _HDR.unpack(_recv_exact(sock, _HDR.size))
+    return _recv_exact(sock, n)
+
+
+def _encode_array(arr):
+    if arr.dtype.hasobject:
+        raise TypeError("Object arrays cannot be sent to or from the daemon.")
+    arr = np.ascontiguousarray(arr)
+    return (_ARRAY_TAG, np.lib.format.dtype_to_descr(arr.dtype), arr.shape, arr.tobytes())
+
+
+def _encode(value):
+    """numpy scalars to Python values and arrays to tagged tuples, in containers."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return _encode_array(value)
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_encode(v) for v in value)
+    return value
+
+
+def _decode(value):
+    """Rebuild the arrays _encode / _plain tagged inside a marshalled value."""
+    if isinstance(value, tuple):
+        if len(value) == 4 and value[0] == _ARRAY_TAG:
+            _, descr, shape, data = value
+            dtype = np.lib.format.descr_to_dtype(descr)
+            return np.frombuffer(data, dtype).reshape(shape).copy()
+        return tuple(_decode(v) for v in value)
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _decode(v) for k, v in value.items()}
+    return value
+
+
+def _plain(value):
+    """
+    Convert numpy values, containers, dataclasses (CapturePlan, ...),
+    objects with as_dict() (RunningStats, ...) and a ChunkReader so
+    marshal can encode them; arrays are tagged for _decode.
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return _encode_array(value)
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_plain(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return [_plain(v) for v in value]
+    if isinstance(value, PurePath):
+        return str(value)
+    if isinstance(value, chunked_capture.ChunkReader):
+        value.close()
+        return {"path": str(value.path), "n_samples": len(value), "meta": _plain(value.meta)}
+    if hasattr(value, "as_dict"):
+        return _plain(value.as_dict())
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return _plain(dataclasses.asdict(value))
+    return value
+
+
+# -------------------------------------------------------------------------
+# Server
+# -------------------------------------------------------------------------
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                frame = _recv_frame(self.request)
+            except ConnectionError:
+                return
+            _send_frame(self.request, self.server.dispatch(frame))
+            if self.server.stopping:
+                return
+
+
+class DeviceDaemon(socketserver.UnixStreamServer):
+    """Serves method calls on the owned devices, one client at a time."""
+
+    def __init__(self, fpga, cs580=None, ds360=None, path: str = SOCKET_PATH):
+        self.targets = {TARGET_FPGA: fpga, TARGET_CS580: cs580, TARGET_DS360: ds360}
+        self.path = path
+        self.stopping = False
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, _Handler)
+        os.chmod(path, 0o600)
+
+    def _daemon_call(self, name, args, kwargs):
+        if name == "ping":
+            return "pong"
+        if name == "targets":
+            return [n for n, t in TARGET_NAMES.items() if self.targets[t] is not None]
+        if name == "shutdown":
+            self.stopping = True
+            return True
+        raise AttributeError(f"Unknown daemon command '{name}'.")
+
+    def _to_shm(self, arr):
+        arr = np.ascontiguousarray(arr)
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        # The client unlinks the block once copied; keep our tracker out of it
+        resource_tracker.unregister(shm._name, "shared_memory")
+        np.ndarray(arr.shape, arr.dtype, buffer=shm.buf)[...] = arr
+        name = shm.name
+        shm.close()
+        descr = np.lib.format.dtype_to_descr(arr.dtype)
+        return bytes([STATUS_SHM]) + marshal.dumps((name, descr, arr.shape))
+
+    def dispatch(self, frame: bytes) -> bytes:
+        target, name_len = frame[0], frame[1]
+        name = frame[2:2 + name_len].decode("ascii")
+        try:
+            args, kwargs = _decode(marshal.loads(frame[2 + name_len:]))
+            if target == TARGET_DAEMON:
+                result = self._daemon_call(name, args, kwargs)
+            else:
+                obj = self.targets.get(target)
+                if obj is None:
+                    raise RuntimeError(f"Target {target} is not attached to the daemon.")
+                if name.startswith("_"):
+                    raise AttributeError(f"'{name}' is private.")
+                result = getattr(obj, name)(*args, **kwargs)
+            if (isinstance(result, np.ndarray) and result.size >= SHM_MIN_ITEMS
+                    and not result.dtype.hasobject):
+                return self._to_shm(result)
+            try:
+                payload = marshal.dumps(_plain(result))
+            except ValueError:
+                raise TypeError(f"'{name}' returned a {type(result).__name__}, "
+                                f"which the daemon cannot send.") from None
+            return bytes([STATUS_OK]) + payload
+        except Exception as exc:
+            return bytes([STATUS_ERROR]) + marshal.dumps((type(exc).__name__, str(exc)))
+
+    def serve(self):
+        print(f"OKTop daemon listening on {self.path}")
+        try:
+            while not self.stopping:
+                self.handle_request()
+        finally:
+            self.server_close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            print("OKTop daemon stopped.")
+
+
+# -------------------------------------------------------------------------
+# Client
+# -------------------------------------------------------------------------
+class _RemoteTarget:
+    """Attribute proxy: sess.fpga.config_adc(...) -> remote call."""
+
+    def __init__(self, session, target: int):
+        self._session = session
+        self._target = target
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            return self._session.call(self._target, name, *args, **kwargs)
+        call.__name__ = name
+        return call
+
+
+class DaemonSession:
+    def __init__(self, path: str = SOCKET_PATH, timeout: float = None):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+        self.fpga = _RemoteTarget(self, TARGET_FPGA)
+        self.cs580 = _RemoteTarget(self, TARGET_CS580)
+        self.ds360 = _RemoteTarget(self, TARGET_DS360)
+
+    def call(self, target: int, name: str, *args, **kwargs):
+        raw = name.encode("ascii")
+        try:
+            request = marshal.dumps(_encode((args, kwargs)))
+        except ValueError:
+            raise TypeError(f"Arguments of '{name}' cannot be sent to the daemon.") from None
+        _send_frame(self.sock, bytes([target, len(raw)]) + raw + request)
+        resp = _recv_frame(self.sock)
+        status, payload = resp[0], resp[1:]
+        if status == STATUS_OK:
+            return _decode(marshal.loads(payload))
+        if status == STATUS_SHM:
+            shm_name, descr, shape = marshal.loads(payload)
+            shm = shared_memory.SharedMemory(name=shm_name)
+            try:
+                dtype = np.lib.format.descr_to_dtype(descr)
+                return np.ndarray(shape, dtype, buffer=shm.buf).copy()
+            finally:
+                shm.close()
+                shm.unlink()
+        exc_name, msg = marshal.loads(payload)
+        exc_type = getattr(builtins, exc_name, None)
+        if not (isinstance(exc_type, type) and issubclass(exc_type, Exception)):
+            exc_type = RuntimeError
+            msg = f"{exc_name}: {msg}"
+        raise exc_type(msg)
+
+    def ping(self) -> bool:
+        return self.call(TARGET_DAEMON, "ping") == "pong"
+
+    def targets(self):
+        return self.call(TARGET_DAEMON, "targets")
+
+    def shutdown(self):
+        """Ask the daemon to exit after this request."""
+        return self.call(TARGET_DAEMON, "shutdown")
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def connect(path: str = SOCKET_PATH, timeout: float = None) -> DaemonSession:
+    """Connect to a running daemon."""
+    return DaemonSession(path, timeout)
+
+
+# -------------------------------------------------------------------------
+# Entry point
+# -------------------------------------------------------------------------
+def main(argv=None):
+    import oktop_driver as oktop
+
+    ap = argparse.ArgumentParser(description="OKTop device session daemon")
+    ap.add_argument("--socket", default=SOCKET_PATH)
+    ap.add_argument("--bitfile", default=cfg.BITFILE)
+    ap.add_argument("--serial", default="")
+    ap.add_argument("--emulate", action="store_true", help="use the ok_emulator backend")
+    ap.add_argument("--force", action="store_true", help="always reload the bitfile")
+    ap.add_argument("--cs580", default=None, help="CS580 serial port, e.g. COM3")
+    ap.add_argument("--ds360", default=None, help="DS360 VISA address")
+    args = ap.parse_args(argv)
+
+    dev = None
+    if args.emulate:
+        import ok_emulator
+        dev = ok_emulator.EmulatedFrontPanel()
+    fpga = oktop.OKTop(args.bitfile, args.serial, dev=dev)
+    fpga.open_and_configure(force=args.force)
+
+    cs580 = ds360 = None
+    if args.cs580:
+        import cs580_driver
+        cs580 = cs580_driver.CS580(args.cs580)
+    if args.ds360:
+        import ds360_driver
+        ds360 = ds360_driver.DS360(args.ds360)
+
+    try:
+        DeviceDaemon(fpga, cs580, ds360, args.socket).serve()
+    finally:
+        if cs580 is not None:
+            cs580.close()
+        if ds360 is not None:
+            ds360.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,109 @@
 # Python-side driver for the OKTOP / WETOP design.
 # Uses Opal Kelly FrontPanel Python API (ok.py) and the endpoint
 # definitions in oktop_config.py.
+import logging
 import time
-import ok
+import threading
+import numpy as np
 import oktop_config as cfg
+import capture_plan
+import adc_units
+import chunked_capture
+import resource_plan
+import sample_seq
+import cic_decim
+import repeat_stats
+import voltammetry
+import oktop_trace
+
+log = oktop_trace.get_logger("oktop")
+
+try:
+    import ok
+except ImportError:     # FrontPanel runtime (_ok) not installed
+    ok = None
+
+
+class _WordSource:
+    """Pull fixed-size uint32 chunks out of an array or an iterable of words / arrays."""
+
+    def __init__(self, source):
+        if isinstance(source, np.ndarray):
+            source = [source]
+        self._it = iter(source)
+        self._buf = np.zeros(0, dtype=np.uint32)
+        self.exhausted = False
+
+    def take(self, n: int):
+        parts, have = [self._buf], len(self._buf)
+        while have < n and not self.exhausted:
+            item = next(self._it, None)
+            if item is None:
+                self.exhausted = True
+                break
+            chunk = np.atleast_1d(np.asarray(item, dtype=np.uint32))
+            parts.append(chunk)
+            have += len(chunk)
+        data = np.concatenate(parts)
+        self._buf = data[n:]
+        if self.exhausted and not len(self._buf):
+            self._buf = np.zeros(0, dtype=np.uint32)
+        return data[:n]
+
+    def drained(self) -> bool:
+        return self.exhausted and not len(self._buf)
+
+
+class WaveformStreamer(threading.Thread):
+    """
+    Refill thread for the waveform FIFO. task_watcher calls request() on
+    every wav-low TriggerOut; each request writes one chunk that fits in
+    the space above the prog_empty threshold.
+    """
+
+    CHUNK_WORDS = (cfg.WAV_FIFO_DEPTH - cfg.WAV_FIFO_LOW - 4) & ~3
+
+    def __init__(self, fpga, source: _WordSource):
+        super().__init__(name="WaveformStreamer", daemon=True)
+        self.fpga = fpga
+        self.source = source
+        self.written = []
+        self.refills = 0
+        self._wake = threading.Event()
+        self._halt = threading.Event()
+
+    def request(self):
+        self._wake.set()
+
+    def stop(self):
+        self._halt.set()
+        self._wake.set()
+        self.join()
+
+    def run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            if self._halt.is_set() or self.source.drained():
+                return
+            chunk = self.source.take(self.CHUNK_WORDS)
+            if len(chunk):
+                self.written.append(chunk)
+                self.fpga._write_wav_fifo(chunk)
+                self.refills += 1
+
 
 class OKTop:
-    def __init__(self, bitfile: str, serial: str = ""):
-        self.dev = ok.okCFrontPanel()
+    def __init__(self, bitfile: str, serial: str = "", dev=None):
+        """
+        dev: optional FrontPanel-compatible device object (for example
+             ok_emulator.EmulatedFrontPanel); defaults to ok.okCFrontPanel().
+        """
+        if dev is None:
+            if ok is None:
+                raise RuntimeError("Opal Kelly FrontPanel API (ok/_ok) is not available.")
+            dev = ok.okCFrontPanel()
+        self.dev = dev
         self.bitfile = bitfile
         self.serial = serial
         # Shadow for control WireIn (0x00)
@@ -22,17 +118,52 @@ class OKTop:
         self._pstat_i2x_shadow = 0
         # Shadow for LDO ENABLE (0x13)
         self._ldo_en_shadow = 0
+        # Last value written to each directly-set WireIn (trim / CC settings)
+        self._wire_shadow = {}
+        # CC gain / selection as given to set_cc_gain / set_cc_sel (unit conversion)
+        self._cc_gain = None
+        self._cc_sel = None
+        # Timing last written by config_adc / config_dac (for capture planning)
+        self._adc_cfg = None
+        self._dac_cfg = None
+        self._cic_cfg = None
+        # Last waveform written to the waveform FIFO (DAC codes)
+        self._wav_words = None
+        # Waveform refill thread armed by stream_waveform()
+        self._streamer = None
+        # Serializes device access between task_watcher and the refill thread
+        self._dev_lock = threading.Lock()
+        # Reusable receive buffer for one ping-pong FIFO half (rounded up
+        # to the pipe alignment, i.e. FIFO_DEPTH words)
+        self._rx_buf = bytearray(self._pipe_bytes(cfg.FIFO_HALF_WORDS))
+        # Integrity verdict of the last task_watcher capture (check_integrity)
+        self.last_integrity = None
+        # resource_plan.CapturePlan accepted by trigger_task for task_watcher
+        self._plan = None
 
     # ---------------------------------------------------------------------
     # Low-level helpers / device init
     # ---------------------------------------------------------------------
-    def open_and_configure(self):
-        """Open the device and configure the FPGA with the given bitfile."""
-        print("Opening + configuring FPGA...")
+    @oktop_trace.traced("open_and_configure")
+    def open_and_configure(self, force: bool = False):
+        """
+        Open the device and configure the FPGA with the given bitfile.
+
+        If the FPGA already runs the requested bitfile (its build ID on
+        WireOut 0x23 matches the USR_ACCESS word in the file) the download
+        is skipped and only the logic is reset via CTRL_RST_BIT.
+        force=True always does a full reload.
+        """
+        log.debug("Opening + configuring FPGA...")
         if self.dev.OpenBySerial(self.serial) != 0:
 
             raise RuntimeError("Failed to open Opal Kelly device (check USB / drivers / cable).")
 
+        if not force and self.is_bitfile_loaded():
+            log.info("Requested bitfile already loaded, skipping configuration.")
+            self.system_reset()
+            return
+
         self.dev.ResetFPGA()
         err = self.dev.ConfigureFPGA(self.bitfile)
         if err != 0:
@@ -41,32 +172,74 @@ class OKTop:
         if not self.dev.IsFrontPanelEnabled():
             raise RuntimeError("FrontPanel is not enabled after configuration.")
 
-        print("FPGA configured and FrontPanel enabled.")
+        log.info("FPGA configured and FrontPanel enabled.")
+
+    @staticmethod
+    def bitfile_build_id(bitfile: str):
+        """
+        Return the USR_ACCESS word stored in a .bit file, or None.
+        It follows the type-1 packet header that writes the USR_ACCESS
+        configuration register (0x3001A001).
+        """
+        with open(bitfile, "rb") as f:
+            raw = f.read()
+        i = raw.find(b"\x30\x01\xA0\x01")
+        if i < 0 or i + 8 > len(raw):
+            return None
+        return int.from_bytes(raw[i + 4:i + 8], "big")
+
+    def read_build_id(self) -> int:
+        """Read the build ID of the loaded design from WireOut 0x23."""
+        self.dev.UpdateWireOuts()
+        return self.dev.GetWireOutValue(cfg.EP_WO_BUILD_ID)
+
+    def is_bitfile_loaded(self) -> bool:
+        """True if the FPGA is configured with self.bitfile."""
+        if not self.dev.IsFrontPanelEnabled():
+            return False
+        try:
+            expected = self.bitfile_build_id(self.bitfile)
+        except OSError:
+            return False
+        if not expected:
+            return False
+        return self.read_build_id() == expected
 
     def _update_ctrl(self):
         """Push the current control-word shadow to WireIn 0x00."""
         self.dev.SetWireInValue(cfg.EP_WI_CTRL, self._ctrl_shadow & 0xFFFF)
-        self.dev.UpdateWireIns()
+        self._commit_wire_ins()
 
     def _update_sys_spi(self):
         """Push the current control-word shadow to WireIn 0x00."""
         self.dev.SetWireInValue(cfg.EP_WI_SYSTEM_SPI, self._spi_shadow & 0xFFFF)
-        self.dev.UpdateWireIns()
+        self._commit_wire_ins()
     
     def _update_pstat_slp(self):
         """Push the current control-word shadow to WireIn 0x0F."""
         self.dev.SetWireInValue(cfg.EP_WI_PSTAT_EN, self._pstat_shadow & 0xFFFF)
-        self.dev.UpdateWireIns()
+        self._commit_wire_ins()
     
     def _update_pstat_i2x(self):
         """Push the current control-word shadow to WireIn 0x10."""
         self.dev.SetWireInValue(cfg.EP_WI_PSTAT_I2X, self._pstat_i2x_shadow & 0xFFFF)
-        self.dev.UpdateWireIns()
+        self._commit_wire_ins()
     
     def _update_ldo_en(self):
         """Push the current LDO ENABLE shadow to WireIn 0x13."""
         self.dev.SetWireInValue(cfg.EP_WI_LDO_EN, self._ldo_en_shadow & 0xFFFF)
-        self.dev.UpdateWireIns()
+        self._commit_wire_ins()
+
+    def _commit_wire_ins(self):
+        """UpdateWireIns, timed as one span."""
+        with oktop_trace.span("UpdateWireIns"):
+            self.dev.UpdateWireIns()
+
+    def _write_wire(self, ep_addr: int, value: int):
+        """Write one WireIn, commit it and remember the value."""
+        self._wire_shadow[ep_addr] = value & 0xFFFFFFFF
+        self.dev.SetWireInValue(ep_addr, value & 0xFFFFFFFF)
+        self._commit_wire_ins()
 
     def set_ctrl_bits(self, mask: int, value: bool):
         """Set or clear bits in the control word (WireIn 0x00)."""
@@ -118,11 +291,12 @@ class OKTop:
     # ---------------------------------------------------------------------
     # High-level system control
     # ---------------------------------------------------------------------
+    @oktop_trace.traced("system_reset")
     def system_reset(self):
         """Reset the system via WireIn 0x00 bit0."""
-        print("Asserting reset...")
+        log.debug("Asserting reset...")
         self.pulse_ctrl_bit(cfg.CTRL_RST_BIT, pulse_time=0.1)
-        print("Reset done.")
+        log.info("Reset done.")
 
     def set_modes(self, task_mode: int, dac_mode: int, adc_mode: int):
         """
@@ -131,52 +305,86 @@ class OKTop:
         dac_mode : 0/1
         adc_mode : 0/1
         """
-        print("Setting modes...")
+        log.debug("Setting modes...")
         self.set_ctrl_bits(cfg.CTRL_TASK_MODE_BIT, bool(task_mode))
         self.set_ctrl_bits(cfg.CTRL_DAC_MODE_BIT,  bool(dac_mode))
         self.set_ctrl_bits(cfg.CTRL_ADC_MODE_BIT,  bool(adc_mode))
-        print("Modes set.")
+        log.info("Modes set.")
 
     def set_force_awake(self, force_awake: int):
         """
         Set the force_awake bit in WireIn 0x00.
         force_awake: 0/1
         """
-        print("Setting force_awake...")
+        log.debug("Setting force_awake...")
         self.set_ctrl_bits(cfg.CTRL_FORCE_AWAKE_BIT, bool(force_awake))
-        print("force_awake set.")
+        log.info("force_awake set.")
+
+    def set_seq_counter(self, enable: int):
+        """
+        Set the seq counter bit in WireIn 0x00: free-running words carry a
+        sample counter in bits 31:1, which task_watcher checks and strips.
+        """
+        self.set_ctrl_bits(cfg.CTRL_SEQ_CNT_BIT, bool(enable))
+        log.info("Sample counter " + ("enabled." if enable else "disabled."))
+
+    def set_packed(self, enable: int):
+        """
+        Set the pack bit in WireIn 0x00: free-running words carry 32
+        consecutive ADC_OUT bits (first in bit 0), cutting the USB traffic
+        32-fold. task_watcher unpacks them unless keep_packed is set.
+        """
+        self.set_ctrl_bits(cfg.CTRL_PACK_BIT, bool(enable))
+        log.info("Packed free-running capture " + ("enabled." if enable else "disabled."))
+
+    def set_cic(self, enable: int, order: int = 3, ratio: int = 64):
+        """
+        Set the CIC bit in WireIn 0x00 (and order / ratio in WireIn 0x14):
+        free-running runs are decimated on the FPGA to one 32-bit sample
+        per ratio cycles, 0 .. ratio**order (see cic_decim). Takes
+        precedence over the packed mode.
+        """
+        if enable:
+            self.dev.SetWireInValue(cfg.EP_WI_ADC_CIC, cic_decim.cic_word(order, ratio))
+            self._commit_wire_ins()
+            self._cic_cfg = {"order": order, "ratio": ratio}
+        self.set_ctrl_bits(cfg.CTRL_CIC_BIT, bool(enable))
+        log.info(f"CIC decimation (order {order}, ratio {ratio}) enabled." if enable
+                 else "CIC decimation disabled.")
 
     def set_cathode_switch(self, cathode_switch: int):
         """
         Set the cathode_switch bit in WireIn 0x00.
         cathode_switch: 0/1
         """
-        print("Setting cathode_switch...")
+        log.debug("Setting cathode_switch...")
         self.set_ctrl_bits(cfg.CTRL_ION_SW_BIT, bool(cathode_switch))
-        print("cathode_switch set.")
+        log.info("cathode_switch set.")
     
     # ---------------------------------------------------------------------
     # DAC / ADC configuration (WireIns)
     # ---------------------------------------------------------------------
     def config_dac(self, t1: int, t2: int, ts1: int, ts2: int, nsam: int):
         """Write DAC timing parameters into WireIns."""
-        print("Writing DAC configs...")
+        log.debug("Writing DAC configs...")
         self.dev.SetWireInValue(cfg.EP_WI_DAC_T1,   t1 & 0xFFFFFFFF)
         self.dev.SetWireInValue(cfg.EP_WI_DAC_T2,   t2 & 0xFFFFFFFF)
         self.dev.SetWireInValue(cfg.EP_WI_DAC_TS1,  ts1 & 0xFFFFFFFF)
         self.dev.SetWireInValue(cfg.EP_WI_DAC_TS2,  ts2 & 0xFFFFFFFF)
         self.dev.SetWireInValue(cfg.EP_WI_DAC_NSAM, nsam & 0xFFFFFFFF)
-        self.dev.UpdateWireIns()
-        print("DAC config written.")
+        self._commit_wire_ins()
+        self._dac_cfg = {"t1": t1, "t2": t2, "ts1": ts1, "ts2": ts2, "nsam": nsam}
+        log.info("DAC config written.")
 
     def config_adc(self, twake: int, tsample: int, nsam: int):
         """Write ADC timing parameters into WireIns."""
-        print("Writing ADC configs...")
+        log.debug("Writing ADC configs...")
         self.dev.SetWireInValue(cfg.EP_WI_ADC_TWAKE,   twake & 0xFFFFFFFF)
         self.dev.SetWireInValue(cfg.EP_WI_ADC_TSAMPLE, tsample & 0xFFFFFFFF)
         self.dev.SetWireInValue(cfg.EP_WI_ADC_NSAM,    nsam & 0xFFFFFFFF)
-        self.dev.UpdateWireIns()
-        print("ADC config written.")
+        self._commit_wire_ins()
+        self._adc_cfg = {"twake": twake, "tsample": tsample, "nsam": nsam}
+        log.info("ADC config written.")
 
     
     # ---------------------------------------------------------------------
@@ -231,22 +439,22 @@ class OKTop:
     def set_imux_out(self, imux_out: int):
         """Set the I_MUX_OUT via WireIn 0x09."""
         self.set_sys_spi(cfg.CTRL_IMUX_OUT_BIT, bool(imux_out))
-        print(f"I_MUX_OUT set to {imux_out}.")
+        log.info(f"I_MUX_OUT set to {imux_out}.")
     
     def set_cgm_ext(self, cgm_ext: int):
         """Set the CGM_EXT via WireIn 0x09."""
         self.set_sys_spi(cfg.CTRL_CGM_EXT_BIT, bool(cgm_ext))
-        print(f"CGM_EXT set to {cgm_ext}.")
+        log.info(f"CGM_EXT set to {cgm_ext}.")
     
     def set_ion_en(self, ion_en: int):
         """Set the ION_EN via WireIn 0x09."""
         self.set_sys_spi(cfg.CTRL_ION_EN_BIT, bool(ion_en))
-        print(f"ION_EN set to {ion_en}.")
+        log.info(f"ION_EN set to {ion_en}.")
 
     def set_pm_en(self, pm_en: int):
         """Set the PM_EN via WireIn 0x09."""
         self.set_sys_spi(cfg.CTRL_PM_EN_BIT, bool(pm_en))
-        print(f"PM_EN set to {pm_en}.")
+        log.info(f"PM_EN set to {pm_en}.")
 
     def set_cc_gain(self, gain):
         """Set the CC gain via WireIn 0x11."""
@@ -259,51 +467,46 @@ class OKTop:
                 bin = 1
             elif gain == 0.1:
                 bin = 2
-        self.dev.SetWireInValue(cfg.EP_WI_CC_GAIN, bin & 0xFFFFFFFF)
-        self.dev.UpdateWireIns()
-        print(f"CC gain set to {gain}.")
+        self._write_wire(cfg.EP_WI_CC_GAIN, bin)
+        self._cc_gain = gain
+        log.info(f"CC gain set to {gain}.")
     
     def set_cc_sel(self, sel: int):
         """Set the CC selection via WireIn 0x12."""
         if not (1 <= sel <= 11):
             raise ValueError("CC selection must be between 1 and 11.")
         one_hot = self.binary_to_one_hot(sel,11)
-        self.dev.SetWireInValue(cfg.EP_WI_CC_SEL, one_hot & 0xFFFFFFFF)
-        self.dev.UpdateWireIns()
-        print(f"CC selection set to {sel}.")
+        self._write_wire(cfg.EP_WI_CC_SEL, one_hot)
+        self._cc_sel = sel
+        log.info(f"CC selection set to {sel}.")
     
     def set_adc_mux(self, mux: int):
         """Set the ADC MUX via WireIn 0x0E."""
-        self.dev.SetWireInValue(cfg.EP_WI_ADC_MUX, mux & 0xFFFFFFFF)
-        self.dev.UpdateWireIns()
-        print(f"ADC MUX set to {mux}.")
+        self._write_wire(cfg.EP_WI_ADC_MUX, mux)
+        log.info(f"ADC MUX set to {mux}.")
     
     def set_adc_ota1(self, ota1: int):
         """Set the ADC OTA1 via WireIn 0x0A."""
         thermo = self.binary_to_thermo(ota1)
-        self.dev.SetWireInValue(cfg.EP_WI_ADC_OTA1, thermo & 0xFFFFFFFF)
-        self.dev.UpdateWireIns()
-        print(f"ADC OTA1 set to {ota1}.")
+        self._write_wire(cfg.EP_WI_ADC_OTA1, thermo)
+        log.info(f"ADC OTA1 set to {ota1}.")
     
     def set_adc_ota2(self, ota2: int):
         """Set the ADC OTA2 via WireIn 0x0B."""
         thermo = self.binary_to_thermo(ota2)
-        self.dev.SetWireInValue(cfg.EP_WI_ADC_OTA2, thermo & 0xFFFFFFFF)
-        self.dev.UpdateWireIns()
-        print(f"ADC OTA2 set to {ota2}.")
+        self._write_wire(cfg.EP_WI_ADC_OTA2, thermo)
+        log.info(f"ADC OTA2 set to {ota2}.")
     
     def set_adc_startup_sel(self, sel: int):
         """Set the ADC STARTUP SEL via WireIn 0x0C."""
-        self.dev.SetWireInValue(cfg.EP_WI_ADC_STARTUP_SEL, sel & 0xFFFFFFFF)
-        self.dev.UpdateWireIns()
-        print(f"ADC STARTUP SEL set to {sel}.")
+        self._write_wire(cfg.EP_WI_ADC_STARTUP_SEL, sel)
+        log.info(f"ADC STARTUP SEL set to {sel}.")
     
     def set_adc_c2(self, c2: int):
         """Set the ADC C2 via WireIn 0x0D."""
         thermo = self.binary_to_thermo(c2)
-        self.dev.SetWireInValue(cfg.EP_WI_ADC_C2, thermo & 0xFFFFFFFF)
-        self.dev.UpdateWireIns()
-        print(f"ADC C2 set to {c2}.")
+        self._write_wire(cfg.EP_WI_ADC_C2, thermo)
+        log.info(f"ADC C2 set to {c2}.")
     
     def set_pstat_sleep(self, bias: int, cc: int, otaw: int, clsabw: int, otar: int, clsabr: int, sre: int):
         """Set the PSTAT ENABLES via WireIn 0x0F."""
@@ -314,8 +517,8 @@ class OKTop:
         self.set_pstat_slp(cfg.CTRL_BIT_PSTAT_S_OTAR,    bool(otar))
         self.set_pstat_slp(cfg.CTRL_BIT_PSTAT_S_CLSABR,  bool(clsabr))
         self.set_pstat_slp(cfg.CTRL_BIT_PSTAT_S_SRE,     bool(sre))
-        self.dev.UpdateWireIns()
-        print(f"PSTAT ENABLES set.")
+        self._commit_wire_ins()
+        log.info(f"PSTAT ENABLES set.")
     
     def set_pstat_i2x_all(self, otaw: int, otar: int, clsabw: int, clsabr: int):
         """Set the PSTAT 2x-current switches via WireIn 0x10."""
@@ -323,8 +526,8 @@ class OKTop:
         self.set_pstat_i2x(cfg.CTRL_BIT_PSTAT_OTARI2X,    bool(otar))
         self.set_pstat_i2x(cfg.CTRL_BIT_PSTAT_CLSABWI2X,  bool(clsabw))
         self.set_pstat_i2x(cfg.CTRL_BIT_PSTAT_CLSABRI2X,  bool(clsabr))
-        self.dev.UpdateWireIns()
-        print(f"PSTAT 2x-current switches set.")
+        self._commit_wire_ins()
+        log.info(f"PSTAT 2x-current switches set.")
 
     def set_ldo_en_all(self, vrefdac: int, wegd: int, avdd3v0: int, vcm: int, ion3v0: int, ion1v8: int, dvdd1v8: int, avdd1v8: int):
         """Set the LDO ENABLE via WireIn 0x13."""
@@ -336,8 +539,8 @@ class OKTop:
         self.set_ldo_en(cfg.LDO_BIT_ION1V8,   bool(ion1v8))
         self.set_ldo_en(cfg.LDO_BIT_DVDD1V8,  bool(dvdd1v8))
         self.set_ldo_en(cfg.LDO_BIT_AVDD1V8,  bool(avdd1v8))
-        self.dev.UpdateWireIns()
-        print(f"LDO ENABLE set.")
+        self._commit_wire_ins()
+        log.info(f"LDO ENABLE set.")
 
     # ---------------------------------------------------------------------
     # SPI configuration trigger
@@ -346,21 +549,103 @@ class OKTop:
         """
         Kick off the SPI/config FSM via TriggerIn 0x40, bit0.
         """
-        print("Triggering SPI configuration...")
+        log.debug("Triggering SPI configuration...")
         for i in range(2):
             self.dev.ActivateTriggerIn(cfg.EP_TI_MAIN, cfg.TRIG_CONFIG_BIT)
-        print("SPI/config trigger sent.")
+        log.debug("SPI/config trigger sent.")
+
+    def spi_config_words(self):
+        """
+        Return the (msb, lsb) configuration words OKTOP.v assembles from
+        the current WireIn settings:
+            msb = {24'd0, wi09[3:0], wi0a[1:0], wi0b[1:0]}
+            lsb = {wi0c[1:0], wi0d[3:0], wi0e[1:0], wi0f[6:0],
+                   wi10[3:0], wi11[1:0], wi12[10:0]}
+        """
+        w = self._wire_shadow
+        msb = ((self._spi_shadow & 0xF) << 4) \
+            | ((w.get(cfg.EP_WI_ADC_OTA1, 0) & 0x3) << 2) \
+            | (w.get(cfg.EP_WI_ADC_OTA2, 0) & 0x3)
+        lsb = ((w.get(cfg.EP_WI_ADC_STARTUP_SEL, 0) & 0x3) << 30) \
+            | ((w.get(cfg.EP_WI_ADC_C2, 0) & 0xF) << 26) \
+            | ((w.get(cfg.EP_WI_ADC_MUX, 0) & 0x3) << 24) \
+            | ((self._pstat_shadow & 0x7F) << 17) \
+            | ((self._pstat_i2x_shadow & 0xF) << 13) \
+            | ((w.get(cfg.EP_WI_CC_GAIN, 0) & 0x3) << 11) \
+            | (w.get(cfg.EP_WI_CC_SEL, 0) & 0x7FF)
+        return msb, lsb
 
-    def config_through_spi(self):
-        """Trigger SPI configuration and wait for completion."""
+    def wait_for_spi_done(self, cnt_start: int, n_done: int, timeout_s: float = cfg.SPI_DONE_TIMEOUT_S):
+        """
+        Poll WireOut 0x21 until the SPI done counter has advanced by
+        n_done transfers since cnt_start. (The done_spi bit of WireOut 0x20
+        is a one-cycle pulse that polling cannot be relied on to see.)
+        Returns the status dict; raises RuntimeError on timeout.
+        """
+        t0 = time.time()
+        while True:
+            self.dev.UpdateWireOuts()
+            status = self.dev.GetWireOutValue(cfg.EP_WO_STATUS)
+            cnt = self.dev.GetWireOutValue(cfg.EP_WO_SPI_CNT)
+            done = (cnt - cnt_start) & 0xFFFFFFFF
+            if done >= n_done:
+                return {"raw": status, "spi_cnt": cnt, "elapsed_s": time.time() - t0}
+            if time.time() - t0 > timeout_s:
+                raise RuntimeError(
+                    f"Timeout waiting for SPI config: {done}/{n_done} transfers "
+                    f"completed after {timeout_s} s.")
+            time.sleep(0.001)
+
+    @oktop_trace.traced("spi_config")
+    def config_through_spi(self, timeout_s: float = cfg.SPI_DONE_TIMEOUT_S, verify: bool = True):
+        """
+        Trigger SPI configuration and wait for completion.
+
+        Completion is taken from the SPI done counter (WireOut 0x21), so no
+        fixed sleep is needed afterwards. The chip shifts its previous
+        register contents out on MISO, so the readback of the second
+        transfer must equal the configuration word that was written.
+        The SPI readback FIFOs are drained first: DAC transfers of earlier
+        tasks also write them. Analog settling is not included here; call
+        settle() explicitly.
+        """
+        n_trig = 2
+        self._drain_spi_out()
+        cnt_start = self.read_spi_cnt()["raw"]
         self.trigger_spi_config()
-        self.read_spi_cnt()
-        msb = self.read_spi_out_msb(4)
-        lsb = self.read_spi_out_lsb(4)
-        print("SPI out (MSB) words:", [hex(x) for x in msb])
-        print("SPI out (LSB) words:", [hex(x) for x in lsb])
+        status = self.wait_for_spi_done(cnt_start, n_trig, timeout_s)
+        log.info(f"SPI config done in {status['elapsed_s'] * 1e3:.1f} ms.")
+
+        msb = self.read_spi_out_msb(n_trig)
+        lsb = self.read_spi_out_lsb(n_trig)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("SPI out (MSB) words: %s", [hex(x) for x in msb])
+            log.debug("SPI out (LSB) words: %s", [hex(x) for x in lsb])
+
+        exp_msb, exp_lsb = self.spi_config_words()
+        status["expected"] = (exp_msb, exp_lsb)
+        # Entry n_trig-1: what the chip shifted out during the second transfer
+        k = n_trig - 1
+        status["readback"] = (msb[k] & 0xFF if len(msb) > k else None,
+                              lsb[k] if len(lsb) > k else None)
+        status["verified"] = status["readback"] == (exp_msb, exp_lsb)
+        if verify and not status["verified"]:
+            raise RuntimeError(
+                f"SPI readback mismatch: expected msb={exp_msb:#04x} lsb={exp_lsb:#010x}, "
+                f"got {status['readback']}.")
+        return status
+
+    def _drain_spi_out(self):
+        """Empty both SPI readback FIFOs (reads past the last word are dropped)."""
+        self.read_spi_out_msb(cfg.SPI_OUT_FIFO_DEPTH)
+        self.read_spi_out_lsb(cfg.SPI_OUT_FIFO_DEPTH)
+
+    def settle(self, seconds: float = cfg.ANALOG_SETTLE_S):
+        """Explicit analog settling wait after configuration (no-op for 0)."""
+        if seconds > 0:
+            log.debug("Settling for %s s...", seconds)
+            time.sleep(seconds)
 
-        
     # ---------------------------------------------------------------------
     # Waveform generation
     # ---------------------------------------------------------------------
@@ -370,14 +655,14 @@ class OKTop:
             vstop: final voltage (mV)
             vstep: step voltage (mV)
         '''
-        print("Generating ramp waveform...")
+        log.debug("Generating ramp waveform...")
         data = []
         steps = int((vstop-vstart)/vstep + 1)
         for i in range(steps):
             v = vstart + i * vstep
             bin = self.analog_to_binary(v,cfg.VREF_MV)
             data.append(bin)
-        print(f"Generated waveform with {len(data)} samples.")
+        log.info(f"Generated waveform with {len(data)} samples.")
         return data
 
     def gen_cv(self,vstart,v1,v2,vstep):
@@ -387,7 +672,7 @@ class OKTop:
             v2: CV turning point2 (mV)
             vstep: step voltage (mV)
         '''
-        print("Generating CV waveform...")
+        log.debug("Generating CV waveform...")
         data = []
         steps = int((v1-vstart)/vstep)
         for i in range(steps):
@@ -399,7 +684,7 @@ class OKTop:
             v = v1 - i * vstep
             bin = self.analog_to_binary(v,cfg.VREF_MV)
             data.append(bin)
-        print(f"Generated waveform with {len(data)} samples.")
+        log.info(f"Generated waveform with {len(data)} samples.")
         return data
 
     def gen_dpv(self,vstart,vstop,vstep,vpulse):
@@ -409,7 +694,7 @@ class OKTop:
             vstep: step voltage (mV)
             vpulse: DPV pulse height (mV)
         '''
-        print("Generating DPV waveform...")
+        log.debug("Generating DPV waveform...")
         data = []
         steps = int((vstop-vstart)/vstep + 1)
         for i in range(steps):
@@ -419,31 +704,100 @@ class OKTop:
             v = vstart + i * vstep + vpulse
             bin = self.analog_to_binary(v,cfg.VREF_MV)
             data.append(bin)
-        print(f"Generated waveform with {len(data)} samples.")
+        log.info(f"Generated waveform with {len(data)} samples.")
         return data
     # ---------------------------------------------------------------------
     # Waveform FIFO
     # ---------------------------------------------------------------------
+    @oktop_trace.traced("waveform_upload")
     def write_waveform_words(self, words32):
         """
-        Write a list of 32-bit integers into the waveform FIFO via PipeIn 0x81.
+        Write a list of 32-bit integers into the waveform FIFO via PipeIn 0x80.
         """
-        print("Writing waveform data to FIFO...")
+        log.debug("Writing waveform data to FIFO...")
         data = self.complete_to_multiple_of_4(words32)
-        buf = bytearray()        
-        for x in data:
-            buf += self._u32_to_bytes_le(x)        
-        self.dev.WriteToPipeIn(cfg.EP_PI_WAVEFORM, buf)
-        print(f"Wrote {len(words32)} words to waveform FIFO.")
+        self._wav_words = np.asarray(data, dtype=np.uint32)
+        self._write_wav_fifo(self._wav_words)
+        log.info(f"Wrote {len(words32)} words to waveform FIFO.")
+
+    def _write_wav_fifo(self, words):
+        """Write uint32 words to PipeIn 0x80, padding to a multiple of 4 words."""
+        words = np.asarray(words, dtype="<u4")
+        if len(words) % 4:
+            words = np.concatenate([words, np.full(4 - len(words) % 4, words[-1], dtype="<u4")])
+        with self._dev_lock, oktop_trace.span("WriteToPipeIn", ep="wav", words=len(words)):
+            self.dev.WriteToPipeIn(cfg.EP_PI_WAVEFORM, bytearray(words.tobytes()))
+
+    @oktop_trace.traced("waveform_prime")
+    def stream_waveform(self, source):
+        """
+        Streaming waveform mode for sequences longer than the 1024-word
+        wav FIFO. source is a numpy array or an iterable of words / arrays.
+        The FIFO is primed now; the rest is written by a refill thread that
+        task_watcher wakes on each wav-low TriggerOut. config_dac nsam must
+        be the total number of DAC steps.
+        """
+        log.debug("Priming waveform FIFO for streaming...")
+        src = _WordSource(source)
+        first = src.take((cfg.WAV_FIFO_DEPTH - 4) & ~3)
+        self._write_wav_fifo(first)
+        self._streamer = WaveformStreamer(self, src)
+        self._streamer.written.append(first)
+        self._streamer.start()
+        log.info(f"Primed {len(first)} words, refill thread armed.")
+
+    def _finish_stream(self):
+        """Stop the refill thread and record the waveform that was sent."""
+        streamer, self._streamer = self._streamer, None
+        streamer.stop()
+        self._wav_words = np.concatenate(streamer.written)
+        if not streamer.source.drained():
+            log.warning("task finished before the waveform stream was exhausted.")
+        log.info(f"Waveform stream: {len(self._wav_words)} words in {streamer.refills} refills.")
+
+    def clear_waveform_fifo(self):
+        """
+        Empty the waveform FIFO (TriggerIn 0x40, bit3), e.g. of the padding
+        words a shorter task left behind.
+        """
+        with self._dev_lock:
+            self.dev.ActivateTriggerIn(cfg.EP_TI_MAIN, cfg.TRIG_WAV_CLR_BIT)
+        time.sleep(cfg.WAV_CLR_S)
+        log.debug("Waveform FIFO cleared.")
 
     # ---------------------------------------------------------------------
     # Task trigger + completion
     # ---------------------------------------------------------------------
-    def trigger_task(self):
-        """Kick off the 'task' FSM via TriggerIn 0x40, bit1."""
-        print("Triggering task...")
+    def trigger_task(self, dry_run: bool = False, plan=None, indexed: bool = False):
+        """
+        Kick off the 'task' FSM via TriggerIn 0x40, bit1.
+
+        Once config_adc has been called, the capture is planned first
+        (plan_capture(indexed=indexed), or the given plan) and a refused
+        plan raises ValueError before anything is started; task_watcher
+        then uses it. Pass indexed=True when task_watcher(indexed=True)
+        will follow, so the record array is budgeted up front.
+        dry_run: log the plan and return it without starting the task.
+        Returns the plan when dry_run or plan is given, else None.
+        """
+        if dry_run:
+            plan = plan or self.plan_capture(indexed=indexed)
+            log.info(plan.describe())
+            return plan
+        asked = plan is not None
+        if plan is None and self._adc_cfg is not None:
+            plan = self.plan_capture(indexed=indexed)
+        if plan is not None:
+            plan.check()
+            if plan.strategy == "stream":
+                log.info(f"Capture of {plan.words} words exceeds the memory budget; "
+                         f"streaming to {plan.stream_path}.")
+        self._plan = plan
+        log.debug("Triggering task...")
         self.dev.ActivateTriggerIn(cfg.EP_TI_MAIN, cfg.TRIG_TASK_BIT)
-        print("Task trigger sent.")
+        oktop_trace.instant("trigger_task")
+        log.debug("Task trigger sent.")
+        return plan if asked else None
 
     def wait_for_task_done(self, timeout_s: float = 1.0) -> bool:
         """
@@ -454,77 +808,440 @@ class OKTop:
         while time.time() - t0 < timeout_s:
             self.dev.UpdateTriggerOuts()
             if self.dev.IsTriggered(cfg.EP_TO_MAIN, cfg.TRIG_TASK_DONE_BIT):
-                print("Task done trigger observed.")
+                log.debug("Task done trigger observed.")
                 return True
             time.sleep(0.001)
-        print("Timeout waiting for task done trigger.")
+        log.warning("Timeout waiting for task done trigger.")
         return False
     
-    def task_watcher(self):
-        """update the triggers"""
-        data = []
+    def expected_capture_words(self) -> int:
+        """Exact number of ADC words the next task writes (see capture_plan)."""
+        if self._adc_cfg is None:
+            raise RuntimeError("config_adc must be called before planning a capture.")
+        return capture_plan.capture_words(
+            task_mode=bool(self._ctrl_shadow & cfg.CTRL_TASK_MODE_BIT),
+            dac_mode=bool(self._ctrl_shadow & cfg.CTRL_DAC_MODE_BIT),
+            adc_mode=bool(self._ctrl_shadow & cfg.CTRL_ADC_MODE_BIT),
+            dac=self._dac_cfg,
+            packed=self.packed_capture(),
+            decim=self.decimation(),
+            **self._adc_cfg)
+
+    def capture_word_rate(self) -> float:
+        """Average ADC words per second the next task writes (see capture_plan)."""
+        if self._adc_cfg is None:
+            raise RuntimeError("config_adc must be called before planning a capture.")
+        return capture_plan.capture_word_rate(
+            task_mode=bool(self._ctrl_shadow & cfg.CTRL_TASK_MODE_BIT),
+            dac_mode=bool(self._ctrl_shadow & cfg.CTRL_DAC_MODE_BIT),
+            adc_mode=bool(self._ctrl_shadow & cfg.CTRL_ADC_MODE_BIT),
+            dac=self._dac_cfg,
+            packed=self.packed_capture(),
+            decim=self.decimation(),
+            **self._adc_cfg)
+
+    def packed_capture(self) -> bool:
+        """True when the next task writes packed free-running words."""
+        return (bool(self._ctrl_shadow & cfg.CTRL_PACK_BIT) and not self.decimation()
+                and not self._ctrl_shadow & cfg.CTRL_ADC_MODE_BIT)
+
+    def decimation(self) -> int:
+        """CIC ratio of the next free-running task, 0 when not decimating."""
+        if (self._cic_cfg is None or not self._ctrl_shadow & cfg.CTRL_CIC_BIT
+                or self._ctrl_shadow & cfg.CTRL_ADC_MODE_BIT):
+            return 0
+        return self._cic_cfg["ratio"]
+
+    def _run_meta(self) -> dict:
+        """ADCSamplingConfig fields of the configured run, for stream metadata."""
+        return {"fs": cfg.LOGIC_CLK_HZ,
+                "adc_mode_set": int(bool(self._ctrl_shadow & cfg.CTRL_ADC_MODE_BIT)),
+                "twake_set": self._adc_cfg["twake"], "tsample_set": self._adc_cfg["tsample"],
+                "nsam_set": self._adc_cfg["nsam"]}
+
+    def plan_capture(self, indexed: bool = False, **kwargs):
+        """
+        resource_plan.CapturePlan for the next task: sizes, in-memory vs
+        streaming strategy and keep-up checks. kwargs go to
+        resource_plan.plan_capture (memory_budget, stream_dir, ...).
+        """
+        if self._adc_cfg is None:
+            raise RuntimeError("config_adc must be called before planning a capture.")
+        return resource_plan.plan_capture(
+            task_mode=bool(self._ctrl_shadow & cfg.CTRL_TASK_MODE_BIT),
+            dac_mode=bool(self._ctrl_shadow & cfg.CTRL_DAC_MODE_BIT),
+            adc_mode=bool(self._ctrl_shadow & cfg.CTRL_ADC_MODE_BIT),
+            dac=self._dac_cfg,
+            packed=self.packed_capture(),
+            decim=self.decimation(),
+            indexed=indexed,
+            **self._adc_cfg,
+            **kwargs)
+
+    def conversion_params(self, cs580_gain: float = 0.0):
+        """
+        adc_units.ConversionParams for the current ADC mode, tsample and
+        CC gain / selection (both must have been set).
+        """
+        if self._adc_cfg is None or self._cc_gain is None or self._cc_sel is None:
+            raise RuntimeError("config_adc, set_cc_gain and set_cc_sel must be called first.")
+        return adc_units.ConversionParams(
+            adc_mode=int(bool(self._ctrl_shadow & cfg.CTRL_ADC_MODE_BIT)),
+            tsample=self._adc_cfg["tsample"],
+            cc_gain=self._cc_gain,
+            cc_sel=self._cc_sel,
+            cs580_gain=cs580_gain)
+
+    def index_capture(self, data, wav=None):
+        """
+        Return the capture as a capture_plan.CAPTURE_DTYPE record array
+        (sample index, time, DAC step, applied potential in mV, ADC code)
+        built from the current mode / timing configuration. wav defaults
+        to the last waveform written with write_waveform_words.
+        """
+        if self._adc_cfg is None:
+            raise RuntimeError("config_adc must be called before indexing a capture.")
+        return capture_plan.index_capture(
+            data,
+            task_mode=bool(self._ctrl_shadow & cfg.CTRL_TASK_MODE_BIT),
+            dac_mode=bool(self._ctrl_shadow & cfg.CTRL_DAC_MODE_BIT),
+            adc_mode=bool(self._ctrl_shadow & cfg.CTRL_ADC_MODE_BIT),
+            dac=self._dac_cfg,
+            wav=self._wav_words if wav is None else wav,
+            decim=self.decimation(),
+            **self._adc_cfg)
+
+    @oktop_trace.traced("task_watcher")
+    def task_watcher(self, indexed: bool = False, sink=None, monitor=None,
+                     keep_packed: bool = False, meta: dict = None):
+        """
+        Collect the ADC output of a triggered task.
+
+        The capture is planned up front (the plan accepted by
+        trigger_task; re-planned and checked with the record array when
+        indexed and trigger_task was not told so). In memory, one uint32 array of the planned size is
+        allocated and every FIFO half is copied straight into its slice;
+        after task-done the last partial half is read with the exact
+        remaining word count. Returns the numpy array, or the
+        index_capture() record array when indexed=True.
+
+        When the plan streams, halves go through one reused buffer to the
+        sink only; without a sink a chunked_capture.ChunkWriter is opened
+        at plan.stream_path and a ChunkReader on it is returned (None
+        when the caller passed the sink). That stream's meta gets meta
+        (e.g. chunked_capture.capture_meta(...), so batch_analyze can use
+        it) overlaid with the run as configured: fs, adc_mode_set,
+        twake_set, tsample_set and nsam_set.
+
+        sink: optional object with write(words), e.g. a
+        chunked_capture.ChunkWriter, handed every block as it is read.
+        monitor: optional acq_monitor.AcquisitionMonitor timing every
+        FIFO half read against the fill interval.
+
+        With the sample counter enabled (set_seq_counter) in free-running
+        mode, every block is checked for gaps as it is read and reduced to
+        its ADC bit before it is stored or handed to the sink.
+
+        In packed mode (set_packed) the sink gets the packed words; the
+        returned array is unpacked to one 0/1 sample per word in one
+        vectorized pass unless keep_packed is set. A stream this method
+        opens itself keeps the packed words and records the layout in
+        its meta["packed"].
+
+        With CIC decimation (set_cic) the words are the decimated samples;
+        a stream this method opens records order / ratio in meta["cic"].
+
+        Afterwards the halves and words read are checked against the
+        FIFO_PP counters; the verdict is kept in self.last_integrity.
+        """
+        plan = self._plan or self.plan_capture(indexed=indexed, keep_packed=keep_packed)
+        self._plan = None
+        if indexed and not plan.indexed:
+            # trigger_task planned without the record array; budget it now
+            plan = self.plan_capture(indexed=True, keep_packed=keep_packed,
+                                     memory_budget=plan.memory_budget).check()
+        total = plan.words
+        stream = plan.strategy == "stream"
+        own_sink = stream and sink is None
+        if plan.packed and indexed and keep_packed:
+            raise ValueError("An indexed capture must be unpacked; drop keep_packed.")
+        if stream:
+            if indexed:
+                raise ValueError("An indexed capture cannot be streamed; reduce its length.")
+            data = np.empty(min(total, cfg.FIFO_HALF_WORDS), dtype=np.uint32)
+            if own_sink:
+                sink = chunked_capture.ChunkWriter(plan.stream_path, meta=meta)
+                sink.meta.update(self._run_meta())
+                if plan.packed:
+                    sink.meta["packed"] = {"pack_bits": cfg.PACK_BITS,
+                                           "tsample": self._adc_cfg["tsample"]}
+                elif plan.decim:
+                    sink.meta["cic"] = {**self._cic_cfg, "tsample": self._adc_cfg["tsample"]}
+        else:
+            data = np.empty(total, dtype=np.uint32)
+        pos = 0
+        halves = 0
+        seq = None
+        if (self._ctrl_shadow & cfg.CTRL_SEQ_CNT_BIT and not plan.packed and not plan.decim
+                and not self._ctrl_shadow & cfg.CTRL_ADC_MODE_BIT):
+            seq = sample_seq.SeqChecker()
+        if monitor is not None:
+            monitor.start(total, self.capture_word_rate())
         while True:
-            self.dev.UpdateTriggerOuts()
-            if self.dev.IsTriggered(cfg.EP_TO_MAIN, cfg.TRIG_TASK_DONE_BIT):
-                print("Task done trigger observed.")
-                self.trigger_flip()
-                data.extend(self.read_adc_out(cfg.FIFO_DEPTH))
-                return data
-            if self.dev.IsTriggered(cfg.EP_TO_MAIN, cfg.TRIG_FIFO_FLIP_BIT):
-                data.extend(self.read_adc_out(cfg.FIFO_DEPTH))
-                data.pop()
+            with self._dev_lock:
+                self.dev.UpdateTriggerOuts()
+                done = self.dev.IsTriggered(cfg.EP_TO_MAIN, cfg.TRIG_TASK_DONE_BIT)
+                if self._streamer is not None and self.dev.IsTriggered(cfg.EP_TO_MAIN, cfg.TRIG_WAV_LOW_BIT):
+                    self._streamer.request()
+                # A flip latched together with task-done is read before the remainder
+                if self.dev.IsTriggered(cfg.EP_TO_MAIN, cfg.TRIG_FIFO_FLIP_BIT):
+                    t_seen = time.perf_counter()
+                    buf = data if stream else data[pos:]
+                    with oktop_trace.span("fifo_read") as sp:
+                        n = self.read_adc_into(buf, cfg.FIFO_HALF_WORDS)
+                        sp.set(words=n)
+                    if seq is not None:
+                        seq.check(buf[:n])
+                        sample_seq.strip(buf[:n])
+                    if monitor is not None:
+                        monitor.half_read(n, t_seen, time.perf_counter())
+                    if sink is not None:
+                        sink.write(buf[:n])
+                    pos += n
+                    halves += 1
+                if done:
+                    log.debug("Task done trigger observed.")
+                    oktop_trace.instant("task_done")
+                    self.trigger_flip()
+                    buf = data[:max(total - pos, 0)] if stream else data[pos:]
+                    with oktop_trace.span("fifo_read", last=True) as sp:
+                        n = self.read_adc_into(buf)
+                        sp.set(words=n)
+                    if seq is not None:
+                        seq.check(buf[:n])
+                        sample_seq.strip(buf[:n])
+                    if sink is not None:
+                        sink.write(buf[:n])
+                    pos += n
+                    halves += 1
+                    break
             time.sleep(0.001)
+        if self._streamer is not None:
+            self._finish_stream()
+        if monitor is not None:
+            monitor.finish(pos)
+        if pos != total:
+            log.warning(f"captured {pos} of {total} planned words.")
+        self.last_integrity = self.check_integrity(halves, pos, total, seq)
+        if stream:
+            if not own_sink:
+                return None
+            sink.meta["integrity"] = self.last_integrity
+            sink.close()
+            return chunked_capture.ChunkReader(plan.stream_path)
+        data = data[:pos]
+        if plan.packed and not keep_packed:
+            with oktop_trace.span("unpack", words=pos):
+                data = capture_plan.unpack_free_running(data, self._adc_cfg["tsample"])
+        return self.index_capture(data) if indexed else data
+
+    # ---------------------------------------------------------------------
+    # Repeat and average
+    # ---------------------------------------------------------------------
+    def repeat_task(self, n: int, per: str = "sample", stop=None, skip: int = 0,
+                    on_repeat=None):
+        """
+        Run the configured task up to n times and average the results in a
+        repeat_stats.RunningStats (returned). Nothing is reconfigured: each
+        repeat only clears and re-uploads the last waveform (task_mode=1),
+        fires trigger_task and reads the capture.
+
+        per: "sample" accumulates every ADC word; "step" the mean of every
+             DAC step (voltammetry.step_means, skip settling samples).
+        stop: optional repeat_stats.StopRule; the loop ends as soon as
+              stop(stats) holds.
+        on_repeat: optional callable (i, stats) after every repeat.
+
+        Repeats whose integrity check fails are dropped. The stats carry
+        meta with repeats run / used / dropped, the stop level history
+        and, per step, the step potentials.
+        """
+        if per not in ("sample", "step"):
+            raise ValueError('per must be "sample" or "step".')
+        task_mode = bool(self._ctrl_shadow & cfg.CTRL_TASK_MODE_BIT)
+        if per == "step" and not task_mode:
+            raise ValueError("Per-step averaging needs a task_mode=1 run.")
+        wav = None
+        if task_mode:
+            if self._wav_words is None:
+                raise RuntimeError("write_waveform_words or stream_waveform must be called first.")
+            wav = self._wav_words.copy()
+        plan = self.plan_capture(indexed=per == "step")
+        if plan.strategy == "stream" or plan.packed and plan.keep_packed:
+            raise ValueError("repeat_task needs a capture that fits in memory; reduce its length.")
+
+        stats = repeat_stats.RunningStats()
+        stats.meta.update(per=per, repeats=0, dropped=0, levels=[])
+        for i in range(n):
+            if wav is not None:
+                self.clear_waveform_fifo()
+                if len(wav) > cfg.WAV_FIFO_DEPTH - 4:
+                    self.stream_waveform(wav)
+                else:
+                    self._write_wav_fifo(wav)
+            self.trigger_task(plan=plan)
+            data = self.task_watcher(indexed=per == "step")
+            stats.meta["repeats"] += 1
+            if self.last_integrity["ok"] is False:
+                stats.meta["dropped"] += 1
+                log.warning(f"repeat {i}: capture failed its integrity check, dropped.")
+                continue
+            if per == "step":
+                iv = voltammetry.step_means(data, skip)
+                stats.meta["potential_mv"] = iv["potential_mv"].tolist()
+                data = iv["value"]
+            stats.update(data)
+            if on_repeat is not None:
+                on_repeat(i, stats)
+            if stop is not None:
+                stats.meta["levels"].append(stop.level(stats))
+                if stop(stats):
+                    log.info(f"Stop rule met after {stats.n} repeats "
+                             f"(SEM {stats.meta['levels'][-1]:.4g}).")
+                    break
+        log.info(f"repeat_task: {stats.n} repeats averaged, {stats.meta['dropped']} dropped.")
+        return stats
+
+    # ---------------------------------------------------------------------
+    # Capture integrity (FIFO_PP counters, WireOut 0x24-0x26)
+    # ---------------------------------------------------------------------
+    def read_pp_counters(self) -> dict:
+        """Read the FIFO_PP flip / word counters and sticky overflow flags."""
+        with self._dev_lock:
+            self.dev.UpdateWireOuts()
+            flips = self.dev.GetWireOutValue(cfg.EP_WO_PP_FLIP_CNT)
+            words = self.dev.GetWireOutValue(cfg.EP_WO_PP_WORD_CNT)
+            status = self.dev.GetWireOutValue(cfg.EP_WO_PP_STATUS)
+        return {"flips": flips, "words": words,
+                "overflow_unread": bool(status & cfg.PP_OVF_UNREAD_BIT),
+                "overflow_full": bool(status & cfg.PP_OVF_FULL_BIT)}
+
+    def check_integrity(self, halves_read: int, words_read: int, words_planned: int,
+                        seq: sample_seq.SeqChecker = None) -> dict:
+        """
+        Cross-check a finished capture against the FIFO_PP counters.
+
+        Every almost-full flip must have been read as one half and the
+        forced flip after task-done as the last one, so the hardware flip
+        count equals halves_read; the hardware word count must equal the
+        words read, and neither overflow flag may be set. seq adds the
+        sample-counter continuity result. Returns the verdict dict (ok is
+        None when neither the FIFO_PP counters nor a seq check exist).
+        """
+        hw = self.read_pp_counters()
+        verdict = {"ok": True, "halves_read": halves_read, "words_read": words_read,
+                   "words_planned": words_planned, "hw_flips": hw["flips"],
+                   "hw_words": hw["words"], "overflow_unread": hw["overflow_unread"],
+                   "overflow_full": hw["overflow_full"], "problems": []}
+        problems = verdict["problems"]
+        if seq is not None:
+            verdict["seq"] = seq.summary()
+            if not seq.ok:
+                g = seq.gaps[0]
+                problems.append(f"{seq.n_gaps} sample counter gaps ({seq.dropped} samples dropped, "
+                                f"{seq.resets} counter resets), first at sample "
+                                f"{g['position']} ({g['missing']} missing)")
+        # An older bitfile reads 0 on WireOuts 0x24-0x26
+        verdict["hw_counters"] = not (hw["flips"] == 0 and hw["words"] == 0 and words_read > 0)
+        if verdict["hw_counters"]:
+            if hw["flips"] != halves_read & 0xFFFFFFFF:
+                problems.append(f"{hw['flips']} FIFO flips but {halves_read} halves read")
+            if hw["words"] != words_read & 0xFFFFFFFF:
+                problems.append(f"{hw['words']} words written but {words_read} read")
+            if hw["overflow_unread"]:
+                problems.append("FIFO flipped onto a half that was not read")
+            if hw["overflow_full"]:
+                problems.append("words dropped on a full FIFO half")
+        if words_read != words_planned:
+            problems.append(f"{words_read} of {words_planned} planned words read")
+        if problems:
+            verdict["ok"] = False
+            log.warning("capture integrity check failed: " + "; ".join(problems) + ".")
+        elif not verdict["hw_counters"] and seq is None:
+            verdict["ok"] = None
+            log.warning("capture integrity not verified: bitfile has no FIFO_PP counters.")
+        return verdict
+
     # ---------------------------------------------------------------------
     # ADC Ping-pong FIFO Flip
     # ---------------------------------------------------------------------
     def trigger_flip(self):
         """flip the ADC output ping-pong fifo."""
-        self.dev.ActivateTriggerIn(cfg.EP_TI_MAIN, 2)
-        print("FIFO flipped.")
+        self.dev.ActivateTriggerIn(cfg.EP_TI_MAIN, cfg.TRIG_FLIP_BIT)
+        log.debug("FIFO flipped.")
     # ---------------------------------------------------------------------
     # Reading from SPI/ADC FIFOs (PipeOuts)
     # ---------------------------------------------------------------------
+    @staticmethod
+    def _pipe_bytes(n_words: int) -> int:
+        """Bytes to transfer for n_words, rounded up to PIPE_ALIGN_BYTES."""
+        return -(-n_words * 4 // cfg.PIPE_ALIGN_BYTES) * cfg.PIPE_ALIGN_BYTES
+
+    def _read_pipe(self, ep: int, n_words: int, buf=None):
+        """
+        Read n_words from PipeOut ep as an aligned transfer (the extra
+        words are read and dropped). Returns (buffer, words received).
+        """
+        n_bytes = self._pipe_bytes(n_words)
+        if buf is None or len(buf) != n_bytes:
+            buf = bytearray(n_bytes)
+        got = self.dev.ReadFromPipeOut(ep, buf)
+        if got != n_bytes:
+            log.warning(f"expected {n_bytes} bytes, got {got}.")
+        return buf, min(max(got, 0) // 4, n_words)
+
     def read_spi_out_msb(self, n_words: int):
         """
         Read n_words of SPI output MSB data from PipeOut 0xA0.
         Returns list of ints.
         """
-        n_bytes = n_words * 4
-        buf = bytearray(n_bytes)
-        got = self.dev.ReadFromPipeOut(cfg.EP_PO_SPI_OUT_MSB, buf)
-        if got != n_bytes:
-            print(f"Warning: expected {n_bytes} bytes, got {got}.")
-        raw = bytes(buf[:got])
-        words = [int.from_bytes(raw[i:i+4], "little") for i in range(0, len(raw), 4)]
-        return words
+        buf, n = self._read_pipe(cfg.EP_PO_SPI_OUT_MSB, n_words)
+        return np.frombuffer(buf, dtype="<u4", count=n).tolist()
     
     def read_spi_out_lsb(self, n_words: int):
         """
         Read n_words of SPI output LSB data from PipeOut 0xA1.
         Returns list of ints.
         """
-        n_bytes = n_words * 4
-        buf = bytearray(n_bytes)
-        got = self.dev.ReadFromPipeOut(cfg.EP_PO_SPI_OUT_LSB, buf)
-        if got != n_bytes:
-            print(f"Warning: expected {n_bytes} bytes, got {got}.")
-        raw = bytes(buf[:got])
-        words = [int.from_bytes(raw[i:i+4], "little") for i in range(0, len(raw), 4)]
-        return words
+        buf, n = self._read_pipe(cfg.EP_PO_SPI_OUT_LSB, n_words)
+        return np.frombuffer(buf, dtype="<u4", count=n).tolist()
 
     def read_adc_out(self, n_words: int):
         """
         Read n_words of ADC output data from PipeOut 0xA2.
         Returns list of ints.
         """
-        n_bytes = n_words * 4
-        buf = bytearray(n_bytes)
-        got = self.dev.ReadFromPipeOut(cfg.EP_PO_ADC_OUT, buf)
-        if got != n_bytes:
-            print(f"Warning: expected {n_bytes} bytes, got {got}.")
-        raw = bytes(buf[:got])
-        words = [int.from_bytes(raw[i:i+4], "little") for i in range(0, len(raw), 4)]
-        return words
+        buf, n = self._read_pipe(cfg.EP_PO_ADC_OUT, n_words)
+        return np.frombuffer(buf, dtype="<u4", count=n).tolist()
+
+    def read_adc_into(self, out, n_words: int = None) -> int:
+        """
+        Read n_words (default: len(out)) from PipeOut 0xA2 into the uint32
+        array out. Words beyond len(out), and those rounding the transfer
+        up to PIPE_ALIGN_BYTES, are read but discarded.
+        Returns the number of words stored.
+        """
+        if n_words is None:
+            n_words = len(out)
+        if n_words <= 0:
+            return 0
+        buf, got = self._read_pipe(cfg.EP_PO_ADC_OUT, n_words, self._rx_buf)
+        n = min(got, len(out))
+        if n_words > len(out):
+            log.warning(f"{n_words - len(out)} words beyond the planned capture dropped.")
+        out[:n] = np.frombuffer(buf, dtype="<u4", count=n)
+        return n
+
     # ---------------------------------------------------------------------
     # Status wire
     # ---------------------------------------------------------------------
@@ -540,7 +1257,7 @@ class OKTop:
         """Read WireOut 0x21."""
         self.dev.UpdateWireOuts()
         v = self.dev.GetWireOutValue(cfg.EP_WO_SPI_CNT)
-        print(f"SPI triggered {v} times.")
+        log.debug("SPI triggered %d times.", v)
         return {"raw": v}
     
     
@@ -0,0 +1,164 @@
+# oktop_trace.py
+#
+# Leveled logging and timed spans for the instrument drivers.
+#
+#   import oktop_trace as trace
+#   trace.set_level("DEBUG")          # console verbosity (default INFO)
+#   trace.enable()                    # start recording spans
+#   ... run adc_test ...
+#   trace.export_chrome("adc_test_trace.json")   # chrome://tracing / Perfetto
+#
+# Logging goes through the standard logging module ("weechem.*" loggers,
+# plain messages on stdout). Disabled levels cost one level check; a span
+# while tracing is disabled is a shared no-op context manager.
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+class _ConsoleFormatter(logging.Formatter):
+    """Plain messages, prefixed with the level for warnings and errors."""
+
+    def format(self, record):
+        msg = record.getMessage()
+        if record.levelno >= logging.WARNING:
+            msg = f"{record.levelname.capitalize()}: {msg}"
+        return msg
+
+
+_root = logging.getLogger("weechem")
+if not _root.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(_ConsoleFormatter())
+    _root.addHandler(_handler)
+    _root.setLevel(logging.INFO)
+    _root.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"weechem.{name}")
+
+
+def set_level(level):
+    """Console verbosity for all driver loggers: 'DEBUG', 'INFO', 'WARNING', ..."""
+    _root.setLevel(level.upper() if isinstance(level, str) else level)
+
+
+# -------------------------------------------------------------------------
+# Spans
+# -------------------------------------------------------------------------
+class _Span:
+    __slots__ = ("tracer", "name", "cat", "args", "t0")
+
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def set(self, **args):
+        """Attach results (byte counts, status, ...) to the span."""
+        self.args.update(args)
+
+    def __enter__(self):
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        t1 = time.perf_counter_ns()
+        tr = self.tracer
+        tr.events.append({"name": self.name, "cat": self.cat, "ph": "X",
+                          "ts": (self.t0 - tr.t0_ns) / 1e3, "dur": (t1 - self.t0) / 1e3,
+                          "pid": tr.pid, "tid": threading.get_ident(), "args": self.args})
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """Collects Chrome trace events ('X' complete spans, instants, counters)."""
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.t0_ns = time.perf_counter_ns()
+        self.pid = os.getpid()
+
+    def span(self, name: str, cat: str = "oktop", **args):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, cat, args)
+
+    def instant(self, name: str, cat: str = "oktop", **args):
+        if self.enabled:
+            self.events.append({"name": name, "cat": cat, "ph": "i", "s": "t",
+                                "ts": (time.perf_counter_ns() - self.t0_ns) / 1e3,
+                                "pid": self.pid, "tid": threading.get_ident(), "args": args})
+
+    def counter(self, name: str, **values):
+        if self.enabled:
+            self.events.append({"name": name, "ph": "C",
+                                "ts": (time.perf_counter_ns() - self.t0_ns) / 1e3,
+                                "pid": self.pid, "args": values})
+
+    def clear(self):
+        self.events = []
+        self.t0_ns = time.perf_counter_ns()
+
+    def export_chrome(self, path):
+        """Write the recorded events as Chrome trace-event JSON."""
+        threads = {e["tid"] for e in self.events if "tid" in e}
+        names = {t.ident: t.name for t in threading.enumerate()}
+        meta = [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid,
+                 "args": {"name": names.get(tid, str(tid))}} for tid in threads]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": meta + self.events, "displayTimeUnit": "ms"}, f)
+        _root.info(f"Wrote {len(self.events)} trace events to {path}")
+
+
+tracer = Tracer()
+span = tracer.span
+instant = tracer.instant
+counter = tracer.counter
+export_chrome = tracer.export_chrome
+
+
+def enable(clear: bool = True):
+    if clear:
+        tracer.clear()
+    tracer.enabled = True
+
+
+def disable():
+    tracer.enabled = False
+
+
+def traced(name: str = None, cat: str = "oktop"):
+    """Decorator: run the function inside a span (no-op while disabled)."""
+    def wrap(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def inner(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with _Span(tracer, label, cat, {}):
+                return func(*args, **kwargs)
+        return inner
+    return wrap
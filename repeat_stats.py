@@ -0,0 +1,103 @@
+# repeat_stats.py
+#
+# Online statistics for repeated identical tasks (OKTop.repeat_task).
+#
+#   acc = RunningStats()
+#   for x in repeats:             # one capture, or one value per DAC step
+#       acc.update(x)
+#   acc.mean, acc.std, acc.sem    # float64 arrays, same shape as x
+#
+#   stop = StopRule(target_sem=0.5, min_repeats=4)     # in ADC code units
+#   fpga.repeat_task(100, per="step", stop=stop)       # ends once stop(acc)
+#
+# RunningStats is Welford's algorithm applied elementwise: one pass, no
+# repeat kept in memory, numerically stable for long runs. StopRule
+# reduces the per-element standard error of the mean (max by default, so
+# every sample / step meets the target) and compares it with target_sem,
+# or with target_sem * |mean| when relative.
+from dataclasses import dataclass
+
+import numpy as np
+
+REDUCE = {"max": np.nanmax, "mean": np.nanmean, "median": np.nanmedian}
+
+
+class RunningStats:
+    """Elementwise running mean / variance of equally shaped repeats."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = None
+        self._m2 = None
+        self.meta = {}
+
+    def update(self, x):
+        """Add one repeat."""
+        x = np.asarray(x, dtype=np.float64)
+        if self.n == 0:
+            self.mean = np.zeros_like(x)
+            self._m2 = np.zeros_like(x)
+        elif x.shape != self.mean.shape:
+            raise ValueError(f"repeat has shape {x.shape}, expected {self.mean.shape}.")
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (x - self.mean)
+        return self
+
+    @property
+    def variance(self):
+        """Sample variance (ddof=1); NaN before the second repeat."""
+        if self.n < 2:
+            return None if self.mean is None else np.full_like(self.mean, np.nan)
+        return self._m2 / (self.n - 1)
+
+    @property
+    def std(self):
+        v = self.variance
+        return None if v is None else np.sqrt(v)
+
+    @property
+    def sem(self):
+        """Standard error of the mean."""
+        v = self.variance
+        return None if v is None else np.sqrt(v / self.n)
+
+    def as_dict(self) -> dict:
+        """Counts, mean, variance and SEM (arrays) plus meta."""
+        return {"n": self.n, "mean": self.mean, "variance": self.variance,
+                "sem": self.sem, "meta": dict(self.meta)}
+
+    def summary(self) -> dict:
+        sem = self.sem
+        finite = sem is not None and self.n >= 2 and np.isfinite(sem).any()
+        return {"n": self.n, "size": 0 if self.mean is None else int(self.mean.size),
+                "sem_max": float(np.nanmax(sem)) if finite else None,
+                "sem_mean": float(np.nanmean(sem)) if finite else None, **self.meta}
+
+
+@dataclass
+class StopRule:
+    target_sem: float
+    min_repeats: int = 3
+    reduce: str = "max"             # "max", "mean" or "median" over elements
+    relative: bool = False          # target_sem is a fraction of |mean|
+
+    def __post_init__(self):
+        if self.reduce not in REDUCE:
+            raise ValueError(f"reduce must be one of {tuple(REDUCE)}.")
+        if self.target_sem <= 0 or self.min_repeats < 2:
+            raise ValueError("target_sem must be > 0 and min_repeats >= 2.")
+
+    def level(self, stats: RunningStats) -> float:
+        """Reduced standard error (relative when configured); NaN before two repeats."""
+        if stats.n < 2:
+            return np.nan
+        sem = stats.sem
+        if self.relative:
+            sem = np.divide(sem, np.abs(stats.mean), out=np.full_like(sem, np.inf),
+                            where=stats.mean != 0)
+        return float(REDUCE[self.reduce](sem))
+
+    def __call__(self, stats: RunningStats) -> bool:
+        return stats.n >= self.min_repeats and self.level(stats) <= self.target_sem
@@ -0,0 +1,234 @@
+# resource_plan.py
+#
+# Pre-run resource planning for a capture: how many words the task writes,
+# what that costs on the wire, in memory and on disk, and whether it is
+# held in memory or streamed to a chunked file.
+#
+#   plan = fpga.plan_capture()          # from the current configuration
+#   print(plan.describe())
+#   fpga.trigger_task(dry_run=True)     # log the plan, do not start the task
+#
+# Memory estimates per container:
+#   list     Python int list (read_adc_out): 8 B per slot, plus a 28 B int
+#            object per word unless the values are the cached small ints
+#            (free-running 0/1 bits)
+#   uint32   numpy array (task_watcher): 4 B per word
+#   packed   bit-packed free-running stream: 1 bit per sample
+#   records  capture_plan.CAPTURE_DTYPE (task_watcher(indexed=True))
+# Disk sizes are upper bounds; .wecap assumes no codec gain over its filter.
+# In packed mode (CTRL_PACK_BIT) the containers still hold one sample per
+# slot; only the wire traffic and, with keep_packed, the capture array
+# shrink to PACK_BITS samples per word. CIC-decimated captures (decim)
+# hold 32-bit codes like incremental ones.
+#
+# The capture is held in memory when the uint32 array (and the record
+# array when indexed) fits in memory_budget, by default half the available
+# RAM, and streamed to STREAM_DIR otherwise. A plan is refused when the
+# host cannot read a FIFO_PP half within its fill interval, or a streamed
+# capture cannot be written as fast as it arrives or does not fit on disk.
+import math
+import os
+import shutil
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from pathlib import Path
+
+import oktop_config as cfg
+import capture_plan
+import adc_units
+import oktop_trace
+
+log = oktop_trace.get_logger("resource_plan")
+
+try:
+    import psutil
+except ImportError:     # optional; os.sysconf is used instead
+    psutil = None
+
+STREAM_DIR = Path("Test_Data") / "Streams"
+MEMORY_FRACTION = 0.5   # share of the available RAM a capture may use
+HEADROOM = 0.5          # a half must be read within this share of its fill interval
+POLL_S = 0.001          # task_watcher poll period
+
+_LIST_SLOT = 8
+_INT_OBJECT = 28
+_NPY_HEADER = 128
+_CSV_HEADER = 1024      # save_to_csv config blocks
+
+
+def available_memory():
+    """Available physical memory in bytes, or None when unknown."""
+    if psutil is not None:
+        return psutil.virtual_memory().available
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def _free_disk(path: Path):
+    for p in (path, *path.parents):
+        if p.exists():
+            return shutil.disk_usage(p).free
+    return None
+
+
+def _fmt_bytes(n) -> str:
+    if n is None:
+        return "n/a"
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(n) < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+# -------------------------------------------------------------------------
+# Size estimates
+# -------------------------------------------------------------------------
+def memory_sizes(words: int, adc_mode: int) -> dict:
+    """Bytes to hold the capture in each container (None if not applicable)."""
+    int_obj = 0 if not adc_mode else _INT_OBJECT
+    return {
+        "list":    56 + words * (_LIST_SLOT + int_obj),
+        "uint32":  112 + 4 * words,
+        "packed":  None if adc_mode else 112 + math.ceil(words / 8),
+        "records": 112 + capture_plan.CAPTURE_DTYPE.itemsize * words,
+    }
+
+
+def disk_sizes(words: int, adc_mode: int, tsample: int, full_scale: int = None) -> dict:
+    """Upper bound of the file size for each storage format."""
+    if full_scale is None:
+        full_scale = adc_units.full_scale_code(adc_mode, tsample)
+    digits = len(str(full_scale))
+    n_chunks = max(1, math.ceil(words / cfg.FIFO_HALF_WORDS))
+    payload = math.ceil(words / 8) if not adc_mode else 4 * words
+    return {
+        "csv":   _CSV_HEADER + words * (digits + 2),
+        "npy":   _NPY_HEADER + 4 * words,
+        "wecap": 64 + payload + n_chunks * 26 + 4096,
+    }
+
+
+# -------------------------------------------------------------------------
+# Plan
+# -------------------------------------------------------------------------
+@dataclass
+class CapturePlan:
+    words: int                      # words written to FIFO_PP and read
+    duration_s: float
+    word_rate: float                # average words/s into FIFO_PP
+    wire_bytes: int                 # bytes read over the PipeOut
+    fill_interval_s: float          # time to fill one FIFO_PP half
+    half_read_s: float              # estimated host time to read one half
+    memory: dict                    # container -> bytes
+    disk: dict                      # format -> bytes
+    memory_budget: int = None
+    indexed: bool = False
+    samples: int = None             # ADC samples (words unless packed)
+    packed: bool = False
+    keep_packed: bool = False
+    decim: int = 0                  # CIC decimation ratio (0 = off)
+    strategy: str = "memory"        # "memory" or "stream"
+    stream_path: Path = None
+    problems: list = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.problems
+
+    def check(self):
+        """Raise ValueError when the plan was refused."""
+        if self.problems:
+            raise ValueError("Capture plan refused: " + "; ".join(self.problems) + ".")
+        return self
+
+    def as_dict(self) -> dict:
+        d = asdict(self)
+        d["stream_path"] = None if self.stream_path is None else str(self.stream_path)
+        return d
+
+    def describe(self) -> str:
+        packed = f" ({self.samples} samples packed)" if self.packed else ""
+        if self.decim:
+            packed = f" (CIC / {self.decim})"
+        lines = [
+            f"Capture plan: {self.words} words{packed} in {self.duration_s:.3f} s "
+            f"({self.word_rate / 1e3:.1f} kS/s), {_fmt_bytes(self.wire_bytes)} over USB",
+            f"  FIFO half: fill {self.fill_interval_s * 1e3:.1f} ms, "
+            f"read ~{self.half_read_s * 1e3:.1f} ms",
+            "  memory: " + ", ".join(f"{k} {_fmt_bytes(v)}" for k, v in self.memory.items())
+            + f" (budget {_fmt_bytes(self.memory_budget)})",
+            "  disk:   " + ", ".join(f"{k} {_fmt_bytes(v)}" for k, v in self.disk.items()),
+            f"  strategy: {self.strategy}"
+            + (f" -> {self.stream_path}" if self.strategy == "stream" else ""),
+        ]
+        lines += [f"  REFUSED: {p}" for p in self.problems]
+        return "\n".join(lines)
+
+
+def plan_capture(task_mode: int, dac_mode: int, adc_mode: int,
+                 twake: int, tsample: int, nsam: int, dac=None,
+                 indexed: bool = False, packed: bool = False, keep_packed: bool = False,
+                 decim: int = 0, memory_budget: int = None,
+                 stream_dir=STREAM_DIR, pipe_read_bps: float = cfg.PIPE_READ_BPS,
+                 stream_write_bps: float = cfg.STREAM_WRITE_BPS,
+                 clk_hz: float = cfg.LOGIC_CLK_HZ) -> CapturePlan:
+    """
+    Plan a capture for the given task / ADC / DAC settings (as for
+    capture_plan.capture_words). memory_budget defaults to MEMORY_FRACTION
+    of the available RAM. packed: free-running words carry PACK_BITS
+    samples; keep_packed: the capture is kept packed instead of unpacked;
+    decim: CIC decimation ratio of a free-running capture (0 = off).
+    The returned plan lists its problems instead of raising; call
+    plan.check() to enforce it.
+    """
+    decim = 0 if adc_mode else decim
+    packed = bool(packed) and not adc_mode and not decim
+    samples = capture_plan.capture_words(task_mode, dac_mode, adc_mode, twake, tsample, nsam, dac,
+                                         decim=decim)
+    words = capture_plan.capture_words(task_mode, dac_mode, adc_mode, twake, tsample, nsam, dac,
+                                       packed) if packed else samples
+    codes = adc_mode or bool(decim)
+    cycles = capture_plan.capture_cycles(task_mode, adc_mode, twake, tsample, nsam, dac)
+    duration = cycles / clk_hz
+    rate = words / duration if duration > 0 else 0.0
+    fill = cfg.FIFO_HALF_WORDS / rate if rate > 0 else float("inf")
+    half_read = cfg.FIFO_HALF_WORDS * 4 / pipe_read_bps + POLL_S
+
+    if memory_budget is None:
+        avail = available_memory()
+        memory_budget = None if avail is None else int(avail * MEMORY_FRACTION)
+    plan = CapturePlan(words=words, duration_s=duration, word_rate=rate,
+                       wire_bytes=4 * words, fill_interval_s=fill, half_read_s=half_read,
+                       memory=memory_sizes(samples, codes),
+                       disk=disk_sizes(samples, codes, tsample,
+                                       full_scale=0xFFFFFFFF if decim else None),
+                       memory_budget=memory_budget, indexed=indexed, samples=samples,
+                       packed=packed, keep_packed=packed and keep_packed, decim=decim)
+
+    need = plan.memory["uint32"] + (plan.memory["records"] if indexed else 0)
+    if packed:
+        # packed read buffer, plus the unpacked array unless kept packed
+        need = 112 + 4 * words + (0 if plan.keep_packed else need)
+    if memory_budget is not None and need > memory_budget:
+        plan.strategy = "stream"
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        plan.stream_path = Path(stream_dir) / f"ADC_Stream_{stamp}.wecap"
+
+    # Keep-up checks
+    if words > cfg.FIFO_HALF_WORDS and half_read > HEADROOM * fill:
+        plan.problems.append(f"reading a FIFO half takes ~{half_read * 1e3:.1f} ms but it "
+                             f"fills in {fill * 1e3:.1f} ms")
+    if plan.strategy == "stream":
+        if indexed:
+            plan.problems.append(f"an indexed capture needs {_fmt_bytes(need)} in memory "
+                                 f"(budget {_fmt_bytes(memory_budget)})")
+        if 4 * rate > stream_write_bps:
+            plan.problems.append(f"streaming needs {4 * rate / 1e6:.1f} MB/s but only "
+                                 f"{stream_write_bps / 1e6:.1f} MB/s can be written")
+        free = _free_disk(Path(stream_dir))
+        if free is not None and plan.disk["wecap"] > free:
+            plan.problems.append(f"the stream needs up to {_fmt_bytes(plan.disk['wecap'])} "
+                                 f"but {_fmt_bytes(free)} is free")
+    return plan
@@ -0,0 +1,114 @@
+# sample_seq.py
+#
+# Sample sequence counter of free-running captures (CTRL_SEQ_CNT_BIT).
+# With the counter enabled ADC_control writes {seq[30:0], ADC_OUT}: bit 0
+# is the modulator bit and bits 31:1 count every free-running word modulo
+# 2**31. Consecutive words of a gap-free capture therefore differ by
+# exactly one in the counter.
+#
+#   chk = SeqChecker()
+#   chk.check(words)          # per FIFO half, as it is read
+#   bits = strip(words)       # in place: words & 1
+#   chk.gaps                  # [{"position": ..., "missing": ..., "span": ...}, ...]
+#   chk.dropped, chk.resets   # samples skipped forward, backward jumps
+#
+# OKTop.task_watcher does this for every half when the counter is enabled,
+# so a capture is verified while it is read.
+import numpy as np
+
+SEQ_SHIFT = 1
+SEQ_MOD = 1 << 31
+_SEQ_MASK = np.uint32(SEQ_MOD - 1)
+
+
+def seq_of(words):
+    """Counter field of every word (uint32)."""
+    return np.right_shift(np.asarray(words, dtype=np.uint32), SEQ_SHIFT)
+
+
+def strip(words):
+    """Clear the counter field in place; returns words (now 0/1)."""
+    np.bitwise_and(words, 1, out=words)
+    return words
+
+
+def find_gaps(seq, prev: int = None):
+    """
+    (index, missing) arrays for every break in the counter sequence seq.
+    prev is the counter of the word before seq[0] (checks the boundary).
+    index is the position in seq of the first word after the break;
+    missing is the number of skipped samples (negative for a counter that
+    went backwards, e.g. repeated data).
+    """
+    seq = np.asarray(seq, dtype=np.uint32)
+    if prev is not None:
+        seq = np.concatenate((np.array([prev], dtype=np.uint32), seq))
+    d = (seq[1:] - seq[:-1]) & _SEQ_MASK                # wraps mod 2**31
+    idx = np.flatnonzero(d != 1)
+    missing = d[idx].astype(np.int64) - 1
+    missing[missing >= SEQ_MOD // 2] -= SEQ_MOD
+    if prev is None:
+        idx += 1
+    return idx, missing
+
+
+class SeqChecker:
+    """Continuity check across the blocks of one capture."""
+
+    def __init__(self, max_gaps: int = 1000):
+        self.max_gaps = max_gaps
+        self.reset()
+
+    def reset(self):
+        self.n_words = 0
+        self.first = None
+        self.last = None
+        self.n_gaps = 0
+        self.dropped = 0            # samples skipped by forward jumps
+        self.resets = 0             # gaps where the counter went backwards
+        self.gaps = []
+        self._last_break = None     # absolute position of the last broken word
+
+    def check(self, words):
+        """
+        Check one block (raw words) following the previous one. A run of
+        consecutive breaks (e.g. stale or zero words) is one gap whose
+        "span" is the number of words in the run.
+        """
+        if len(words) == 0:
+            return 0
+        seq = seq_of(words)
+        idx, missing = find_gaps(seq, self.last)
+        if self.first is None:
+            self.first = int(seq[0])
+        self.last = int(seq[-1])
+        base = self.n_words
+        self.n_words += len(words)
+        if len(idx) == 0:
+            return 0
+        pos = idx + base
+        new = np.ones(len(pos), dtype=bool)
+        new[1:] = np.diff(pos) != 1
+        if self._last_break is not None and pos[0] == self._last_break + 1:
+            new[0] = False
+            if self.gaps and self.gaps[-1]["position"] + self.gaps[-1]["span"] == pos[0]:
+                run0 = np.flatnonzero(new)
+                self.gaps[-1]["span"] += int(run0[0] if len(run0) else len(pos))
+        self._last_break = int(pos[-1])
+        starts = np.flatnonzero(new)
+        spans = np.diff(np.append(starts, len(pos)))
+        for i, n in zip(starts[:max(self.max_gaps - len(self.gaps), 0)], spans):
+            self.gaps.append({"position": int(pos[i]), "missing": int(missing[i]), "span": int(n)})
+        self.n_gaps += len(starts)
+        jump = missing[starts]
+        self.dropped += int(jump[jump > 0].sum())
+        self.resets += int((jump < 0).sum())
+        return len(starts)
+
+    @property
+    def ok(self) -> bool:
+        return self.n_gaps == 0
+
+    def summary(self) -> dict:
+        return {"words": self.n_words, "first_seq": self.first, "n_gaps": self.n_gaps,
+                "dropped": self.dropped, "resets": self.resets, "gaps": list(self.gaps)}
@@ -0,0 +1,27 @@
+# Shared fixtures: every test runs the driver against ok_emulator, no board.
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import oktop_config as cfg
+import ok_emulator
+import oktop_driver as oktop
+
+
+@pytest.fixture
+def make_fpga():
+    """make_fpga(**emulator kwargs) -> (OKTop, EmulatedFrontPanel), opened."""
+    def make(**kwargs):
+        dev = ok_emulator.EmulatedFrontPanel(**kwargs)
+        fpga = oktop.OKTop(cfg.BITFILE, dev=dev)
+        fpga.open_and_configure()
+        return fpga, dev
+    return make
+
+
+@pytest.fixture
+def fpga(make_fpga):
+    return make_fpga()[0]
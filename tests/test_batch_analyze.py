@@ -0,0 +1,81 @@
+# Packed / CIC streams found and analysed by batch_analyze (user-037).
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import adc_analysis
+import adc_test_func as atf
+import batch_analyze
+import capture_store
+import chunked_capture
+import oktop_config as cfg
+
+N = 1 << 15
+FIN_BIN = 61
+
+
+def _sine_bits(n=N):
+    """First-order sigma-delta of a coherent sine, one period of n cycles."""
+    u = 0.5 * np.sin(2 * np.pi * FIN_BIN * np.arange(n) / n)
+    bits = np.empty(n, dtype=np.uint8)
+    acc = 0.0
+    for i, v in enumerate(u):
+        bits[i] = acc >= 0
+        acc += v - (2.0 * bits[i] - 1.0)
+    return bits
+
+
+BITS = _sine_bits()
+
+
+def _source(t0, n):
+    return np.resize(np.roll(BITS, -(t0 % N)), n)
+
+
+@pytest.fixture
+def root(tmp_path):
+    return tmp_path / capture_store.STORE_DIR
+
+
+def _stream(fpga, root, chip_id):
+    plan = fpga.plan_capture(memory_budget=1000, stream_dir=root / "Streams")
+    fpga.trigger_task(plan=plan)
+    setup = atf.TestingSetup(chip_id=chip_id)
+    sampling = atf.ADCSamplingConfig(fs=cfg.LOGIC_CLK_HZ, bw=cfg.LOGIC_CLK_HZ / 64)
+    reader = fpga.task_watcher(meta=chunked_capture.capture_meta(setup, sampling, atf.ADCTrimBitsConfig()))
+    reader.close()
+    return reader
+
+
+def test_packed_and_cic_streams_are_analysed(make_fpga, root):
+    fpga, _ = make_fpga(adc_source=_source)
+    fpga.set_modes(task_mode=0, dac_mode=0, adc_mode=0)
+    fpga.config_adc(twake=1, tsample=N, nsam=1)
+    fpga.trigger_task()
+    full = fpga.task_watcher()
+    meta = {"fs": cfg.LOGIC_CLK_HZ, "bw": cfg.LOGIC_CLK_HZ / 64, "adc_mode_set": 0, "tsample_set": N}
+    ref = adc_analysis.capture_metrics(full, meta)["sndr_db"]
+    assert ref > 30
+
+    fpga.set_packed(1)
+    packed = _stream(fpga, root, 1)
+    assert packed.meta["packed"]["tsample"] == N and packed.meta["tsample_set"] == N
+    fpga.set_packed(0)
+    fpga.set_cic(1, order=3, ratio=16)
+    cic = _stream(fpga, root, 2)
+    assert cic.meta["cic"]["ratio"] == 16
+
+    rows = batch_analyze.run(root, jobs=1)
+    (path, row), = rows[1]
+    assert Path(path).name == packed.path.name and row["error"] == ""
+    assert row["sndr_db"] == pytest.approx(ref)
+    (_, row), = rows[2]
+    assert row["error"] == "" and row["sndr_db"] > 25
+    assert row["fin_hz"] == pytest.approx(FIN_BIN * cfg.LOGIC_CLK_HZ / N)
+
+
+def test_inconsistent_format_is_refused():
+    meta = {"fs": 1e6, "bw": 0, "adc_mode_set": 1, "tsample_set": 64, "packed": {"tsample": 64}}
+    with pytest.raises(ValueError):
+        adc_analysis.capture_metrics(np.zeros(64, np.uint32), meta)
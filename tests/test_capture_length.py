@@ -0,0 +1,32 @@
+# Exact capture length and 16-byte pipe alignment (user-031).
+import numpy as np
+import pytest
+
+import oktop_config as cfg
+import ok_emulator
+
+
+@pytest.mark.parametrize("tsample", [64, 131071, 300001])
+def test_free_running_capture_has_planned_length(fpga, tsample):
+    fpga.set_modes(task_mode=0, dac_mode=0, adc_mode=0)
+    fpga.config_adc(twake=1, tsample=tsample, nsam=1)
+    plan = fpga.trigger_task(dry_run=True)
+    fpga.trigger_task()
+    data = fpga.task_watcher()
+    assert len(data) == plan.words == tsample
+    assert (data[1:] != data[:-1]).all()           # no repeated or lost words
+    assert fpga.last_integrity["ok"]
+
+
+def test_incremental_capture_has_planned_length(fpga):
+    fpga.set_modes(task_mode=0, dac_mode=0, adc_mode=1)
+    fpga.config_adc(twake=1, tsample=16, nsam=7)
+    fpga.trigger_task()
+    assert len(fpga.task_watcher()) == 7
+
+
+def test_emulator_rejects_unaligned_pipe_reads(make_fpga):
+    _, dev = make_fpga()
+    assert dev.ReadFromPipeOut(cfg.EP_PO_ADC_OUT, bytearray(8)) == ok_emulator.DATA_ALIGNMENT_ERROR
+    assert dev.WriteToPipeIn(cfg.EP_PI_WAVEFORM, bytearray(12)) == ok_emulator.DATA_ALIGNMENT_ERROR
+    assert dev.ReadFromPipeOut(cfg.EP_PO_ADC_OUT, bytearray(16)) >= 0
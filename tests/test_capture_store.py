@@ -0,0 +1,45 @@
+# Capture index: one analysed copy per run and column-checked queries (user-036).
+import numpy as np
+import pytest
+
+import adc_test_func as atf
+import batch_analyze
+import capture_store
+
+CONFIGS = (atf.TestingSetup(chip_id=3), atf.ADCSamplingConfig(fs=1e6, bw=1e4, tsample_set=64),
+           atf.ADCTrimBitsConfig())
+
+
+def test_csv_and_npy_of_one_run_are_analysed_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data = np.arange(64, dtype=np.uint32) & 1
+    csv_path = atf.save_to_csv(*CONFIGS, data.tolist())
+    capture_store.save_capture(*CONFIGS, data, source=str(csv_path))
+    jobs = batch_analyze.find_captures(capture_store.STORE_DIR)
+    assert [p.suffix for p, _ in jobs] == [".csv"]
+
+
+@pytest.fixture
+def store(tmp_path):
+    with capture_store.CaptureStore(tmp_path) as st:
+        for ok in (True, False, True):
+            st.add(*CONFIGS, np.arange(64, dtype=np.uint32) & 1,
+                   integrity={"ok": ok, "problems": []})
+        yield st
+
+
+def test_query_accepts_every_stored_column(store):
+    bad = store.query(integrity_ok=0)
+    assert [c.id for c in bad] == [2]
+    assert not bad[0].integrity["ok"]
+    assert len(store.query(dtype="<u4")) == 3
+
+
+def test_order_by_is_checked(store):
+    assert [c.id for c in store.query(order_by="id DESC")] == [3, 2, 1]
+    assert [c.id for c in store.query(order_by="integrity_ok")][0] == 2
+    for bad in ("id; DROP TABLE captures", "nope", "id ASC LIMIT 1"):
+        with pytest.raises(ValueError):
+            store.query(order_by=bad)
+    with pytest.raises(ValueError):
+        store.query(nope=1)
@@ -0,0 +1,65 @@
+# CIC decimation: emulator output bit-exact against cic_decim (user-049).
+import numpy as np
+import pytest
+
+import cic_decim
+
+TSAMPLE = 300000
+
+
+def _brute(bits, order, ratio):
+    """Register-level CIC_Decimator.v reference in Python ints."""
+    integ, dly, cnt, out = [0] * order, [0] * order, 0, []
+    for b in bits.tolist():
+        comb = [integ[-1]]
+        for k in range(order):
+            comb.append((comb[k] - dly[k]) & 0xFFFFFFFF)
+        tick = cnt == ratio - 1
+        if tick:
+            out.append(comb[order])
+        integ = [(integ[0] + b) & 0xFFFFFFFF] + [(integ[k] + integ[k - 1]) & 0xFFFFFFFF
+                                                 for k in range(1, order)]
+        cnt = 0 if tick else cnt + 1
+        if tick:
+            dly = comb[:order]
+    return np.array(out, dtype=np.uint32)
+
+
+def _hash_bits(t0, n):
+    """Pseudo-random ADC bits, a fixed function of the cycle index."""
+    t = np.arange(t0, t0 + n, dtype=np.uint64)
+    return ((t * np.uint64(2654435761) >> np.uint64(17)) & np.uint64(1)).astype(np.uint8)
+
+
+@pytest.mark.parametrize("order,ratio", [(1, 1), (2, 7), (3, 16), (5, 64)])
+def test_model_matches_register_reference(order, ratio):
+    bits = np.random.default_rng(ratio).integers(0, 2, 3000).astype(np.uint8)
+    ref = _brute(bits, order, ratio)
+    assert (cic_decim.decimate(bits, order, ratio) == ref).all()
+    blocks = np.array_split(bits, 7)
+    assert (np.concatenate(list(cic_decim.decimate_chunks(blocks, order, ratio))) == ref).all()
+
+
+def test_full_scale():
+    assert cic_decim.decimate(np.ones(2000, np.uint8), 3, 16)[-1] == cic_decim.cic_gain(3, 16)
+
+
+@pytest.mark.parametrize("order,ratio", [(3, 64), (4, 25)])
+def test_emulated_cic_is_bit_exact(make_fpga, order, ratio):
+    fpga, _ = make_fpga(adc_source=_hash_bits)
+    fpga.set_modes(task_mode=0, dac_mode=0, adc_mode=0)
+    fpga.config_adc(twake=1, tsample=TSAMPLE, nsam=1)
+    fpga.trigger_task()
+    full = fpga.task_watcher()
+    fpga.set_cic(1, order=order, ratio=ratio)
+    fpga.trigger_task()
+    words = fpga.task_watcher()
+    assert len(words) == TSAMPLE // ratio
+    assert cic_decim.compare(words, cic_decim.decimate(full, order, ratio, TSAMPLE))["ok"]
+
+
+def test_settings_the_hdl_cannot_decimate_exactly():
+    with pytest.raises(ValueError):
+        cic_decim.check_cic(5, 100)
+    with pytest.raises(ValueError):
+        cic_decim.check_cic(0, 16)
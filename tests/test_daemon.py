@@ -0,0 +1,67 @@
+# oktop_daemon round trip against an emulated board (user-030).
+import threading
+
+import numpy as np
+import pytest
+
+import oktop_daemon
+
+
+@pytest.fixture
+def session(fpga, tmp_path):
+    daemon = oktop_daemon.DeviceDaemon(fpga, path=str(tmp_path / "oktop.sock"))
+    thread = threading.Thread(target=daemon.serve, daemon=True)
+    thread.start()
+    sess = oktop_daemon.connect(daemon.path, timeout=30)
+    yield sess
+    sess.shutdown()
+    sess.close()
+    thread.join(5)
+
+
+def test_ping(session):
+    assert session.ping()
+    assert session.targets() == ["fpga"]
+
+
+def test_small_capture_is_an_array(session, fpga):
+    session.fpga.set_modes(task_mode=0, dac_mode=0, adc_mode=1)
+    session.fpga.config_adc(twake=1, tsample=16, nsam=5)
+    assert session.fpga.trigger_task() is None
+    data = session.fpga.task_watcher()
+    assert isinstance(data, np.ndarray) and data.dtype == np.uint32
+    assert len(data) == 5
+
+
+def test_large_and_structured_results_keep_dtype(session):
+    session.fpga.set_modes(task_mode=0, dac_mode=0, adc_mode=0)
+    session.fpga.config_adc(twake=1, tsample=8192, nsam=1)
+    session.fpga.trigger_task()
+    data = session.fpga.task_watcher()
+    assert data.dtype == np.uint32 and len(data) == 8192
+    assert (data[1:] != data[:-1]).all()           # dummy ADC alternates
+    session.fpga.trigger_task()
+    rec = session.fpga.task_watcher(indexed=True)
+    assert rec.dtype.names == ("index", "t", "step", "potential_mv", "code")
+    assert (rec["code"] == data).all()
+
+
+def test_plan_comes_back_as_dict(session):
+    session.fpga.set_modes(task_mode=0, dac_mode=0, adc_mode=0)
+    session.fpga.config_adc(twake=1, tsample=64, nsam=1)
+    plan = session.fpga.trigger_task(dry_run=True)
+    assert plan["words"] == 64 and plan["strategy"] == "memory"
+
+
+def test_array_argument_keeps_its_dtype(session, fpga):
+    session.fpga.stream_waveform(np.arange(10, dtype=np.uint32))
+    fpga._finish_stream()
+    assert fpga._wav_words.dtype == np.uint32
+    assert (fpga._wav_words == np.arange(10)).all()    # 10 codes, not 40 bytes
+
+
+def test_errors_are_raised_on_the_client(session):
+    with pytest.raises(RuntimeError):
+        session.fpga.plan_capture()                  # config_adc not called
+    with pytest.raises(TypeError):
+        session.fpga.stream_waveform(np.array([object()]))
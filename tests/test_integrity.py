@@ -0,0 +1,36 @@
+# Capture verification against the FIFO_PP flip / word counters (user-043).
+import oktop_config as cfg
+
+
+def _capture(fpga, dev, *drops):
+    fpga.set_modes(task_mode=0, dac_mode=0, adc_mode=0)
+    fpga.config_adc(twake=10, tsample=300000, nsam=1)
+    dev.inject_drop(*drops)
+    fpga.trigger_task()
+    return fpga.task_watcher()
+
+
+def test_clean_capture_matches_counters(make_fpga):
+    fpga, dev = make_fpga()
+    data = _capture(fpga, dev)
+    v = fpga.last_integrity
+    assert v["ok"] and v["hw_counters"] and not v["problems"]
+    assert v["hw_words"] == v["words_read"] == len(data) == 300000
+    assert v["hw_flips"] == v["halves_read"] == 300000 // cfg.FIFO_HALF_WORDS + 1
+
+
+def test_missed_flip_is_reported(make_fpga):
+    fpga, dev = make_fpga()
+    _capture(fpga, dev, 1)
+    v = fpga.last_integrity
+    assert not v["ok"]
+    assert v["hw_flips"] == v["halves_read"] + 1
+    assert any("FIFO flips" in p for p in v["problems"])
+
+
+def test_counters_restart_with_each_task(make_fpga):
+    fpga, dev = make_fpga()
+    _capture(fpga, dev, 1)
+    dev.drop_flips.clear()                          # inject_drop applies until cleared
+    _capture(fpga, dev)
+    assert fpga.last_integrity["ok"]
@@ -0,0 +1,30 @@
+# 32-samples-per-word packed free-running mode (user-048).
+import numpy as np
+import pytest
+
+import capture_plan
+
+TSAMPLE = 300001
+
+
+@pytest.mark.parametrize("tsample", [1, 31, 32, 45, 1000])
+def test_pack_unpack_round_trip(tsample):
+    bits = np.random.default_rng(tsample).integers(0, 2, 3 * tsample).astype(np.uint8)
+    words = capture_plan.pack_free_running(bits, tsample)
+    assert len(words) == 3 * -(-tsample // 32)
+    assert (capture_plan.unpack_free_running(words, tsample) == bits).all()
+
+
+def test_packed_capture_matches_full_rate(fpga):
+    fpga.set_modes(task_mode=0, dac_mode=0, adc_mode=0)
+    fpga.config_adc(twake=1, tsample=TSAMPLE, nsam=1)
+    fpga.trigger_task()
+    full = fpga.task_watcher()
+    fpga.set_packed(1)
+    fpga.trigger_task()
+    assert (fpga.task_watcher() == full).all()
+    assert fpga.last_integrity["ok"]
+    fpga.trigger_task()
+    words = fpga.task_watcher(keep_packed=True)
+    assert len(words) == -(-TSAMPLE // 32)
+    assert (words == capture_plan.pack_free_running(full, TSAMPLE)).all()
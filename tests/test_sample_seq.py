@@ -0,0 +1,52 @@
+# Sample sequence counter and gap detection (user-047).
+import numpy as np
+
+import sample_seq
+
+
+def _capture(make_fpga, *drops):
+    fpga, dev = make_fpga()
+    fpga.set_modes(task_mode=0, dac_mode=0, adc_mode=0)
+    fpga.set_seq_counter(1)
+    fpga.config_adc(twake=10, tsample=300000, nsam=1)
+    dev.inject_drop(*drops)
+    fpga.trigger_task()
+    return fpga, fpga.task_watcher()
+
+
+def test_counter_is_checked_and_stripped(make_fpga):
+    fpga, data = _capture(make_fpga)
+    assert data.max() == 1 and (data[1:] != data[:-1]).all()
+    seq = fpga.last_integrity["seq"]
+    assert seq["n_gaps"] == 0 and seq["words"] == 300000
+
+
+def test_missed_half_is_a_gap(make_fpga):
+    fpga, _ = _capture(make_fpga, 2)
+    seq = fpga.last_integrity["seq"]
+    assert not fpga.last_integrity["ok"]
+    assert seq["n_gaps"] >= 1
+    assert seq["dropped"] > 0 and seq["dropped"] % 131071 == 0
+
+
+def test_find_gaps_counts_forward_and_backward_jumps():
+    seq = np.arange(10, dtype=np.uint32)
+    seq[5:] += 3
+    idx, missing = sample_seq.find_gaps(seq)
+    assert idx.tolist() == [5] and missing.tolist() == [3]
+    idx, missing = sample_seq.find_gaps(seq, prev=8)
+    assert missing.tolist() == [-9, 3]
+    wrap = np.array([2**31 - 2, 2**31 - 1, 0, 1], dtype=np.uint32)
+    assert len(sample_seq.find_gaps(wrap)[0]) == 0
+
+
+def test_checker_separates_drops_and_resets():
+    words = np.arange(100, dtype=np.uint32) << 1
+    words[40:60] = 0                                # stale words: counter goes back
+    words[80:] += 10 << 1                           # 10 samples lost
+    chk = sample_seq.SeqChecker()
+    chk.check(words[:50])
+    chk.check(words[50:])
+    assert chk.n_gaps == 2
+    assert chk.dropped == 10 and chk.resets == 1
+    assert chk.gaps[0]["span"] == 21
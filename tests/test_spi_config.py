@@ -0,0 +1,26 @@
+# SPI configuration completes on the done counter and verifies (user-026).
+
+
+def test_config_is_verified_from_the_done_counter(fpga):
+    fpga.set_cc_gain(10)
+    fpga.set_cc_sel(10)
+    before = fpga.read_spi_cnt()["raw"]
+    status = fpga.config_through_spi()
+    assert status["verified"]
+    assert status["spi_cnt"] - before == 2
+    assert status["readback"] == status["expected"]
+
+
+def test_config_verifies_after_a_dac_task(make_fpga):
+    fpga, dev = make_fpga()
+    wav = fpga.gen_cv(vstart=500, v1=1500, v2=200, vstep=10)
+    fpga.write_waveform_words(wav)
+    fpga.set_modes(task_mode=1, dac_mode=1, adc_mode=1)
+    fpga.config_dac(t1=200, t2=200, ts1=50, ts2=50, nsam=len(wav))
+    fpga.config_adc(twake=10, tsample=32, nsam=4)
+    fpga.trigger_task()
+    fpga.task_watcher()
+    assert len(dev._spi_out) > 2                    # DAC readbacks left behind
+    fpga.set_cc_sel(3)
+    assert fpga.config_through_spi()["verified"]
+    assert len(dev._spi_out) == 0
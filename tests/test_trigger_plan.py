@@ -0,0 +1,42 @@
+# trigger_task planning and the record-array budget (user-044).
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def configured(fpga):
+    fpga.set_modes(task_mode=0, dac_mode=0, adc_mode=0)
+    fpga.config_adc(twake=1, tsample=64, nsam=1)
+    return fpga
+
+
+def test_trigger_without_adc_config_returns_none(fpga):
+    assert fpga.trigger_task() is None
+
+
+def test_dry_run_returns_plan_without_starting(configured):
+    plan = configured.trigger_task(dry_run=True)
+    assert plan.words == 64 and plan.ok
+    assert configured._plan is None
+
+
+def test_indexed_watcher_rechecks_the_budget(configured):
+    plan = configured.plan_capture(memory_budget=1000)    # uint32 fits, records do not
+    assert plan.strategy == "memory"
+    configured.trigger_task(plan=plan)
+    with pytest.raises(ValueError, match="indexed capture"):
+        configured.task_watcher(indexed=True)
+
+
+def test_indexed_plan_is_refused_before_the_task(configured):
+    plan = configured.plan_capture(indexed=True, memory_budget=1000)
+    with pytest.raises(ValueError):
+        configured.trigger_task(plan=plan)
+
+
+def test_indexed_watcher_after_plain_trigger(configured):
+    configured.trigger_task()
+    rec = configured.task_watcher(indexed=True)
+    assert len(rec) == 64 and rec.dtype.names is not None
+    configured.trigger_task(indexed=True)
+    assert np.array_equal(configured.task_watcher(indexed=True)["code"], rec["code"])
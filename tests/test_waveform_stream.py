@@ -0,0 +1,33 @@
+# Streaming waveforms longer than the 1024-word wav FIFO (user-035).
+import numpy as np
+
+import oktop_config as cfg
+
+
+def _run(fpga, source, nsam):
+    fpga.set_modes(task_mode=1, dac_mode=1, adc_mode=1)
+    fpga.config_dac(t1=100, t2=100, ts1=50, ts2=50, nsam=nsam)
+    fpga.config_adc(twake=10, tsample=16, nsam=2)
+    fpga.stream_waveform(source)
+    fpga.trigger_task()
+    return fpga.task_watcher(indexed=True)
+
+
+def test_long_waveform_streams_without_underrun(make_fpga):
+    fpga, dev = make_fpga()
+    wav = np.arange(5000, dtype=np.uint32) % 1024
+    assert len(wav) > cfg.WAV_FIFO_DEPTH
+    rec = _run(fpga, wav, len(wav))
+    assert dev.wav_underruns == 0 and dev.wav_overflows == 0
+    assert (fpga._wav_words == wav).all()
+    assert len(rec) == 2 * len(wav)
+    assert (np.unique(rec["step"]) == np.arange(len(wav))).all()
+
+
+def test_generator_source(make_fpga):
+    fpga, dev = make_fpga()
+    blocks = (np.full(100, i, dtype=np.uint32) for i in range(30))
+    rec = _run(fpga, blocks, 3000)
+    assert dev.wav_underruns == 0
+    assert len(rec) == 6000
+    assert (fpga._wav_words == np.repeat(np.arange(30), 100)).all()
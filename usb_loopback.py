@@ -0,0 +1,205 @@
+# usb_loopback.py
+#
+# USB pipe throughput and integrity benchmark on the loopback test FIFO
+# (PipeIn EP_PI_TST_IN 0x83 -> PipeOut EP_PO_TST_OUT 0xA3).
+#
+#   python usb_loopback.py                               # real board
+#   python usb_loopback.py --emulate --ber 1e-6          # emulator, inject bit errors
+#   python usb_loopback.py --transfer 4096 65536 --block 65536 --total 64 --pattern counter
+#
+# For every (transfer, block) pair, `total` MB are pushed through the
+# FIFO in rounds of `block` bytes (at most the FIFO size), each round as
+# block / transfer WriteToPipeIn calls followed by as many ReadFromPipeOut
+# calls. Three rates are reported separately so the bottleneck is visible:
+#   write MB/s   host -> FPGA pipe calls only
+#   read MB/s    FPGA -> host pipe calls only
+#   host MB/s    pattern generation, byte conversion and verification
+# Every word read back is compared with the expected pattern in one
+# vectorized pass per round; mismatched words and bit errors are counted.
+# Patterns: "counter" (word index) or "prbs" (PRBS-31 bitstream, packed
+# little-endian into words). Reports go to Test_Data/Benchmarks/ like
+# latency_bench.py.
+import argparse
+import json
+import platform
+import time
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+import oktop_config as cfg
+from latency_bench import REPORT_DIR, git_revision
+
+PATTERNS = ("counter", "prbs")
+PRBS_WORDS = 65521          # prime, so the table period never aligns with a block
+FIFO_BYTES = 4 * cfg.TST_FIFO_DEPTH
+
+
+# -------------------------------------------------------------------------
+# Patterns
+# -------------------------------------------------------------------------
+@lru_cache(maxsize=1)
+def prbs31_table(n_words: int = PRBS_WORDS):
+    """First n_words * 32 bits of PRBS-31 (x^31 + x^28 + 1), as uint32 words."""
+    n_bits = 32 * n_words
+    b = np.zeros(n_bits + 31, dtype=np.uint8)
+    b[:31] = 1                               # all-ones seed
+    # b[k] = b[k-31] ^ b[k-28]: the newest tap is 28 back, so 28 bits per step
+    for k in range(31, len(b), 28):
+        m = min(28, len(b) - k)
+        b[k:k + m] = b[k - 31:k - 31 + m] ^ b[k - 28:k - 28 + m]
+    return np.packbits(b[31:], bitorder="little").view("<u4").astype(np.uint32)
+
+
+def pattern_words(kind: str, start: int, n: int):
+    """Words start .. start+n-1 of the loopback pattern."""
+    if kind == "counter":
+        return (np.arange(start, start + n, dtype=np.uint64) & 0xFFFFFFFF).astype(np.uint32)
+    if kind == "prbs":
+        return prbs31_table().take(np.arange(start, start + n), mode="wrap")
+    raise ValueError(f"pattern must be one of {PATTERNS}.")
+
+
+def compare_words(got, expected) -> dict:
+    """Mismatched words, bit errors and the first bad word index (vectorized)."""
+    diff = np.bitwise_xor(got, expected)
+    bad = np.flatnonzero(diff)
+    bit_errors = int(np.unpackbits(diff.view(np.uint8)).sum()) if len(bad) else 0
+    return {"word_errors": int(len(bad)), "bit_errors": bit_errors,
+            "first_error": int(bad[0]) if len(bad) else None}
+
+
+# -------------------------------------------------------------------------
+# Benchmark
+# -------------------------------------------------------------------------
+def run_point(dev, total_bytes: int, block_bytes: int, transfer_bytes: int,
+              pattern: str = "prbs") -> dict:
+    """Push total_bytes through the loopback FIFO; rates in MB/s."""
+    if block_bytes > FIFO_BYTES:
+        raise ValueError(f"block must be at most the loopback FIFO size ({FIFO_BYTES} bytes).")
+    if block_bytes % transfer_bytes or transfer_bytes % 16:
+        raise ValueError("transfer must be a multiple of 16 bytes dividing the block size.")
+    n_xfer = block_bytes // transfer_bytes
+    rx = [bytearray(transfer_bytes) for _ in range(n_xfer)]
+    t_wr = t_rd = t_host = 0.0
+    short = 0
+    errors = {"word_errors": 0, "bit_errors": 0, "first_error": None}
+    pos = 0
+    total_words = total_bytes // 4
+    clock = time.perf_counter
+    while pos < total_words:
+        t0 = clock()
+        expected = pattern_words(pattern, pos, block_bytes // 4)
+        raw = expected.tobytes()
+        tx = [bytearray(raw[i:i + transfer_bytes]) for i in range(0, block_bytes, transfer_bytes)]
+        t1 = clock()
+        for buf in tx:
+            short += dev.WriteToPipeIn(cfg.EP_PI_TST_IN, buf) != transfer_bytes
+        t2 = clock()
+        for buf in rx:
+            short += dev.ReadFromPipeOut(cfg.EP_PO_TST_OUT, buf) != transfer_bytes
+        t3 = clock()
+        got = np.frombuffer(b"".join(rx), dtype="<u4")
+        e = compare_words(got, expected)
+        t4 = clock()
+        errors["word_errors"] += e["word_errors"]
+        errors["bit_errors"] += e["bit_errors"]
+        if errors["first_error"] is None and e["first_error"] is not None:
+            errors["first_error"] = pos + e["first_error"]
+        t_host += (t1 - t0) + (t4 - t3)
+        t_wr += t2 - t1
+        t_rd += t3 - t2
+        pos += len(expected)
+    nbytes = 4 * pos
+    return {"total_bytes": nbytes, "block_bytes": block_bytes, "transfer_bytes": transfer_bytes,
+            "pattern": pattern,
+            "write_mbs": nbytes / t_wr / 1e6 if t_wr else float("inf"),
+            "read_mbs": nbytes / t_rd / 1e6 if t_rd else float("inf"),
+            "host_mbs": nbytes / t_host / 1e6 if t_host else float("inf"),
+            "short_calls": short, **errors,
+            "ber": errors["bit_errors"] / (8 * nbytes) if nbytes else 0.0}
+
+
+def run(fpga, transfers=(4096, 16384, 65536), blocks=(16384, 65536), total_mb: float = 16,
+        pattern: str = "prbs", backend: str = "hardware") -> dict:
+    """Sweep transfer / block sizes on an open, configured OKTop; returns the report."""
+    fpga.system_reset()                 # empty loopback FIFO
+    if pattern == "prbs":
+        prbs31_table()                  # built once, outside the timed rounds
+    total = int(total_mb * 1e6) // 16 * 16
+    points = []
+    for block in blocks:
+        for xfer in transfers:
+            if xfer > block:
+                continue
+            points.append(run_point(fpga.dev, max(total, block), block, xfer, pattern))
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "revision": git_revision(),
+        "backend": backend,
+        "build_id": fpga.read_build_id(),
+        "points": points,
+    }
+
+
+def format_report(report: dict) -> str:
+    lines = [f"{report['host']} ({report['backend']}, rev {report['revision']}, "
+             f"build 0x{report['build_id']:08X})",
+             f"{'block':>8}{'transfer':>10}{'write MB/s':>12}{'read MB/s':>11}{'host MB/s':>11}"
+             f"{'bad words':>11}{'BER':>10}"]
+    for p in report["points"]:
+        lines.append(f"{p['block_bytes']:>8}{p['transfer_bytes']:>10}{p['write_mbs']:>12.1f}"
+                     f"{p['read_mbs']:>11.1f}{p['host_mbs']:>11.1f}{p['word_errors']:>11}"
+                     f"{p['ber']:>10.1e}")
+    n_bad = sum(p["word_errors"] + p["short_calls"] for p in report["points"])
+    lines.append("Loopback data OK." if not n_bad else
+                 f"Loopback FAILED: {n_bad} bad words / short transfers - check the cable and hub.")
+    return "\n".join(lines)
+
+
+def save_report(report: dict, out_dir=REPORT_DIR) -> Path:
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.fromisoformat(report["created"]).strftime("%Y%m%d_%H%M%S")
+    path = out_dir / f"loopback_{report['host']}_{report['backend']}_{stamp}.json"
+    path.write_text(json.dumps(report, indent=1))
+    return path
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="USB loopback throughput / integrity benchmark")
+    ap.add_argument("--transfer", type=int, nargs="+", default=[4096, 16384, 65536],
+                    help="bytes per pipe call")
+    ap.add_argument("--block", type=int, nargs="+", default=[16384, 65536],
+                    help=f"bytes per FIFO round (<= {FIFO_BYTES})")
+    ap.add_argument("--total", type=float, default=16, help="MB per point")
+    ap.add_argument("--pattern", choices=PATTERNS, default="prbs")
+    ap.add_argument("--bitfile", default=cfg.BITFILE)
+    ap.add_argument("--serial", default="")
+    ap.add_argument("--emulate", action="store_true", help="use the ok_emulator backend")
+    ap.add_argument("--ber", type=float, default=0.0, help="emulator: injected bit error rate")
+    ap.add_argument("--out-dir", default=str(REPORT_DIR))
+    args = ap.parse_args(argv)
+
+    import oktop_driver as oktop
+    dev = None
+    if args.emulate:
+        import ok_emulator
+        dev = ok_emulator.EmulatedFrontPanel()
+        dev.tst_ber = args.ber
+    fpga = oktop.OKTop(args.bitfile, args.serial, dev=dev)
+    fpga.open_and_configure()
+    report = run(fpga, args.transfer, args.block, args.total, args.pattern,
+                 "emulator" if args.emulate else "hardware")
+    print(format_report(report))
+    print(f"Saved report to {save_report(report, args.out_dir)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# voltammetry.py
+#
+# Vectorized I-V extraction for task_mode=1 runs. Works on the record
+# array returned by OKTop.task_watcher(indexed=True) (or
+# capture_plan.index_capture), whose samples are ordered by DAC step.
+# Values stay in ADC code units.
+import numpy as np
+
+IV_DTYPE = np.dtype([
+    ("step",         "<i4"),   # DAC step index
+    ("potential_mv", "<f8"),   # applied potential (mV)
+    ("value",        "<f8"),   # mean ADC output over the step
+    ("n",            "<i4"),   # samples averaged
+])
+
+CV_DTYPE = np.dtype(IV_DTYPE.descr + [
+    ("branch",    "<i4"),      # 0, 1, 2, ... alternating sweep segments
+    ("direction", "<i1"),      # +1 forward (rising), -1 reverse (falling)
+])
+
+DPV_DTYPE = np.dtype([
+    ("potential_mv", "<f8"),   # base potential of the pulse pair (mV)
+    ("base",         "<f8"),   # mean output on the base step
+    ("pulse",        "<f8"),   # mean output on the pulse step
+    ("diff",         "<f8"),   # pulse - base
+])
+
+
+def step_means(rec, skip: int = 0):
+    """
+    Average the ADC output of every DAC step (IV_DTYPE array).
+    skip: samples dropped at the start of each step (settling).
+    """
+    step = rec["step"]
+    out = np.zeros(0, dtype=IV_DTYPE)
+    if len(step) == 0:
+        return out
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(step)) + 1))
+    code = rec["code"].astype(np.float64)
+    if skip:
+        lengths = np.diff(np.append(starts, len(step)))
+        keep = (np.arange(len(step)) - np.repeat(starts, lengths)) >= skip
+        sums = np.add.reduceat(np.where(keep, code, 0.0), starts)
+        counts = np.add.reduceat(keep.astype(np.int64), starts)
+    else:
+        sums = np.add.reduceat(code, starts)
+        counts = np.diff(np.append(starts, len(step)))
+    out = np.empty(len(starts), dtype=IV_DTYPE)
+    out["step"] = step[starts]
+    out["potential_mv"] = rec["potential_mv"][starts]
+    out["value"] = np.divide(sums, counts, out=np.full(len(starts), np.nan), where=counts > 0)
+    out["n"] = counts
+    return out
+
+
+def staircase(rec, skip: int = 0):
+    """Staircase / ramp I-V curve: one averaged point per DAC step."""
+    return step_means(rec, skip)
+
+
+def cv(rec, skip: int = 0):
+    """
+    Cyclic voltammogram: per-step averages labelled with their sweep
+    branch and direction, for any number of cycles. A step keeps the
+    direction of the potential change that led to it; the first step
+    takes the direction of the second.
+    """
+    iv = step_means(rec, skip)
+    out = np.zeros(len(iv), dtype=CV_DTYPE)
+    for name in IV_DTYPE.names:
+        out[name] = iv[name]
+    if len(iv) < 2:
+        out["direction"] = 1
+        return out
+    d = np.sign(np.diff(iv["potential_mv"])).astype(np.int8)
+    nz = np.flatnonzero(d)
+    if len(nz) == 0:
+        d[:] = 1
+    else:
+        # flat steps inherit the last non-zero direction
+        idx = np.where(d != 0, np.arange(len(d)), nz[0])
+        np.maximum.accumulate(idx, out=idx)
+        d = d[idx]
+    direction = np.concatenate(([d[0]], d))
+    out["direction"] = direction
+    out["branch"] = np.concatenate(([0], np.cumsum(direction[1:] != direction[:-1])))
+    return out
+
+
+def split_branches(cv_curve):
+    """Split a cv() result into one array per branch."""
+    cuts = np.flatnonzero(np.diff(cv_curve["branch"])) + 1
+    return np.split(cv_curve, cuts)
+
+
+def dpv(rec, skip: int = 0):
+    """
+    Differential pulse voltammogram for gen_dpv waveforms, whose steps
+    alternate base (even step) and pulse (odd step). Returns one point
+    per complete base/pulse pair with the pulse-minus-base difference.
+    """
+    iv = step_means(rec, skip)
+    n_pairs = (iv["step"].max() // 2 + 1) if len(iv) else 0
+    base = np.full(n_pairs, np.nan)
+    pulse = np.full(n_pairs, np.nan)
+    pot = np.full(n_pairs, np.nan)
+    is_base = iv["step"] % 2 == 0
+    pair = iv["step"] // 2
+    base[pair[is_base]] = iv["value"][is_base]
+    pot[pair[is_base]] = iv["potential_mv"][is_base]
+    pulse[pair[~is_base]] = iv["value"][~is_base]
+    ok = ~(np.isnan(base) | np.isnan(pulse))
+    out = np.empty(int(ok.sum()), dtype=DPV_DTYPE)
+    out["potential_mv"] = pot[ok]
+    out["base"] = base[ok]
+    out["pulse"] = pulse[ok]
+    out["diff"] = pulse[ok] - base[ok]
+    return out